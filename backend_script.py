@@ -7,7 +7,8 @@ import pandas as pd
 import numpy as np
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import BadRequest
+from werkzeug.utils import secure_filename, safe_join
 from google import genai
 import csv
 from torchvision import transforms as T
@@ -15,16 +16,21 @@ from pytorchvideo.models.hub import slowfast_r50
 import tensorflow as tf
 import tensorflow_hub as hub
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
 import time
 import jwt
 import bcrypt
 import sqlite3
 from functools import wraps
+from contextlib import contextmanager
 import gdown
 import glob
 import threading
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
 import uuid
 import requests
 import smtplib
@@ -34,24 +40,23 @@ import random
 import string
 import subprocess
 import shutil
+import io
+import struct
+import fcntl
 import hmac
 import hashlib
+import base64
 import tempfile
-from urllib.parse import quote_plus
+from urllib.parse import quote, quote_plus
 from dotenv import load_dotenv
+from database import SQLitePool, load_job_queue, read_change_entries
+from storage import LocalStorage, S3Storage, UploadQueue
 
 try:
     import razorpay
 except Exception:
     razorpay = None
 
-try:
-    import boto3
-    from botocore.exceptions import BotoCoreError, ClientError
-except Exception:
-    boto3 = None
-    BotoCoreError = ClientError = Exception
-
 # ==================== LOGGING CONFIGURATION ====================
 # Create logging directory if it doesn't exist
 LOG_DIR = 'logging'
@@ -90,6 +95,10 @@ JWT_EXPIRATION_HOURS = 24 * 7  # 7 days
 
 # Database Configuration
 DATABASE_PATH = 'cricket_coach.db'
+# Busy timeout (ms) a writer waits for the SQLite lock before "database is locked".
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '10000'))
+# How long delta-sync change_log entries are kept (older cursors trigger a full resync).
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv('CHANGE_LOG_RETENTION_DAYS', '90'))
 
 # SMTP2GO Configuration
 SMTP_HOST = 'mail.smtp2go.com'
@@ -113,9 +122,9 @@ CORS(app,
      max_age=86400)
 
 # Database Functions
-def init_database():
+def init_database(start_scheduler=True):
     """Initialize the database with users table"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -187,11 +196,70 @@ def init_database():
         ('output_tokens', 'INTEGER DEFAULT 0'),
         ('total_tokens', 'INTEGER DEFAULT 0'),
         ('cost_usd', 'REAL DEFAULT 0'),
+        ('analyzed_date_ist', 'TEXT'),
     ):
         try:
             cursor.execute(f'ALTER TABLE analysis_log ADD COLUMN {_col} {_decl}')
         except sqlite3.OperationalError:
             pass  # Column already exists
+    # Stored IST day so the daily reports can filter with a plain equality/range on
+    # an indexed column instead of date(analyzed_at, ...) over the whole log.
+    cursor.execute(
+        "UPDATE analysis_log SET analyzed_date_ist = date(analyzed_at, '+5 hours', '+30 minutes') "
+        "WHERE analyzed_date_ist IS NULL AND analyzed_at IS NOT NULL"
+    )
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_analysis_log_ist_date '
+        'ON analysis_log(analyzed_date_ist, analyzed_at)'
+    )
+
+    # Per-user, per-IST-day usage rollup, maintained incrementally by
+    # log_video_analysis / update_analysis_tokens. The admin reports read this
+    # (one row per active user per day) instead of aggregating analysis_log.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_usage (
+            date_ist TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            video_count INTEGER NOT NULL DEFAULT 0,
+            gemini_calls INTEGER NOT NULL DEFAULT 0,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            output_tokens INTEGER NOT NULL DEFAULT 0,
+            total_tokens INTEGER NOT NULL DEFAULT 0,
+            cost_usd REAL NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY(date_ist, user_id)
+        )
+    ''')
+    # Seed the rollup from the existing log the first time (idempotent: only when empty).
+    cursor.execute('SELECT 1 FROM daily_usage LIMIT 1')
+    if cursor.fetchone() is None:
+        cursor.execute('''
+            INSERT INTO daily_usage (date_ist, user_id, username, video_count, gemini_calls,
+                                     prompt_tokens, output_tokens, total_tokens, cost_usd)
+            SELECT analyzed_date_ist, user_id, MAX(username), COUNT(*),
+                   COALESCE(SUM(gemini_calls), 0), COALESCE(SUM(prompt_tokens), 0),
+                   COALESCE(SUM(output_tokens), 0), COALESCE(SUM(total_tokens), 0),
+                   COALESCE(SUM(cost_usd), 0)
+            FROM analysis_log
+            WHERE analyzed_date_ist IS NOT NULL AND user_id IS NOT NULL
+            GROUP BY analyzed_date_ist, user_id
+        ''')
+
+    # Per-user analysis streak, maintained incrementally by log_video_analysis().
+    # current_streak is the run of consecutive (server-local) days ending on
+    # last_active_date; readers decide whether it is still alive today.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_streaks (
+            user_id INTEGER PRIMARY KEY,
+            current_streak INTEGER NOT NULL DEFAULT 0,
+            longest_streak INTEGER NOT NULL DEFAULT 0,
+            last_active_date TEXT,
+            total_active_days INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
 
     # ---- Athlete Monitoring (NCA-style) tables ----
     # Daily wellness check-in: one row per user per calendar day (UNIQUE), so a
@@ -234,6 +302,32 @@ def init_database():
     ''')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_workload_user_date ON workload_sessions(user_id, date)')
 
+    # Per-user daily load rollup, bumped on every workload insert. ACWR summaries and
+    # the rolling series read this (one row per active day) instead of raw sessions.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS workload_daily (
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            total_load REAL NOT NULL DEFAULT 0,
+            session_count INTEGER NOT NULL DEFAULT 0,
+            balls_bowled INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY(user_id, date),
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    # Seed the rollup from existing sessions the first time (idempotent: only when empty).
+    cursor.execute('SELECT 1 FROM workload_daily LIMIT 1')
+    if cursor.fetchone() is None:
+        cursor.execute('''
+            INSERT INTO workload_daily (user_id, date, total_load, session_count, balls_bowled)
+            SELECT user_id, substr(date, 1, 10),
+                   COALESCE(SUM(COALESCE(load, rpe * duration_min)), 0), COUNT(*),
+                   COALESCE(SUM(balls_bowled), 0)
+            FROM workload_sessions
+            GROUP BY user_id, substr(date, 1, 10)
+        ''')
+
     # Periodic fitness test results (Yo-Yo, sprint, jump, lifts, weight, ...).
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS fitness_tests (
@@ -250,6 +344,19 @@ def init_database():
     ''')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_fitness_user_metric ON fitness_tests(user_id, metric)')
 
+    # Client-generated ids for records replayed by the offline sync endpoint, so a
+    # retried batch is deduplicated instead of inserted twice.
+    for _table in ('wellness_entries', 'workload_sessions', 'fitness_tests'):
+        try:
+            cursor.execute(f'ALTER TABLE {_table} ADD COLUMN client_id TEXT')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_workload_client ON workload_sessions(user_id, client_id) '
+                   'WHERE client_id IS NOT NULL')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_fitness_client ON fitness_tests(user_id, client_id) '
+                   'WHERE client_id IS NOT NULL')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_wellness_client ON wellness_entries(user_id, client_id)')
+
     # Injury & rehab tracking.
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS injuries (
@@ -270,6 +377,42 @@ def init_database():
     ''')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_injuries_user ON injuries(user_id)')
 
+    # Coach -> athlete links. An athlete must accept ('pending' -> 'active') before
+    # the coach's squad dashboard includes their monitoring data.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS coach_athletes (
+            coach_id INTEGER NOT NULL,
+            athlete_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            accepted_at TIMESTAMP,
+            PRIMARY KEY(coach_id, athlete_id),
+            FOREIGN KEY(coach_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY(athlete_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_coach_athletes_athlete ON coach_athletes(athlete_id)')
+
+    # tus-style resumable uploads: committed byte offset per upload; job_id is set
+    # once the upload is finalised into an analysis job.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS resumable_uploads (
+            upload_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            content_type TEXT,
+            form TEXT NOT NULL DEFAULT '{}',
+            upload_length INTEGER NOT NULL,
+            upload_offset INTEGER NOT NULL DEFAULT 0,
+            sha256 TEXT,
+            job_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_resumable_uploads_updated ON resumable_uploads(updated_at)')
+
     # AI-generated weekly monitoring report: one row per user per ISO week.
     # UNIQUE(user_id, week_start) so a re-run for the same week upserts.
     cursor.execute('''
@@ -287,6 +430,41 @@ def init_database():
         )
     ''')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_weekly_reports_user ON weekly_reports(user_id, week_start)')
+    # Fingerprint of the gathered report input; an unchanged input reuses the stored report.
+    try:
+        cursor.execute('ALTER TABLE weekly_reports ADD COLUMN input_hash TEXT')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    # Weekly report batch bookkeeping: one row per batch (timing + counts) and one
+    # checkpoint per user, so a rerun after a crash only processes the missing users.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS weekly_report_batches (
+            week_start TEXT NOT NULL,
+            week_end TEXT NOT NULL,
+            status TEXT NOT NULL,
+            users_total INTEGER NOT NULL DEFAULT 0,
+            generated_count INTEGER NOT NULL DEFAULT 0,
+            skipped_count INTEGER NOT NULL DEFAULT 0,
+            failed_count INTEGER NOT NULL DEFAULT 0,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            duration_seconds REAL,
+            PRIMARY KEY(week_start, week_end)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS weekly_report_batch_items (
+            week_start TEXT NOT NULL,
+            week_end TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY(week_start, week_end, user_id)
+        )
+    ''')
 
     # AI-generated weekly SHOT-PROGRESS report: compares the same shot played across
     # the week (common flaws + improvement % per video). Separate from the monitoring
@@ -314,9 +492,138 @@ def init_database():
         cursor.execute("ALTER TABLE shot_reports ADD COLUMN category TEXT NOT NULL DEFAULT 'batting'")
     except sqlite3.OperationalError:
         pass  # Column already exists
+    try:
+        cursor.execute('ALTER TABLE shot_reports ADD COLUMN input_hash TEXT')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_shot_reports_user ON shot_reports(user_id, week_start)')
     cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_shot_reports_unique ON shot_reports(user_id, week_start, category)')
 
+    # Index of completed analyses (one row per results_<filename>.json), so history,
+    # shot reports and training-plan lookup query SQL instead of listing the user
+    # folder and json.load-ing every results file. flaws_json is the compact flaw
+    # list used by the shot report; the full feedback stays in the results file.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            job_id TEXT,
+            player_type TEXT,
+            shot_type TEXT,
+            bowler_type TEXT,
+            keeping_type TEXT,
+            batter_side TEXT,
+            bowler_side TEXT,
+            success INTEGER NOT NULL DEFAULT 1,
+            has_gpt_feedback INTEGER NOT NULL DEFAULT 0,
+            technique_score REAL,
+            flaws_json TEXT,
+            report_path TEXT,
+            results_path TEXT,
+            results_size INTEGER,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            UNIQUE(user_id, filename),
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_analysis_results_user_created ON analysis_results(user_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_analysis_results_user_type ON analysis_results(user_id, player_type, created_at)')
+
+    # Report scheduler: one lease row per scheduler name elects a single leader
+    # across gunicorn workers/hosts; scheduled_runs is the ledger that makes each
+    # (job, run_key) slot execute once and lets missed slots be caught up.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_lease (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            acquired_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_runs (
+            job TEXT NOT NULL,
+            run_key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            holder TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            started_at REAL,
+            finished_at REAL,
+            error TEXT,
+            PRIMARY KEY(job, run_key)
+        )
+    ''')
+
+    # Change log for delta sync: triggers record every write to the synced tables,
+    # with the id the client knows the row by (`ref`) so deletes become tombstones.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            entity TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            ref TEXT NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_change_log_user_seq ON change_log(user_id, seq)')
+    cursor.execute('CREATE TABLE IF NOT EXISTS app_meta (key TEXT PRIMARY KEY, value TEXT)')
+    for _table, _entity, _ref in (
+        ('analysis_results', 'history', "'results_' || {row}.filename || '.json'"),
+        ('wellness_entries', 'wellness', 'CAST({row}.id AS TEXT)'),
+        ('workload_sessions', 'workload', 'CAST({row}.id AS TEXT)'),
+        ('fitness_tests', 'fitness', 'CAST({row}.id AS TEXT)'),
+        ('injuries', 'injuries', 'CAST({row}.id AS TEXT)'),
+    ):
+        for _event, _row, _op in (('INSERT', 'NEW', 'upsert'), ('UPDATE', 'NEW', 'upsert'),
+                                  ('DELETE', 'OLD', 'delete')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{_table}_{_event.lower()}_changes
+                AFTER {_event} ON {_table}
+                BEGIN
+                    INSERT INTO change_log (user_id, entity, row_id, ref, op)
+                    VALUES ({_row}.user_id, '{_entity}', {_row}.id, {_ref.format(row=_row)}, '{_op}');
+                END
+            ''')
+    # Per-user data version counters behind the list endpoints' ETags.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id INTEGER NOT NULL,
+            scope TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY(user_id, scope)
+        )
+    ''')
+    for _table, _scope in (
+        ('analysis_results', 'history'), ('wellness_entries', 'wellness'),
+        ('workload_sessions', 'workload'), ('fitness_tests', 'fitness'), ('injuries', 'injuries'),
+        ('weekly_reports', 'weekly_reports'), ('shot_reports', 'shot_reports'),
+    ):
+        for _event, _row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{_table}_{_event.lower()}_version
+                AFTER {_event} ON {_table}
+                BEGIN
+                    INSERT INTO user_versions (user_id, scope, version, updated_at)
+                    VALUES ({_row}.user_id, '{_scope}', 1, CURRENT_TIMESTAMP)
+                    ON CONFLICT(user_id, scope) DO UPDATE SET
+                      version = version + 1, updated_at = CURRENT_TIMESTAMP;
+                END
+            ''')
+
+    # Prune old entries; cursors older than the watermark get full_resync=true.
+    cursor.execute("SELECT MAX(seq) FROM change_log WHERE changed_at < datetime('now', ?)",
+                   (f'-{CHANGE_LOG_RETENTION_DAYS} days',))
+    _pruned = cursor.fetchone()[0]
+    if _pruned:
+        cursor.execute('DELETE FROM change_log WHERE seq <= ?', (_pruned,))
+        cursor.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('change_log_pruned_seq', ?)",
+                       (str(_pruned),))
+
     # Backfill entitlements rows for existing users (idempotent)
     try:
         cursor.execute('SELECT id FROM users')
@@ -334,16 +641,30 @@ def init_database():
     conn.close()
     logger.info("Database initialized successfully")
 
-    # Kick off the daily per-account usage report scheduler.
-    start_daily_report_scheduler()
-    # Kick off the weekly per-athlete monitoring report scheduler.
-    start_weekly_report_scheduler()
+    # One-off: index results files written before analysis_results existed.
+    backfill_analysis_results()
+    # One-off: seed user_streaks from analysis_log history.
+    backfill_user_streaks()
+
+    # Kick off the (leader-elected) daily usage + weekly athlete report scheduler.
+    # Analysis workers skip it: they may not share the API host's database or uploads.
+    if start_scheduler:
+        start_report_scheduler()
+
+# Per-thread pooled connections (WAL, synchronous=NORMAL, busy_timeout, foreign keys).
+# conn.close() hands the connection back to the pool rather than closing it.
+db_pool = SQLitePool(DATABASE_PATH, busy_timeout_ms=DB_BUSY_TIMEOUT_MS)
+
 
 def get_db_connection():
     """Get database connection"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db_pool.connection()
+
+
+def db_transaction(immediate=False):
+    """Context manager running a block in one transaction on a pooled connection.
+    Commits on success, rolls back on error; immediate=True uses BEGIN IMMEDIATE."""
+    return db_pool.transaction(immediate=immediate)
 
 
 # ==================== DAILY ANALYSIS USAGE TRACKING ====================
@@ -371,30 +692,53 @@ def _ist_today():
     return (datetime.utcnow() + IST_OFFSET).strftime('%Y-%m-%d')
 # Optional shared secret to manually trigger the report via the admin endpoint.
 ADMIN_REPORT_TOKEN = os.getenv('ADMIN_REPORT_TOKEN', '')
-_daily_report_scheduler_started = False
 
 # ---- Weekly athlete monitoring report schedule (IST) ----
 # Day-of-week: Monday=0 .. Sunday=6 (matches datetime.weekday()).
 WEEKLY_REPORT_DOW = int(os.getenv('WEEKLY_REPORT_DOW', '0'))     # default Monday
 WEEKLY_REPORT_HOUR = int(os.getenv('WEEKLY_REPORT_HOUR', '7'))   # IST hour
 WEEKLY_REPORT_MINUTE = int(os.getenv('WEEKLY_REPORT_MINUTE', '0'))  # IST minute
-_weekly_report_scheduler_started = False
+
+# ---- Report scheduler (one leader across all worker processes) ----
+REPORT_SCHEDULER_ENABLED = os.getenv('REPORT_SCHEDULER_ENABLED', '1') != '0'
+SCHEDULER_POLL_SECONDS = int(os.getenv('SCHEDULER_POLL_SECONDS', '30'))
+SCHEDULER_LEASE_SECONDS = int(os.getenv('SCHEDULER_LEASE_SECONDS', '120'))
+# How far back a restarted leader looks for slots that were missed while down.
+SCHEDULER_CATCHUP_DAYS = int(os.getenv('SCHEDULER_CATCHUP_DAYS', '3'))
+SCHEDULER_MAX_ATTEMPTS = int(os.getenv('SCHEDULER_MAX_ATTEMPTS', '3'))
+SCHEDULER_RETRY_SECONDS = int(os.getenv('SCHEDULER_RETRY_SECONDS', '900'))
+_report_scheduler_started = False
+_report_scheduler_holder = None
 
 
 def log_video_analysis(user_id, username, filename, player_type, job_id=None):
     """Record one analyzed video so we can report per-account daily usage.
 
-    Returns the new row id (or None on failure) so token usage can be filled in
-    once the analysis finishes.
+    Also bumps the user's daily_usage row for the current IST day. Returns the
+    new row id (or None on failure) so token usage can be filled in once the
+    analysis finishes.
     """
     try:
+        date_ist = _ist_today()
         conn = get_db_connection()
         cur = conn.cursor()
         cur.execute(
-            'INSERT INTO analysis_log (user_id, username, filename, player_type, job_id) VALUES (?, ?, ?, ?, ?)',
-            (user_id, username, filename, player_type, job_id)
+            'INSERT INTO analysis_log (user_id, username, filename, player_type, job_id, analyzed_date_ist) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (user_id, username, filename, player_type, job_id, date_ist)
         )
         row_id = cur.lastrowid
+        cur.execute(
+            '''INSERT INTO daily_usage (date_ist, user_id, username, video_count)
+               VALUES (?, ?, ?, 1)
+               ON CONFLICT(date_ist, user_id) DO UPDATE SET
+                 username=excluded.username,
+                 video_count=video_count + 1,
+                 updated_at=CURRENT_TIMESTAMP''',
+            (date_ist, user_id, username)
+        )
+        if user_id is not None:
+            _bump_user_streak(cur, user_id, datetime.now().strftime('%Y-%m-%d'))
         conn.commit()
         conn.close()
         return row_id
@@ -404,20 +748,47 @@ def log_video_analysis(user_id, username, filename, player_type, job_id=None):
 
 
 def update_analysis_tokens(log_id, usage):
-    """Fill in the Gemini token usage for a previously logged analysis row."""
+    """Fill in the Gemini token usage for a previously logged analysis row and add
+    the difference to that day's daily_usage rollup (so a repeat call never double-counts)."""
     if not log_id or not usage:
         return
     try:
+        new = {
+            'gemini_calls': usage.get('calls', 0),
+            'prompt_tokens': usage.get('prompt_tokens', 0),
+            'output_tokens': usage.get('output_tokens', 0),
+            'total_tokens': usage.get('total_tokens', 0),
+            'cost_usd': round(usage.get('cost_usd', 0.0), 6),
+        }
         conn = get_db_connection()
         cur = conn.cursor()
+        cur.execute(
+            '''SELECT user_id, analyzed_date_ist, gemini_calls, prompt_tokens, output_tokens,
+                      total_tokens, cost_usd
+               FROM analysis_log WHERE id = ?''',
+            (log_id,)
+        )
+        old = cur.fetchone()
+        if old is None:
+            conn.close()
+            return
         cur.execute(
             '''UPDATE analysis_log
                SET gemini_calls = ?, prompt_tokens = ?, output_tokens = ?,
                    total_tokens = ?, cost_usd = ?
                WHERE id = ?''',
-            (usage.get('calls', 0), usage.get('prompt_tokens', 0),
-             usage.get('output_tokens', 0), usage.get('total_tokens', 0),
-             round(usage.get('cost_usd', 0.0), 6), log_id)
+            (new['gemini_calls'], new['prompt_tokens'], new['output_tokens'],
+             new['total_tokens'], new['cost_usd'], log_id)
+        )
+        delta = {k: (new[k] or 0) - (old[k] or 0) for k in new}
+        cur.execute(
+            '''UPDATE daily_usage
+               SET gemini_calls = gemini_calls + ?, prompt_tokens = prompt_tokens + ?,
+                   output_tokens = output_tokens + ?, total_tokens = total_tokens + ?,
+                   cost_usd = cost_usd + ?, updated_at = CURRENT_TIMESTAMP
+               WHERE date_ist = ? AND user_id = ?''',
+            (delta['gemini_calls'], delta['prompt_tokens'], delta['output_tokens'],
+             delta['total_tokens'], delta['cost_usd'], old['analyzed_date_ist'], old['user_id'])
         )
         conn.commit()
         conn.close()
@@ -426,36 +797,36 @@ def update_analysis_tokens(log_id, usage):
 
 
 def build_daily_analysis_report(date_str=None):
-    """Return (date_str, rows) of per-account analysis counts for the given UTC date.
+    """Return (date_str, rows) of per-account analysis counts for the given IST date.
 
-    date_str must be 'YYYY-MM-DD' and is interpreted in IST. Stored timestamps are
-    UTC, so they are shifted into IST before bucketing by day. Defaults to today (IST).
+    date_str must be 'YYYY-MM-DD' and is interpreted in IST. Reads the daily_usage
+    rollup, so the cost is one row per active account regardless of log size.
+    Defaults to today (IST).
     """
     if date_str is None:
         date_str = _ist_today()
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute('''
-        SELECT al.user_id AS user_id,
-               COALESCE(u.username, al.username) AS username,
+        SELECT du.user_id AS user_id,
+               COALESCE(u.username, du.username) AS username,
                u.email AS email,
-               COUNT(*) AS video_count,
-               COALESCE(SUM(al.total_tokens), 0) AS total_tokens,
-               COALESCE(SUM(al.cost_usd), 0) AS cost_usd
-        FROM analysis_log al
-        LEFT JOIN users u ON u.id = al.user_id
-        WHERE date(al.analyzed_at, ?, ?) = ?
-        GROUP BY al.user_id
+               du.video_count AS video_count,
+               du.total_tokens AS total_tokens,
+               du.cost_usd AS cost_usd
+        FROM daily_usage du
+        LEFT JOIN users u ON u.id = du.user_id
+        WHERE du.date_ist = ? AND du.video_count > 0
         ORDER BY video_count DESC
-    ''', (*IST_SQL_MODIFIERS, date_str))
+    ''', (date_str,))
     rows = cur.fetchall()
     conn.close()
     return date_str, rows
 
 
 def build_daily_analysis_requests(date_str=None):
-    """Return (date_str, rows) of individual analysis requests for the given UTC date,
-    each with its own Gemini token usage. date_str is interpreted in IST."""
+    """Return (date_str, rows) of individual analysis requests for the given IST date,
+    each with its own Gemini token usage. Filters on the indexed analyzed_date_ist."""
     if date_str is None:
         date_str = _ist_today()
     conn = get_db_connection()
@@ -472,9 +843,9 @@ def build_daily_analysis_requests(date_str=None):
                datetime(al.analyzed_at, ?, ?) AS analyzed_at
         FROM analysis_log al
         LEFT JOIN users u ON u.id = al.user_id
-        WHERE date(al.analyzed_at, ?, ?) = ?
+        WHERE al.analyzed_date_ist = ?
         ORDER BY al.analyzed_at ASC
-    ''', (*IST_SQL_MODIFIERS, *IST_SQL_MODIFIERS, date_str))
+    ''', (*IST_SQL_MODIFIERS, date_str))
     rows = cur.fetchall()
     conn.close()
     return date_str, rows
@@ -486,6 +857,7 @@ def build_returning_users_report(end_date=None, window_days=7):
     A user is "returning" if they analyzed at least one video on 2+ distinct
     IST days within the window. Returns a dict with the window bounds, total
     active users, returning users, the return rate, and the per-user breakdown.
+    Each daily_usage row is one active (user, day), so active days is a COUNT.
     """
     if end_date is None:
         end_date = _ist_today()
@@ -496,17 +868,17 @@ def build_returning_users_report(end_date=None, window_days=7):
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute('''
-        SELECT al.user_id AS user_id,
-               COALESCE(u.username, al.username) AS username,
+        SELECT du.user_id AS user_id,
+               COALESCE(u.username, MAX(du.username)) AS username,
                u.email AS email,
-               COUNT(DISTINCT date(al.analyzed_at, ?, ?)) AS active_days,
-               COUNT(*) AS video_count
-        FROM analysis_log al
-        LEFT JOIN users u ON u.id = al.user_id
-        WHERE date(al.analyzed_at, ?, ?) BETWEEN ? AND ?
-        GROUP BY al.user_id
+               COUNT(*) AS active_days,
+               SUM(du.video_count) AS video_count
+        FROM daily_usage du
+        LEFT JOIN users u ON u.id = du.user_id
+        WHERE du.date_ist BETWEEN ? AND ? AND du.video_count > 0
+        GROUP BY du.user_id
         ORDER BY active_days DESC, video_count DESC
-    ''', (*IST_SQL_MODIFIERS, *IST_SQL_MODIFIERS, start_date, end_date))
+    ''', (start_date, end_date))
     rows = cur.fetchall()
     conn.close()
 
@@ -772,44 +1144,79 @@ def send_returning_users_report(end_date=None, window_days=None):
     return ok
 
 
-def _daily_report_scheduler():
-    """Background loop that emails the daily usage report at the configured IST time."""
-    while True:
+# ---- Weekly report batch: concurrency + Gemini rate limiting ----
+# Each per-user report is one blocking Gemini 2.5 Pro call, so the batch runs on a
+# small thread pool. A shared limiter spaces call starts to stay under the
+# project's requests-per-minute quota; 429s are retried with backoff.
+WEEKLY_BATCH_WORKERS = int(os.getenv('WEEKLY_BATCH_WORKERS', '4'))
+WEEKLY_BATCH_GEMINI_RPM = int(os.getenv('WEEKLY_BATCH_GEMINI_RPM', '20'))
+WEEKLY_BATCH_MAX_RETRIES = int(os.getenv('WEEKLY_BATCH_MAX_RETRIES', '3'))
+
+
+class _RateLimiter:
+    """Thread-safe minimum spacing between call starts (calls per minute)."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self.interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+_weekly_batch_limiter = _RateLimiter(WEEKLY_BATCH_GEMINI_RPM)
+
+
+def _is_rate_limit_error(e):
+    return getattr(e, 'code', None) == 429 or 'RESOURCE_EXHAUSTED' in str(e) or '429' in str(e)
+
+
+def _weekly_batch_user(uid, week_start, week_end):
+    """Generate one user's report under the shared rate limit. Returns 'generated' or 'skipped'."""
+    for attempt in range(WEEKLY_BATCH_MAX_RETRIES + 1):
+        _weekly_batch_limiter.wait()
         try:
-            # Work entirely in the IST clock so the day completes "in India",
-            # regardless of the server's own timezone.
-            now_ist = datetime.utcnow() + IST_OFFSET
-            target_ist = now_ist.replace(hour=DAILY_REPORT_HOUR, minute=DAILY_REPORT_MINUTE,
-                                         second=0, microsecond=0)
-            if target_ist <= now_ist:
-                target_ist += timedelta(days=1)
-            # Both are on the same (IST) clock, so their delta is real elapsed time.
-            time.sleep(max(1, (target_ist - now_ist).total_seconds()))
-            # Daily email now also includes the rolling returning-users section.
-            send_daily_analysis_report()
+            report = generate_weekly_report_for_user(uid, week_start, week_end)
+            return 'generated' if report else 'skipped'
         except Exception as e:
-            logger.error(f"Daily report scheduler error: {e}", exc_info=True)
-            time.sleep(60)  # avoid a tight crash loop
+            if attempt >= WEEKLY_BATCH_MAX_RETRIES or not _is_rate_limit_error(e):
+                raise
+            backoff = min(120, 10 * (2 ** attempt)) + random.uniform(0, 5)
+            logger.warning(f"Weekly report rate-limited for user {uid}, retrying in {backoff:.0f}s")
+            time.sleep(backoff)
 
 
-def start_daily_report_scheduler():
-    """Start the daily report background thread once."""
-    global _daily_report_scheduler_started
-    if _daily_report_scheduler_started:
-        return
-    _daily_report_scheduler_started = True
-    t = threading.Thread(target=_daily_report_scheduler, daemon=True)
-    t.start()
-    logger.info(
-        f"Daily analysis report scheduler started "
-        f"(daily at {DAILY_REPORT_HOUR:02d}:{DAILY_REPORT_MINUTE:02d} IST; includes "
-        f"rolling {RETURNING_WINDOW_DAYS}-day returning-users section; to {ADMIN_REPORT_RECIPIENTS})"
+def _checkpoint_weekly_batch_user(week_start, week_end, uid, status, error=None):
+    conn = get_db_connection()
+    conn.execute(
+        '''INSERT INTO weekly_report_batch_items (week_start, week_end, user_id, status, attempts, error)
+           VALUES (?, ?, ?, ?, 1, ?)
+           ON CONFLICT(week_start, week_end, user_id) DO UPDATE SET
+             status=excluded.status,
+             attempts=attempts + 1,
+             error=excluded.error,
+             updated_at=CURRENT_TIMESTAMP''',
+        (week_start, week_end, uid, status, (str(error)[:1000] if error else None)),
     )
+    conn.commit()
+    conn.close()
 
 
 def _run_weekly_reports_batch(week_start, week_end):
     """Generate weekly reports for every user with monitoring activity in [week_start, week_end].
-    Each user is isolated so one failure (or Gemini error) doesn't stop the batch."""
+    Users run concurrently (bounded, rate-limited) and each is isolated so one failure
+    (or Gemini error) doesn't stop the batch. Per-user completion is checkpointed, so a
+    rerun of the same week only processes users not already generated/skipped.
+    Returns a summary dict; duration and counts are stored in weekly_report_batches."""
+    started = time.time()
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute(
@@ -821,54 +1228,290 @@ def _run_weekly_reports_batch(week_start, week_end):
         (week_start, week_end, week_start, week_end),
     )
     user_ids = [r['user_id'] for r in cur.fetchall()]
+    cur.execute(
+        '''SELECT user_id, status FROM weekly_report_batch_items
+           WHERE week_start = ? AND week_end = ? AND status IN ('generated', 'skipped')''',
+        (week_start, week_end),
+    )
+    finished = {r['user_id']: r['status'] for r in cur.fetchall()}
+    cur.execute(
+        '''INSERT INTO weekly_report_batches (week_start, week_end, status, users_total, started_at)
+           VALUES (?, ?, 'running', ?, CURRENT_TIMESTAMP)
+           ON CONFLICT(week_start, week_end) DO UPDATE SET
+             status='running', users_total=excluded.users_total,
+             started_at=CURRENT_TIMESTAMP, finished_at=NULL''',
+        (week_start, week_end, len(user_ids)),
+    )
+    conn.commit()
+    conn.close()
+
+    pending = [uid for uid in user_ids if uid not in finished]
+    if finished:
+        logger.info(f"Weekly report batch {week_start}..{week_end}: resuming, "
+                    f"{len(finished)} user(s) already done, {len(pending)} pending")
+
+    failed = 0
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, WEEKLY_BATCH_WORKERS),
+                                thread_name_prefix='weekly-report') as pool:
+            futures = {pool.submit(_weekly_batch_user, uid, week_start, week_end): uid for uid in pending}
+            for fut in as_completed(futures):
+                uid = futures[fut]
+                try:
+                    status = fut.result()
+                    _checkpoint_weekly_batch_user(week_start, week_end, uid, status)
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Weekly report failed for user {uid}: {e}", exc_info=True)
+                    _checkpoint_weekly_batch_user(week_start, week_end, uid, 'failed', error=e)
+
+    duration = round(time.time() - started, 1)
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        '''SELECT status, COUNT(*) AS n FROM weekly_report_batch_items
+           WHERE week_start = ? AND week_end = ? GROUP BY status''',
+        (week_start, week_end),
+    )
+    counts = {r['status']: r['n'] for r in cur.fetchall()}
+    cur.execute(
+        '''UPDATE weekly_report_batches SET status = ?, generated_count = ?, skipped_count = ?,
+               failed_count = ?, finished_at = CURRENT_TIMESTAMP, duration_seconds = ?
+           WHERE week_start = ? AND week_end = ?''',
+        ('failed' if failed else 'done', counts.get('generated', 0), counts.get('skipped', 0),
+         failed, duration, week_start, week_end),
+    )
+    conn.commit()
+    conn.close()
+
+    summary = {
+        'week_start': week_start, 'week_end': week_end, 'users': len(user_ids),
+        'generated': counts.get('generated', 0), 'skipped': counts.get('skipped', 0),
+        'failed': failed, 'duration_seconds': duration,
+    }
+    logger.info(f"Weekly report batch done: {summary['generated']}/{len(user_ids)} reports for "
+                f"{week_start}..{week_end}, {failed} failed, {duration}s")
+    return summary
+
+
+def _scheduled_daily_slots(now_ist):
+    """(run_key, due_ist) for each daily usage-report slot in the catch-up window.
+    run_key is the IST date the report covers."""
+    slots = []
+    for back in range(max(1, SCHEDULER_CATCHUP_DAYS), -1, -1):
+        day = now_ist.date() - timedelta(days=back)
+        due = datetime(day.year, day.month, day.day, DAILY_REPORT_HOUR, DAILY_REPORT_MINUTE)
+        if due <= now_ist:
+            slots.append((day.strftime('%Y-%m-%d'), due))
+    return slots
+
+
+def _scheduled_weekly_slots(now_ist):
+    """(run_key, due_ist) for each weekly athlete-report slot in the catch-up window.
+    run_key is the IST date of the slot; the batch covers the 7 days before it."""
+    slots = []
+    for back in range(max(7, SCHEDULER_CATCHUP_DAYS), -1, -1):
+        day = now_ist.date() - timedelta(days=back)
+        if day.weekday() != WEEKLY_REPORT_DOW % 7:
+            continue
+        due = datetime(day.year, day.month, day.day, WEEKLY_REPORT_HOUR, WEEKLY_REPORT_MINUTE)
+        if due <= now_ist:
+            slots.append((day.strftime('%Y-%m-%d'), due))
+    return slots
+
+
+def _run_scheduled_daily_report(run_key):
+    # Daily email now also includes the rolling returning-users section.
+    if not send_daily_analysis_report(run_key):
+        raise RuntimeError(f"daily report email for {run_key} was not sent")
+
+
+def _run_scheduled_weekly_reports(run_key):
+    # Report on the week that completed before the slot: the 7 days ending the day before.
+    end = datetime.strptime(run_key, '%Y-%m-%d').date() - timedelta(days=1)
+    start = end - timedelta(days=6)
+    summary = _run_weekly_reports_batch(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+    if summary['failed']:
+        # Leave the slot 'failed' so the scheduler retries; finished users are checkpointed.
+        raise RuntimeError(f"{summary['failed']} weekly report(s) failed for {run_key}")
+
+
+# job name -> (slot function, runner)
+SCHEDULED_JOBS = {
+    'daily_usage_report': (_scheduled_daily_slots, _run_scheduled_daily_report),
+    'weekly_athlete_reports': (_scheduled_weekly_slots, _run_scheduled_weekly_reports),
+}
+_scheduled_job_threads = {}
+
+
+def _acquire_scheduler_lease(holder, name='reports'):
+    """Take or renew the scheduler lease. True if `holder` is the leader until the lease expires.
+    The lease is free when no row exists, it is already ours, or the previous holder let it lapse."""
+    now = time.time()
+    try:
+        with db_transaction(immediate=True) as conn:
+            row = conn.execute('SELECT holder, expires_at FROM scheduler_lease WHERE name = ?',
+                               (name,)).fetchone()
+            if row is not None and row['holder'] != holder and row['expires_at'] > now:
+                return False
+            if row is None or row['holder'] != holder:
+                conn.execute(
+                    'INSERT OR REPLACE INTO scheduler_lease (name, holder, expires_at, acquired_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    (name, holder, now + SCHEDULER_LEASE_SECONDS, now),
+                )
+                logger.info(f"Report scheduler lease '{name}' acquired by {holder}")
+            else:
+                conn.execute('UPDATE scheduler_lease SET expires_at = ? WHERE name = ?',
+                             (now + SCHEDULER_LEASE_SECONDS, name))
+        return True
+    except sqlite3.OperationalError as e:
+        # Lock contention with another worker: just try again on the next poll.
+        logger.warning(f"Scheduler lease check failed: {e}")
+        return False
+
+
+def _seed_scheduled_runs(job, run_keys):
+    """On the very first start of a job, mark its past slots as skipped so a
+    fresh deploy doesn't back-send reports for days it never ran."""
+    with db_transaction(immediate=True) as conn:
+        if conn.execute('SELECT 1 FROM scheduled_runs WHERE job = ? LIMIT 1', (job,)).fetchone():
+            return False
+        now = time.time()
+        conn.executemany(
+            "INSERT OR IGNORE INTO scheduled_runs (job, run_key, status, attempts, finished_at) "
+            "VALUES (?, ?, 'skipped', 0, ?)",
+            [(job, k, now) for k in run_keys],
+        )
+    return True
+
+
+def _claim_scheduled_run(job, run_key, holder):
+    """Atomically claim (job, run_key) for execution. Returns True if this holder should run it.
+    A failed run is re-claimed after SCHEDULER_RETRY_SECONDS up to SCHEDULER_MAX_ATTEMPTS;
+    a run left 'running' by another (dead) leader is taken over."""
+    now = time.time()
+    with db_transaction(immediate=True) as conn:
+        row = conn.execute('SELECT status, holder, attempts, finished_at FROM scheduled_runs '
+                           'WHERE job = ? AND run_key = ?', (job, run_key)).fetchone()
+        if row is None:
+            conn.execute(
+                "INSERT INTO scheduled_runs (job, run_key, status, holder, attempts, started_at) "
+                "VALUES (?, ?, 'running', ?, 1, ?)",
+                (job, run_key, holder, now),
+            )
+            return True
+        status = row['status']
+        if status in ('done', 'skipped'):
+            return False
+        if status == 'running' and row['holder'] == holder:
+            return False  # already in flight in this process
+        if status == 'failed':
+            if row['attempts'] >= SCHEDULER_MAX_ATTEMPTS:
+                return False
+            if row['finished_at'] and now - row['finished_at'] < SCHEDULER_RETRY_SECONDS:
+                return False
+        conn.execute(
+            "UPDATE scheduled_runs SET status = 'running', holder = ?, attempts = attempts + 1, "
+            "started_at = ?, finished_at = NULL, error = NULL WHERE job = ? AND run_key = ?",
+            (holder, now, job, run_key),
+        )
+        return True
+
+
+def _finish_scheduled_run(job, run_key, error=None):
+    conn = get_db_connection()
+    conn.execute(
+        'UPDATE scheduled_runs SET status = ?, finished_at = ?, error = ? WHERE job = ? AND run_key = ?',
+        ('failed' if error else 'done', time.time(), (str(error)[:1000] if error else None), job, run_key),
+    )
+    conn.commit()
     conn.close()
 
-    ok = 0
-    for uid in user_ids:
+
+def _execute_scheduled_job(job, runner, run_keys, holder):
+    """Run the claimed slots of one job, oldest first, recording each outcome in the ledger."""
+    for run_key in run_keys:
         try:
-            if generate_weekly_report_for_user(uid, week_start, week_end):
-                ok += 1
+            if not _claim_scheduled_run(job, run_key, holder):
+                continue
         except Exception as e:
-            logger.error(f"Weekly report failed for user {uid}: {e}", exc_info=True)
-    logger.info(f"Weekly report batch done: {ok}/{len(user_ids)} reports for {week_start}..{week_end}")
-    return ok
+            logger.error(f"Could not claim {job} {run_key}: {e}", exc_info=True)
+            continue
+        logger.info(f"Scheduled run started: {job} {run_key}")
+        try:
+            runner(run_key)
+        except Exception as e:
+            logger.error(f"Scheduled run failed: {job} {run_key}: {e}", exc_info=True)
+            _finish_scheduled_run(job, run_key, error=e)
+        else:
+            _finish_scheduled_run(job, run_key)
+            logger.info(f"Scheduled run done: {job} {run_key}")
+
+
+def _report_scheduler_tick(holder):
+    """One leader pass: for each job, start a worker for any due slots not yet done.
+    Jobs run on their own threads so long batches don't stop the lease being renewed."""
+    now_ist = datetime.utcnow() + IST_OFFSET
+    for job, (slot_fn, runner) in SCHEDULED_JOBS.items():
+        worker = _scheduled_job_threads.get(job)
+        if worker is not None and worker.is_alive():
+            continue
+        run_keys = [k for k, _ in slot_fn(now_ist)]
+        if not run_keys:
+            continue
+        if _seed_scheduled_runs(job, run_keys):
+            logger.info(f"Scheduler ledger seeded for {job}: {len(run_keys)} past slot(s) skipped")
+            continue
+        conn = get_db_connection()
+        placeholders = ','.join('?' * len(run_keys))
+        settled = {
+            r['run_key'] for r in conn.execute(
+                f"SELECT run_key FROM scheduled_runs WHERE job = ? AND run_key IN ({placeholders}) "
+                f"AND (status IN ('done', 'skipped') OR (status = 'failed' AND attempts >= ?))",
+                (job, *run_keys, SCHEDULER_MAX_ATTEMPTS),
+            ).fetchall()
+        }
+        conn.close()
+        pending = [k for k in run_keys if k not in settled]
+        if not pending:
+            continue
+        t = threading.Thread(target=_execute_scheduled_job, args=(job, runner, pending, holder),
+                             name=f"scheduled-{job}", daemon=True)
+        _scheduled_job_threads[job] = t
+        t.start()
 
 
-def _weekly_report_scheduler():
-    """Background loop that generates per-athlete weekly reports at the configured IST time/day."""
+def _report_scheduler_loop(holder):
+    """Background loop: every worker polls, only the lease holder runs due jobs."""
     while True:
         try:
-            now_ist = datetime.utcnow() + IST_OFFSET
-            target_ist = now_ist.replace(hour=WEEKLY_REPORT_HOUR, minute=WEEKLY_REPORT_MINUTE,
-                                         second=0, microsecond=0)
-            # Advance to the next configured weekday (today if it's still in the future).
-            days_ahead = (WEEKLY_REPORT_DOW - target_ist.weekday()) % 7
-            target_ist += timedelta(days=days_ahead)
-            if target_ist <= now_ist:
-                target_ist += timedelta(days=7)
-            time.sleep(max(1, (target_ist - now_ist).total_seconds()))
-            # Report on the week that just completed: the 7 days ending yesterday (IST).
-            end = (datetime.utcnow() + IST_OFFSET).date() - timedelta(days=1)
-            start = end - timedelta(days=6)
-            _run_weekly_reports_batch(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+            if _acquire_scheduler_lease(holder):
+                _report_scheduler_tick(holder)
         except Exception as e:
-            logger.error(f"Weekly report scheduler error: {e}", exc_info=True)
-            time.sleep(60)  # avoid a tight crash loop
+            logger.error(f"Report scheduler error: {e}", exc_info=True)
+        time.sleep(SCHEDULER_POLL_SECONDS)
 
 
-def start_weekly_report_scheduler():
-    """Start the weekly athlete-report background thread once."""
-    global _weekly_report_scheduler_started
-    if _weekly_report_scheduler_started:
+def start_report_scheduler():
+    """Start the report scheduler thread once per process. Every gunicorn worker
+    runs one, but a shared SQLite lease lets only one of them execute jobs."""
+    global _report_scheduler_started, _report_scheduler_holder
+    if _report_scheduler_started or not REPORT_SCHEDULER_ENABLED:
         return
-    _weekly_report_scheduler_started = True
-    t = threading.Thread(target=_weekly_report_scheduler, daemon=True)
+    _report_scheduler_started = True
+    # Built here (not at import) so workers forked from a preloaded app get distinct ids.
+    _report_scheduler_holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    t = threading.Thread(target=_report_scheduler_loop, args=(_report_scheduler_holder,),
+                         name="report-scheduler", daemon=True)
     t.start()
     dow_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
     logger.info(
-        f"Weekly athlete-monitoring report scheduler started "
-        f"(weekly on {dow_names[WEEKLY_REPORT_DOW % 7]} at "
-        f"{WEEKLY_REPORT_HOUR:02d}:{WEEKLY_REPORT_MINUTE:02d} IST)"
+        f"Report scheduler started as {_report_scheduler_holder} "
+        f"(daily usage at {DAILY_REPORT_HOUR:02d}:{DAILY_REPORT_MINUTE:02d} IST to {ADMIN_REPORT_RECIPIENTS}, "
+        f"includes rolling {RETURNING_WINDOW_DAYS}-day returning-users section; "
+        f"weekly athlete reports on {dow_names[WEEKLY_REPORT_DOW % 7]} at "
+        f"{WEEKLY_REPORT_HOUR:02d}:{WEEKLY_REPORT_MINUTE:02d} IST; catch-up {SCHEDULER_CATCHUP_DAYS} day(s))"
     )
 
 
@@ -908,53 +1551,44 @@ def get_entitlements(user_id: int):
 
 def consume_one_analysis_credit(user_id: int) -> (bool, dict):
     """Atomically consume 1 analysis credit. Returns (ok, entitlements_after)."""
-    conn = get_db_connection()
     try:
-        _ensure_entitlements_row(conn, user_id)
-        cur = conn.cursor()
-        cur.execute('BEGIN IMMEDIATE')
-        cur.execute('SELECT analysis_credits_remaining, feature_compare, feature_ball_speed FROM user_entitlements WHERE user_id = ?', (user_id,))
-        row = cur.fetchone()
-        remaining = int(row["analysis_credits_remaining"] or 0) if row else 0
-        if remaining <= 0:
-            conn.rollback()
-            return False, {
-                "analysis_credits_remaining": remaining,
-                "feature_compare": bool(row["feature_compare"]) if row else False,
-                "feature_ball_speed": bool(row["feature_ball_speed"]) if row else False,
-            }
+        with db_transaction(immediate=True) as conn:
+            _ensure_entitlements_row(conn, user_id)
+            cur = conn.cursor()
+            cur.execute('SELECT analysis_credits_remaining, feature_compare, feature_ball_speed FROM user_entitlements WHERE user_id = ?', (user_id,))
+            row = cur.fetchone()
+            remaining = int(row["analysis_credits_remaining"] or 0) if row else 0
+            if remaining <= 0:
+                return False, {
+                    "analysis_credits_remaining": remaining,
+                    "feature_compare": bool(row["feature_compare"]) if row else False,
+                    "feature_ball_speed": bool(row["feature_ball_speed"]) if row else False,
+                }
 
-        new_remaining = remaining - 1
-        cur.execute(
-            'UPDATE user_entitlements SET analysis_credits_remaining = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?',
-            (new_remaining, user_id)
-        )
-        conn.commit()
-        return True, {
-            "analysis_credits_remaining": new_remaining,
-            "feature_compare": bool(row["feature_compare"]),
-            "feature_ball_speed": bool(row["feature_ball_speed"]),
-        }
+            new_remaining = remaining - 1
+            cur.execute(
+                'UPDATE user_entitlements SET analysis_credits_remaining = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?',
+                (new_remaining, user_id)
+            )
+            return True, {
+                "analysis_credits_remaining": new_remaining,
+                "feature_compare": bool(row["feature_compare"]),
+                "feature_ball_speed": bool(row["feature_ball_speed"]),
+            }
     except Exception as e:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
         logger.error(f"Failed to consume credit for user {user_id}: {e}", exc_info=True)
         return False, get_entitlements(user_id)
-    finally:
-        conn.close()
 
 
 def apply_plan_purchase(user_id: int, plan_id: str) -> dict:
     plan = PLAN_DEFINITIONS.get(plan_id)
     if not plan:
         raise ValueError("Invalid plan_id")
-    conn = get_db_connection()
-    try:
+    # BEGIN IMMEDIATE comes first so the row-ensure insert runs inside the same
+    # write transaction as the read-modify-write below.
+    with db_transaction(immediate=True) as conn:
         _ensure_entitlements_row(conn, user_id)
         cur = conn.cursor()
-        cur.execute('BEGIN IMMEDIATE')
         cur.execute('SELECT analysis_credits_remaining, feature_compare, feature_ball_speed FROM user_entitlements WHERE user_id = ?', (user_id,))
         row = cur.fetchone()
         remaining = int(row["analysis_credits_remaining"] or 0) if row else 0
@@ -965,20 +1599,11 @@ def apply_plan_purchase(user_id: int, plan_id: str) -> dict:
             'UPDATE user_entitlements SET analysis_credits_remaining = ?, feature_compare = ?, feature_ball_speed = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?',
             (new_remaining, feature_compare, feature_ball_speed, user_id)
         )
-        conn.commit()
         return {
             "analysis_credits_remaining": new_remaining,
             "feature_compare": bool(feature_compare),
             "feature_ball_speed": bool(feature_ball_speed),
         }
-    except Exception:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-        raise
-    finally:
-        conn.close()
 
 def normalize_feature(name: str) -> str:
     return name.lower().strip()
@@ -1092,6 +1717,42 @@ JOBS_SUBFOLDER = 'jobs'
 S3_BUCKET = (os.getenv("S3_BUCKET") or os.getenv("AWS_S3_BUCKET") or "").strip() or None
 AWS_REGION = (os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "").strip() or None
 S3_BASE_PREFIX = (os.getenv("S3_BASE_PREFIX") or "").strip().strip("/")
+# Optional S3-compatible endpoint (MinIO, LocalStack) instead of AWS.
+S3_ENDPOINT_URL = (os.getenv("S3_ENDPOINT_URL") or "").strip() or None
+S3_PRESIGN_EXPIRES_SECONDS = int(os.getenv("S3_PRESIGN_EXPIRES_SECONDS", "900"))
+S3_DIRECT_UPLOAD_MAX_BYTES = int(os.getenv("S3_DIRECT_UPLOAD_MAX_BYTES", str(500 * 1024 * 1024)))
+
+# Uploaded clips must show a single shot.
+MAX_VIDEO_DURATION_SECONDS = 5
+# Longer clips (e.g. a whole net session) are trimmed to their highest-motion
+# MAX_VIDEO_DURATION_SECONDS window before analysis instead of being rejected.
+AUTO_TRIM_LONG_VIDEOS = os.getenv('AUTO_TRIM_LONG_VIDEOS', '1') == '1'
+MAX_UPLOAD_DURATION_SECONDS = int(os.getenv('MAX_UPLOAD_DURATION_SECONDS', '900'))
+ACTION_WINDOW_SAMPLE_FPS = float(os.getenv('ACTION_WINDOW_SAMPLE_FPS', '10'))
+ACTION_WINDOW_THUMB_SIZE = int(os.getenv('ACTION_WINDOW_THUMB_SIZE', '64'))
+# The motion pre-pass only needs coarse thumbnails, so the decoder skips work:
+# "nonref" drops frames nothing else references, "nokey" keeps keyframes only
+# (fastest, but too sparse for session splitting on long-GOP phone video).
+ACTION_WINDOW_SKIP_FRAME = os.getenv('ACTION_WINDOW_SKIP_FRAME', 'nonref').strip() or 'default'
+ACTION_WINDOW_TIMEOUT_SECONDS = int(os.getenv('ACTION_WINDOW_TIMEOUT_SECONDS', '120'))
+# Longest clip an upload may be; anything above MAX_VIDEO_DURATION_SECONDS gets trimmed.
+MAX_ACCEPTED_VIDEO_SECONDS = MAX_UPLOAD_DURATION_SECONDS if AUTO_TRIM_LONG_VIDEOS else MAX_VIDEO_DURATION_SECONDS
+
+
+def _max_accepted_duration(form=None) -> int:
+    """Longest upload accepted for this form; session uploads are split, never rejected for length."""
+    if _is_session_upload(form):
+        return MAX_UPLOAD_DURATION_SECONDS
+    return MAX_ACCEPTED_VIDEO_SECONDS
+
+
+def _video_too_long_message() -> str:
+    if AUTO_TRIM_LONG_VIDEOS:
+        return (
+            f"The video you uploaded is too long. Please upload a clip of "
+            f"{MAX_UPLOAD_DURATION_SECONDS // 60} minutes or less."
+        )
+    return "The video you uploaded is large. You need to upload a video of a particular shot and of 5 seconds."
 
 
 def _sanitize_s3_folder_component(value: str) -> str:
@@ -1115,35 +1776,152 @@ def _build_s3_video_key(username: str, filename: str, job_id=None) -> str:
     return key
 
 
+# Object storage for uploaded videos: S3, or with STORAGE_BACKEND=local a local
+# directory (development/tests only; nothing prunes it). Without a bucket, S3 mode
+# fails uploads loudly rather than filling the disk. One shared, pooled client per process.
+STORAGE_BACKEND = (os.getenv("STORAGE_BACKEND") or "s3").strip().lower()
+LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT", os.path.join(UPLOAD_FOLDER, "_object_store"))
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+S3_MULTIPART_THRESHOLD_MB = int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "16"))
+S3_MULTIPART_CHUNK_MB = int(os.getenv("S3_MULTIPART_CHUNK_MB", "8"))
+S3_TRANSFER_CONCURRENCY = int(os.getenv("S3_TRANSFER_CONCURRENCY", "8"))
+# Upload from a background queue (durable outbox + retry) so /api/upload returns
+# without waiting on S3. Set to 0 to upload inline as before.
+S3_ASYNC_UPLOADS = os.getenv("S3_ASYNC_UPLOADS", "1") == "1"
+S3_UPLOAD_WORKERS = int(os.getenv("S3_UPLOAD_WORKERS", "2"))
+S3_UPLOAD_MAX_ATTEMPTS = int(os.getenv("S3_UPLOAD_MAX_ATTEMPTS", "6"))
+
+if STORAGE_BACKEND == "s3":
+    video_store = S3Storage(
+        S3_BUCKET,
+        region=AWS_REGION,
+        endpoint_url=S3_ENDPOINT_URL,
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        multipart_threshold_mb=S3_MULTIPART_THRESHOLD_MB,
+        multipart_chunksize_mb=S3_MULTIPART_CHUNK_MB,
+        max_concurrency=S3_TRANSFER_CONCURRENCY,
+    )
+else:
+    video_store = LocalStorage(LOCAL_STORAGE_ROOT)
+
+
+def _require_video_store():
+    if STORAGE_BACKEND == "s3" and not S3_BUCKET:
+        raise RuntimeError("S3_BUCKET is not configured on the server.")
+
+
 def upload_video_to_s3(local_path: str, username: str, filename: str, *, job_id=None, content_type=None) -> dict:
     """
     Upload a local file to S3 under a username folder and return upload metadata.
     Requires env var S3_BUCKET (or AWS_S3_BUCKET). Uses default AWS credential resolution chain.
+    Large files go up as parallel multipart uploads.
     """
-    if not S3_BUCKET:
-        raise RuntimeError("S3_BUCKET is not configured on the server.")
-    if boto3 is None:
-        raise RuntimeError("boto3 is not installed on the server. Please add it to your dependencies.")
-
+    _require_video_store()
     key = _build_s3_video_key(username, filename, job_id=job_id)
-    client = boto3.client("s3", region_name=AWS_REGION) if AWS_REGION else boto3.client("s3")
-    extra_args = {}
-    if content_type:
-        extra_args["ContentType"] = content_type
-
-    try:
-        if extra_args:
-            client.upload_file(local_path, S3_BUCKET, key, ExtraArgs=extra_args)
-        else:
-            client.upload_file(local_path, S3_BUCKET, key)
-    except (BotoCoreError, ClientError) as e:
-        raise RuntimeError(f"Failed to upload to S3 (bucket={S3_BUCKET}, key={key}): {e}")
-
-    return {
-        "bucket": S3_BUCKET,
-        "key": key,
-        "uri": f"s3://{S3_BUCKET}/{key}",
-    }
+    return video_store.upload_file(local_path, key, content_type=content_type)
+
+
+def _on_video_uploaded(meta, result, error):
+    """UploadQueue callback: record the outcome of a background upload on its job."""
+    user_id, job_id = meta.get("user_id"), meta.get("job_id")
+    if user_id is None or not job_id:
+        return
+    with job_update(user_id, job_id, create=False) as job:
+        if job is None:
+            return
+        job.update({
+            "video_s3_status": "uploaded" if result else "failed",
+            "video_s3_error": error,
+        })
+        dispatch = job.pop("dispatch_pending", False)
+    if not dispatch:
+        return
+    if result:
+        dispatch_analysis_job(job_id, user_id, job.get("username"), None, job.get("filename"),
+                              job.get("form") or {}, job.get("expo_push_token"))
+    else:
+        _fail_analysis_job(job_id, user_id, job.get("filename"),
+                           "Video upload to storage failed. Please upload again.", job.get("expo_push_token"))
+
+
+video_upload_queue = UploadQueue(
+    video_store,
+    os.path.join(UPLOAD_FOLDER, "_outbox"),
+    workers=S3_UPLOAD_WORKERS,
+    max_attempts=S3_UPLOAD_MAX_ATTEMPTS,
+    on_done=_on_video_uploaded,
+)
+
+
+def enqueue_video_upload(local_path: str, username: str, filename: str, *, user_id, job_id, content_type=None, job=None) -> dict:
+    """
+    Like upload_video_to_s3, but returns once the file is durably staged in the
+    outbox; the queue uploads it (with retry) and marks the job's video_s3_status.
+    If `job` is given it is saved with the object location before the upload is
+    queued, so the completion callback always finds it.
+    """
+    _require_video_store()
+    key = _build_s3_video_key(username, filename, job_id=job_id)
+    info = {
+        "bucket": video_store.bucket,
+        "key": key,
+        "uri": video_store.uri(key),
+        "status": "pending",
+    }
+    if job is not None:
+        job.update({
+            "video_s3_bucket": info["bucket"],
+            "video_s3_key": key,
+            "video_s3_uri": info["uri"],
+            "video_s3_status": "pending",
+        })
+        save_job(user_id, job)
+    video_upload_queue.submit(local_path, key, content_type=content_type,
+                              meta={"user_id": user_id, "job_id": job_id})
+    return info
+
+
+def presign_video_upload(username: str, filename: str, *, job_id, content_type=None) -> dict:
+    """
+    Presigned PUT URL so the app uploads the video straight to S3 instead of through
+    Flask. The key is the same one upload_video_to_s3 would use for this job.
+    """
+    _require_video_store()
+    key = _build_s3_video_key(username, filename, job_id=job_id)
+    url = video_store.presign_put(key, content_type=content_type, expires_in=S3_PRESIGN_EXPIRES_SECONDS)
+    return {
+        "bucket": video_store.bucket,
+        "key": key,
+        "uri": video_store.uri(key),
+        "upload_url": url,
+        "method": "PUT",
+        "headers": {"Content-Type": content_type} if content_type else {},
+        "expires_in": S3_PRESIGN_EXPIRES_SECONDS,
+    }
+
+
+def head_s3_object(bucket: str, key: str):
+    """Object metadata (ContentLength, ContentType, ETag, ...), or None if it doesn't exist."""
+    return video_store.head(key, bucket=bucket)
+
+
+def download_video_from_s3(bucket: str, key: str, local_path: str) -> str:
+    """
+    Stream an object to local_path. Ranged chunks go straight to disk, so the body
+    is never held in memory; it lands under a temp name and is renamed, so a
+    half-downloaded file is never analysed.
+    """
+    tmp_path = f"{local_path}.{uuid.uuid4().hex[:8]}.part"
+    try:
+        video_store.download_file(key, tmp_path, bucket=bucket)
+        os.replace(tmp_path, local_path)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    return local_path
 
 
 
@@ -1160,46 +1938,111 @@ def _try_open_video_with_opencv(video_path: str) -> bool:
         except Exception:
             pass
 
-def get_video_duration_seconds(video_path: str):
-    """
-    Return the duration of a video in seconds, or None if it can't be determined.
-    Tries ffprobe first (most reliable across containers/codecs), then falls back to OpenCV.
-    """
-    # 1) Try ffprobe (part of the ffmpeg suite) for an accurate duration.
-    ffprobe = shutil.which("ffprobe")
-    if ffprobe:
+# Probe results, keyed by content hash (and by path/size/mtime for files not yet
+# hashed), so re-uploads and later pipeline stages don't spawn ffprobe again.
+VIDEO_PROBE_CACHE_SIZE = int(os.getenv('VIDEO_PROBE_CACHE_SIZE', '512'))
+_video_probe_cache = OrderedDict()
+_video_probe_cache_lock = threading.Lock()
+
+
+def _file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _parse_frame_rate(value):
+    try:
+        num, _, den = str(value or '').partition('/')
+        rate = float(num) / float(den or 1)
+        return rate if rate > 0 else None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _probe_with_ffprobe(ffprobe: str, video_path: str):
+    out = subprocess.run(
+        [ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", video_path],
+        capture_output=True,
+        text=True,
+        timeout=30,
+    )
+    if out.returncode != 0 or not out.stdout:
+        return None
+    data = json.loads(out.stdout)
+    streams = data.get("streams") or []
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video is None:
+        return None
+    fmt = data.get("format") or {}
+
+    duration = None
+    for value in (fmt.get("duration"), video.get("duration")):
         try:
-            out = subprocess.run(
-                [
-                    ffprobe,
-                    "-v", "error",
-                    "-show_entries", "format=duration",
-                    "-of", "default=noprint_wrappers=1:nokey=1",
-                    video_path,
-                ],
-                capture_output=True,
-                text=True,
-                timeout=30,
-            )
-            value = (out.stdout or "").strip()
-            if value:
-                duration = float(value)
-                if duration > 0:
-                    return duration
-        except Exception:
-            pass
+            duration = float(value)
+            if duration > 0:
+                break
+        except (TypeError, ValueError):
+            duration = None
+    fps = _parse_frame_rate(video.get("avg_frame_rate")) or _parse_frame_rate(video.get("r_frame_rate"))
+    try:
+        frame_count = int(video.get("nb_frames"))
+    except (TypeError, ValueError):
+        frame_count = int(round(duration * fps)) if duration and fps else None
 
-    # 2) Fall back to OpenCV (frame_count / fps).
+    rotation = 0
+    try:
+        rotation = int(float((video.get("tags") or {}).get("rotate") or 0))
+    except (TypeError, ValueError):
+        pass
+    for side in video.get("side_data_list") or []:
+        if "rotation" in side:
+            try:
+                rotation = int(float(side["rotation"]))
+            except (TypeError, ValueError):
+                pass
+    rotation %= 360
+
+    return {
+        "duration": duration,
+        "width": int(video.get("width") or 0),
+        "height": int(video.get("height") or 0),
+        "fps": fps,
+        "frame_count": frame_count,
+        "codec": video.get("codec_name"),
+        "pix_fmt": video.get("pix_fmt"),
+        "rotation": rotation,
+        "container": fmt.get("format_name"),
+        "bit_rate": int(fmt["bit_rate"]) if str(fmt.get("bit_rate") or "").isdigit() else None,
+        "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+    }
+
+
+def _probe_with_opencv(video_path: str):
     cap = None
     try:
         cap = cv2.VideoCapture(video_path)
-        if cap and cap.isOpened():
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-            if fps and fps > 0 and frame_count and frame_count > 0:
-                return float(frame_count) / float(fps)
+        if not cap or not cap.isOpened():
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS) or None
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0) or None
+        return {
+            "duration": float(frame_count) / float(fps) if fps and frame_count else None,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0),
+            "fps": fps,
+            "frame_count": frame_count,
+            "codec": None,
+            "pix_fmt": None,
+            "rotation": 0,
+            "container": None,
+            "bit_rate": None,
+            "has_audio": None,
+        }
     except Exception:
-        pass
+        return None
     finally:
         try:
             if cap:
@@ -1207,164 +2050,479 @@ def get_video_duration_seconds(video_path: str):
         except Exception:
             pass
 
-    return None
 
-def _transcode_to_mp4_ffmpeg(input_path: str, output_path: str) -> None:
+def probe_video(video_path: str, content_hash: str = None):
     """
-    Transcode video to MP4 (H.264/AAC) using ffmpeg.
-    This is primarily to handle iPhone .mov files that OpenCV can't decode on the server.
+    All the metadata the pipeline needs from one `ffprobe -show_streams -show_format`
+    JSON call (OpenCV if ffprobe is missing): duration, width/height (coded),
+    display_width/display_height (after rotation), fps, frame_count, codec,
+    pix_fmt, rotation, container, bit_rate, has_audio. Returns None if the file
+    has no readable video stream. Cached by content hash and by path/size/mtime.
     """
-    ffmpeg = shutil.which("ffmpeg")
-    if not ffmpeg:
-        raise RuntimeError(
-            "Server cannot process this video format (ffmpeg not installed). "
-            "Please upload an MP4 file or install ffmpeg on the server."
-        )
+    try:
+        st = os.stat(video_path)
+    except OSError:
+        return None
+    path_key = ("path", os.path.abspath(video_path), st.st_size, st.st_mtime_ns)
+    keys = [path_key] + ([("sha256", content_hash)] if content_hash else [])
+    with _video_probe_cache_lock:
+        for key in keys:
+            if key in _video_probe_cache:
+                _video_probe_cache.move_to_end(key)
+                return dict(_video_probe_cache[key])
+
+    probe = None
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe:
+        try:
+            probe = _probe_with_ffprobe(ffprobe, video_path)
+        except Exception as e:
+            logger.warning(f"⚠️ [PROBE] ffprobe failed for {video_path}: {e}")
+    if probe is None:
+        probe = _probe_with_opencv(video_path)
+    elif not probe["duration"] or not probe["fps"] or not probe["frame_count"]:
+        # Streamed WebM/MKV (e.g. MediaRecorder) often carry no duration in the header.
+        fallback = _probe_with_opencv(video_path) or {}
+        for field in ("duration", "fps", "frame_count"):
+            if not probe[field] and fallback.get(field):
+                probe[field] = fallback[field]
+    if probe is None:
+        return None
 
-    # -movflags +faststart helps streaming / progressive download
-    cmd = [
-        ffmpeg,
-        "-y",
-        "-i", input_path,
-        "-c:v", "libx264",
-        "-preset", "veryfast",
-        "-crf", "23",
-        "-c:a", "aac",
-        "-b:a", "128k",
-        "-movflags", "+faststart",
-        output_path,
-    ]
-    logger.info(f"🎞️ [TRANSCODE] Running ffmpeg transcode: {' '.join(cmd[:6])} ... -> {output_path}")
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if proc.returncode != 0:
-        # Include last part of stderr for debugging but avoid massive logs
-        tail = (proc.stderr or "")[-2000:]
-        raise RuntimeError(f"Failed to transcode video to MP4 (ffmpeg error). Details: {tail}")
-
-def _downscale_video_for_memory_efficiency(video_path: str, job_id: str = "", user_id: str = "") -> str:
+    if probe["rotation"] in (90, 270):
+        probe["display_width"], probe["display_height"] = probe["height"], probe["width"]
+    else:
+        probe["display_width"], probe["display_height"] = probe["width"], probe["height"]
+    probe["size_bytes"] = st.st_size
+    if content_hash:
+        probe["sha256"] = content_hash
+
+    with _video_probe_cache_lock:
+        for key in keys:
+            _video_probe_cache[key] = probe
+            _video_probe_cache.move_to_end(key)
+        while len(_video_probe_cache) > VIDEO_PROBE_CACHE_SIZE:
+            _video_probe_cache.popitem(last=False)
+    return dict(probe)
+
+
+def get_video_duration_seconds(video_path: str):
+    """
+    Return the duration of a video in seconds, or None if it can't be determined.
     """
-    Downscale high-resolution videos to prevent OOM kills on low-memory servers.
-    Target: max 1920x1080 resolution, 30fps max.
-    Returns path to downscaled video (or original if no downscaling needed).
+    probe = probe_video(video_path)
+    duration = probe.get("duration") if probe else None
+    return duration if duration and duration > 0 else None
+
+# Thumbnail posters for history: max width (px) and JPEG quality.
+POSTER_MAX_WIDTH = int(os.getenv('POSTER_MAX_WIDTH', '480'))
+POSTER_JPEG_QUALITY = int(os.getenv('POSTER_JPEG_QUALITY', '80'))
+
+
+def _faststart_remux_mp4(video_path: str) -> bool:
+    """
+    Move the MP4 'moov' atom to the front (stream copy, no re-encode) so players
+    can start before the whole file has downloaded. OpenCV's VideoWriter always
+    writes it at the end. Replaces the file in place; returns True on success.
     """
     ffmpeg = shutil.which("ffmpeg")
-    if not ffmpeg:
-        logger.warning(f"⚠️ [JOB {job_id}] ffmpeg not found - cannot downscale video. Proceeding with original.")
-        return video_path
+    if not ffmpeg or not video_path.lower().endswith(('.mp4', '.m4v', '.mov')):
+        return False
+    tmp_path = f"{video_path}.faststart{os.path.splitext(video_path)[1]}"
+    cmd = [ffmpeg, "-y", "-i", video_path, "-map", "0", "-c", "copy", "-movflags", "+faststart", tmp_path]
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=120)
+        if proc.returncode != 0 or not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+            logger.warning(f"⚠️ [FASTSTART] Remux failed for {video_path}: {(proc.stderr or '')[-500:]}")
+            return False
+        os.replace(tmp_path, video_path)
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ [FASTSTART] Remux error for {video_path}: {e}")
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _video_poster_path(video_path: str) -> str:
+    return os.path.join(os.path.dirname(video_path), f"poster_{os.path.basename(video_path)}.jpg")
+
+
+def ensure_video_poster(video_path: str):
+    """
+    Return the path of a cached JPEG poster frame for a video, creating it on first
+    use (or when the video is newer than the cached poster). Returns None if no
+    frame could be read.
+    """
+    poster_path = _video_poster_path(video_path)
+    try:
+        if os.path.exists(poster_path) and os.path.getmtime(poster_path) >= os.path.getmtime(video_path):
+            return poster_path
+    except OSError:
+        return None
 
-    # Check video properties
     cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
+    try:
+        if not cap.isOpened():
+            return None
+        # A frame a quarter of the way in is more representative than the first one.
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if frame_count > 4:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count // 4)
+        ok, frame = cap.read()
+        if not ok or frame is None:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = cap.read()
+        if not ok or frame is None:
+            return None
+    finally:
         cap.release()
-        return video_path  # Will be handled by ensure_video_readable_for_analysis
-    
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    cap.release()
 
-    # Target: max 1920x1080, 30fps
-    MAX_WIDTH = 1920
-    MAX_HEIGHT = 1080
-    MAX_FPS = 30.0
+    height, width = frame.shape[:2]
+    if width > POSTER_MAX_WIDTH:
+        frame = cv2.resize(frame, (POSTER_MAX_WIDTH, int(height * POSTER_MAX_WIDTH / width)),
+                           interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), POSTER_JPEG_QUALITY])
+    if not ok:
+        return None
+    tmp_path = f"{poster_path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(buf.tobytes())
+    os.replace(tmp_path, poster_path)
+    return poster_path
+
 
-    # Check if downscaling is needed
-    needs_downscale = width > MAX_WIDTH or height > MAX_HEIGHT
-    needs_fps_reduce = fps > MAX_FPS
+# Optional HLS packaging of annotated videos (short H.264 segments start faster on
+# cellular than one progressive MP4). Off by default; needs ffmpeg with libx264.
+HLS_PACKAGING_ENABLED = os.getenv('HLS_PACKAGING_ENABLED', '0') == '1'
+HLS_SEGMENT_SECONDS = int(os.getenv('HLS_SEGMENT_SECONDS', '2'))
+HLS_MAX_HEIGHT = int(os.getenv('HLS_MAX_HEIGHT', '720'))
+HLS_VIDEO_CRF = int(os.getenv('HLS_VIDEO_CRF', '23'))
+HLS_PLAYLIST_NAME = 'index.m3u8'
+_HLS_SEGMENT_RE = re.compile(r'^seg_\d{5}\.ts$')
 
-    if not needs_downscale and not needs_fps_reduce:
-        logger.info(f"✅ [JOB {job_id}] Video resolution {width}x{height} @ {fps:.1f}fps is acceptable - no downscaling needed")
-        return video_path
 
-    # Calculate new dimensions (maintain aspect ratio)
-    if needs_downscale:
-        if width > height:  # Landscape
-            scale = min(MAX_WIDTH / width, MAX_HEIGHT / height)
-        else:  # Portrait
-            scale = min(MAX_WIDTH / width, MAX_HEIGHT / height)
+def _hls_dir(video_path: str) -> str:
+    return os.path.join(os.path.dirname(video_path), f"hls_{os.path.basename(video_path)}")
+
+
+def package_video_hls(video_path: str):
+    """
+    Package a video as VOD HLS: one H.264 rendition (capped at HLS_MAX_HEIGHT) cut
+    into HLS_SEGMENT_SECONDS segments, keyframe-aligned so every segment starts
+    cleanly. Written next to the video as hls_<name>/index.m3u8 + seg_NNNNN.ts.
+    Built in a scratch directory and swapped in, so readers never see a partial
+    playlist. Returns the playlist path, or None if packaging failed.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        logger.warning("⚠️ [HLS] ffmpeg not installed; skipping HLS packaging")
+        return None
+    out_dir = _hls_dir(video_path)
+    tmp_dir = f"{out_dir}.{uuid.uuid4().hex[:8]}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    seg = max(1, HLS_SEGMENT_SECONDS)
+    cmd = [
+        ffmpeg, "-y", "-i", video_path,
+        "-map", "0:v:0", "-an",
+        # Never upscale; keep width even for yuv420p.
+        "-vf", f"scale=-2:'min({HLS_MAX_HEIGHT},ih)'",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", str(HLS_VIDEO_CRF),
+        "-profile:v", "main", "-pix_fmt", "yuv420p",
+        "-force_key_frames", f"expr:gte(t,n_forced*{seg})", "-sc_threshold", "0",
+        "-f", "hls", "-hls_time", str(seg), "-hls_playlist_type", "vod",
+        "-hls_segment_filename", os.path.join(tmp_dir, "seg_%05d.ts"),
+        os.path.join(tmp_dir, HLS_PLAYLIST_NAME),
+    ]
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=300)
+        if proc.returncode != 0 or not os.path.exists(os.path.join(tmp_dir, HLS_PLAYLIST_NAME)):
+            logger.warning(f"⚠️ [HLS] Packaging failed for {video_path}: {(proc.stderr or '')[-500:]}")
+            return None
+        if os.path.isdir(out_dir):
+            shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp_dir, out_dir)
+        return os.path.join(out_dir, HLS_PLAYLIST_NAME)
+    except Exception as e:
+        logger.warning(f"⚠️ [HLS] Packaging error for {video_path}: {e}")
+        return None
+    finally:
+        if os.path.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# Analysis input limits: pose extraction never needs more than 1080p / 30 fps.
+ANALYSIS_MAX_WIDTH = int(os.getenv('ANALYSIS_MAX_WIDTH', '1920'))
+ANALYSIS_MAX_HEIGHT = int(os.getenv('ANALYSIS_MAX_HEIGHT', '1080'))
+ANALYSIS_MAX_FPS = float(os.getenv('ANALYSIS_MAX_FPS', '30'))
+# CPU budget for the one ffmpeg pass: libx264 preset and encoder threads (0 = ffmpeg decides).
+ANALYSIS_FFMPEG_PRESET = os.getenv('ANALYSIS_FFMPEG_PRESET', 'veryfast')
+ANALYSIS_FFMPEG_THREADS = int(os.getenv('ANALYSIS_FFMPEG_THREADS', str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+ANALYSIS_FFMPEG_TIMEOUT_SECONDS = int(os.getenv('ANALYSIS_FFMPEG_TIMEOUT_SECONDS', '300'))
+# Containers we transcode when OpenCV can't decode them (typically iPhone HEVC .mov).
+TRANSCODABLE_VIDEO_EXTENSIONS = {"mov", "avi", "mkv"}
+
+
+def plan_analysis_input(video_path: str, probe=None) -> dict:
+    """
+    Decide, from probed metadata, what the analysis input needs: a transcode
+    (OpenCV can't decode the file), a downscale and/or an fps cap. Everything
+    the plan asks for is done by one ffmpeg command in prepare_analysis_input().
+    """
+    readable = _try_open_video_with_opencv(video_path)
+    ext = (os.path.splitext(video_path)[1] or "").lower().lstrip(".")
+    plan = {
+        "transcode": not readable,
+        "transcodable": readable or ext in TRANSCODABLE_VIDEO_EXTENSIONS,
+        "width": None,
+        "height": None,
+        "fps": None,
+        "scale": None,
+        "target_fps": None,
+    }
+    probe = probe or probe_video(video_path)
+    if not probe:
+        return plan
+
+    # ffmpeg auto-rotates before filters run, so limits apply to the displayed frame.
+    width = probe.get("display_width") or 0
+    height = probe.get("display_height") or 0
+    fps = probe.get("fps") or 0.0
+    plan.update(width=width, height=height, fps=fps)
+
+    if width and height and (width > ANALYSIS_MAX_WIDTH or height > ANALYSIS_MAX_HEIGHT):
+        scale = min(ANALYSIS_MAX_WIDTH / width, ANALYSIS_MAX_HEIGHT / height)
+        # Even dimensions (required by libx264 with yuv420p)
         new_width = int(width * scale)
         new_height = int(height * scale)
-        # Ensure even dimensions (required by some codecs)
-        new_width = new_width - (new_width % 2)
-        new_height = new_height - (new_height % 2)
-    else:
-        new_width = width
-        new_height = height
+        plan["scale"] = (new_width - (new_width % 2), new_height - (new_height % 2))
+    if fps > ANALYSIS_MAX_FPS:
+        plan["target_fps"] = ANALYSIS_MAX_FPS
+    return plan
 
-    target_fps = min(fps, MAX_FPS) if needs_fps_reduce else fps
 
-    # Create downscaled video path
-    base, ext = os.path.splitext(video_path)
-    output_path = f"{base}__downscaled.mp4"
+def prepare_analysis_input(video_path: str, job_id: str = "", user_id: str = "", probe=None, trim=None,
+                           tag: str = "") -> str:
+    """
+    Return a path OpenCV can decode at no more than the analysis limits,
+    re-encoding at most once. Transcode and trim failures raise (the video can't
+    be analysed); a failed downscale/fps cap falls back to the original.
+    `probe` is the job's probe_video() result for this file, if it has one;
+    `trim` is a find_action_window() result to cut to in the same pass; `tag`
+    keeps outputs apart when one video yields several inputs (session segments).
+    """
+    plan = plan_analysis_input(video_path, probe)
+    needs_resize = bool(plan["scale"] or plan["target_fps"])
+    # Failures here leave nothing analysable, so they raise instead of falling back.
+    required = plan["transcode"] or bool(trim)
+
+    if not required and not needs_resize:
+        if plan["width"]:
+            logger.info(
+                f"✅ [JOB {job_id}] Video {plan['width']}x{plan['height']} @ {plan['fps']:.1f}fps "
+                f"is acceptable - no re-encode needed"
+            )
+        return video_path
 
-    logger.info(
-        f"📉 [JOB {job_id}] Downscaling video from {width}x{height} @ {fps:.1f}fps "
-        f"to {new_width}x{new_height} @ {target_fps:.1f}fps (user_id={user_id})"
-    )
+    if plan["transcode"] and not plan["transcodable"]:
+        raise RuntimeError(
+            "Server cannot read this video file for analysis. Please upload an MP4 (H.264) file."
+        )
 
-    # Build ffmpeg command
-    cmd = [
-        ffmpeg,
-        "-y",  # Overwrite output
-        "-i", video_path,
-        "-vf", f"scale={new_width}:{new_height}",
-        "-r", str(int(target_fps)),  # Set output FPS
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        if required:
+            raise RuntimeError(
+                "Server cannot process this video format (ffmpeg not installed). "
+                "Please upload an MP4 file or install ffmpeg on the server."
+            )
+        logger.warning(f"⚠️ [JOB {job_id}] ffmpeg not found - cannot downscale video. Proceeding with original.")
+        return video_path
+
+    filters = []
+    if plan["scale"]:
+        filters.append(f"scale={plan['scale'][0]}:{plan['scale'][1]}")
+    if plan["target_fps"]:
+        filters.append(f"fps={plan['target_fps']:g}")
+
+    base, _ = os.path.splitext(video_path)
+    output_path = f"{base}__analysis{'_' + tag if tag else ''}.mp4"
+    # Pose extraction only reads frames, so audio is dropped rather than re-encoded.
+    cmd = [ffmpeg, "-y"]
+    if trim:
+        # Input seeking, then a re-encode: the cut is frame-accurate, not keyframe-snapped.
+        cmd += ["-ss", f"{trim['start']:.3f}", "-t", f"{trim['duration']:.3f}"]
+    cmd += ["-i", video_path]
+    if filters:
+        cmd += ["-vf", ",".join(filters)]
+    cmd += [
         "-c:v", "libx264",
-        "-preset", "veryfast",  # Fast encoding
-        "-crf", "23",  # Good quality
-        "-c:a", "aac",
-        "-b:a", "128k",
+        "-preset", ANALYSIS_FFMPEG_PRESET,
+        "-crf", "23",
+        "-pix_fmt", "yuv420p",
+        "-threads", str(ANALYSIS_FFMPEG_THREADS),
+        "-an",
         "-movflags", "+faststart",
         output_path,
     ]
+    logger.info(
+        f"🎞️ [JOB {job_id}] Preparing analysis input in one ffmpeg pass "
+        f"(transcode={plan['transcode']}, trim={trim}, scale={plan['scale']}, fps={plan['target_fps']}, "
+        f"preset={ANALYSIS_FFMPEG_PRESET}, threads={ANALYSIS_FFMPEG_THREADS}, user_id={user_id}) -> {output_path}"
+    )
 
+    error = None
     try:
-        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=300)
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                              timeout=ANALYSIS_FFMPEG_TIMEOUT_SECONDS)
         if proc.returncode != 0:
-            logger.error(f"❌ [JOB {job_id}] ffmpeg downscale failed: {proc.stderr[-500:]}")
-            return video_path  # Fallback to original
+            # Include last part of stderr for debugging but avoid massive logs
+            error = (proc.stderr or "")[-2000:]
     except subprocess.TimeoutExpired:
-        logger.error(f"❌ [JOB {job_id}] ffmpeg downscale timed out")
-        return video_path  # Fallback to original
+        error = "ffmpeg timed out"
     except Exception as e:
-        logger.error(f"❌ [JOB {job_id}] ffmpeg downscale error: {str(e)}")
-        return video_path  # Fallback to original
+        error = str(e)
 
-    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-        logger.info(f"✅ [JOB {job_id}] Video downscaled successfully: {output_path}")
-        return output_path
-    else:
-        logger.warning(f"⚠️ [JOB {job_id}] Downscaled video not created or empty - using original")
+    if error is None and not (os.path.exists(output_path) and os.path.getsize(output_path) > 0):
+        error = "output not created or empty"
+    if error is None and plan["transcode"] and not _try_open_video_with_opencv(output_path):
+        raise RuntimeError(
+            "Video transcoded to MP4 but still not readable by the server. "
+            "Please export/upload an MP4 (H.264) file."
+        )
+    if error is not None:
+        if os.path.exists(output_path):
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+        if required:
+            raise RuntimeError(f"Failed to transcode video to MP4 (ffmpeg error). Details: {error}")
+        logger.error(f"❌ [JOB {job_id}] ffmpeg downscale failed, using original: {error[-500:]}")
         return video_path
 
-def ensure_video_readable_for_analysis(video_path: str, job_id: str = "", user_id: str = "") -> str:
+    logger.info(f"✅ [JOB {job_id}] Analysis input ready: {output_path}")
+    return output_path
+
+
+def _motion_energy_curve(video_path: str, job_id: str = ""):
     """
-    Ensure the given video is readable by OpenCV for downstream pose extraction.
-    If not, attempt to transcode to MP4 using ffmpeg and return the new path.
+    Frame-difference energy of a clip: ffmpeg decodes tiny grayscale thumbnails
+    at ACTION_WINDOW_SAMPLE_FPS and energy[i] is the mean absolute change
+    between samples i and i+1.
     """
-    if _try_open_video_with_opencv(video_path):
-        return video_path
-
-    ext = (os.path.splitext(video_path)[1] or "").lower().lstrip(".")
-    # Transcode known problematic containers/codecs on servers without proper OpenCV codec support
-    if ext in {"mov", "avi", "mkv"}:
-        base, _ = os.path.splitext(video_path)
-        output_path = f"{base}__transcoded.mp4"
-        logger.warning(
-            f"⚠️ [JOB {job_id}] OpenCV can't open video ({ext}). Attempting ffmpeg transcode to {output_path} "
-            f"(user_id={user_id})"
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError(
+            "Server cannot trim long videos (ffmpeg not installed). "
+            "Please upload a video of a particular shot and of 5 seconds."
         )
-        _transcode_to_mp4_ffmpeg(video_path, output_path)
-        if not _try_open_video_with_opencv(output_path):
-            raise RuntimeError(
-                "Video transcoded to MP4 but still not readable by the server. "
-                "Please export/upload an MP4 (H.264) file."
-            )
-        return output_path
+    size = ACTION_WINDOW_THUMB_SIZE
+    cmd = [
+        ffmpeg, "-v", "error",
+        # Decoder-side shortcuts (before -i): skip frames and deblocking, fast paths.
+        "-skip_frame", ACTION_WINDOW_SKIP_FRAME,
+        "-skip_loop_filter", "all",
+        "-flags2", "+fast",
+        "-threads", str(ANALYSIS_FFMPEG_THREADS),
+        "-i", video_path,
+        "-an", "-sn",
+        "-vf", f"fps={ACTION_WINDOW_SAMPLE_FPS:g},scale={size}:{size}:flags=fast_bilinear,format=gray",
+        "-f", "rawvideo", "pipe:1",
+    ]
+    started = time.time()
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              timeout=ACTION_WINDOW_TIMEOUT_SECONDS)
+    except subprocess.TimeoutExpired:
+        logger.error(f"❌ [JOB {job_id}] Motion pre-pass timed out after {ACTION_WINDOW_TIMEOUT_SECONDS}s")
+        raise RuntimeError(
+            "This video took too long to scan for the shot. "
+            "Please upload a shorter clip of a particular shot (about 5 seconds)."
+        )
+    frame_bytes = size * size
+    n_frames = len(proc.stdout) // frame_bytes
+    if proc.returncode != 0 or n_frames < 2:
+        tail = (proc.stderr or b"").decode("utf-8", "replace")[-500:]
+        raise RuntimeError(f"Could not find the shot in this video (ffmpeg error). Details: {tail}")
 
-    raise RuntimeError(
-        "Server cannot read this video file for analysis. Please upload an MP4 (H.264) file."
+    frames = np.frombuffer(proc.stdout[:n_frames * frame_bytes], dtype=np.uint8).reshape(n_frames, frame_bytes)
+    energy = np.abs(np.diff(frames.astype(np.int16), axis=0)).mean(axis=1)
+    logger.info(f"✂️ [JOB {job_id}] Motion curve from {n_frames} thumbnails in {time.time() - started:.1f}s")
+    return energy
+
+
+def find_action_window(video_path: str, duration: float, job_id: str = ""):
+    """
+    Find the MAX_VIDEO_DURATION_SECONDS window of a longer clip with the most
+    motion: the energy curve is summed over every window and the largest wins.
+    Returns {"start", "duration", "score"} for prepare_analysis_input().
+    """
+    window = float(MAX_VIDEO_DURATION_SECONDS)
+    energy = _motion_energy_curve(video_path, job_id=job_id)
+    span = max(1, min(len(energy), int(round(window * ACTION_WINDOW_SAMPLE_FPS))))
+    sums = np.convolve(energy, np.ones(span), mode="valid")
+    # Several windows can hold the whole burst of motion; take the middle one so it is centred.
+    ties = np.flatnonzero(sums >= sums.max() - 1e-6)
+    best = int(ties[len(ties) // 2])
+    start = min(best / ACTION_WINDOW_SAMPLE_FPS, max(0.0, duration - window))
+    logger.info(f"✂️ [JOB {job_id}] Action window {start:.2f}s-{start + window:.2f}s of {duration:.2f}s")
+    return {"start": round(start, 3), "duration": window, "score": round(float(sums[best]) / span, 3)}
+
+
+def find_session_segments(video_path: str, duration: float, job_id: str = ""):
+    """
+    Split a net-session video into one MAX_VIDEO_DURATION_SECONDS window per
+    delivery/shot. Bursts of motion well above the clip's resting level (median
+    + SESSION_MOTION_THRESHOLD_MADS median absolute deviations) closer than
+    SESSION_MIN_GAP_SECONDS are one delivery; each gets a window centred on its
+    motion. Returns the windows in time order, in find_action_window()'s format.
+    """
+    window = float(MAX_VIDEO_DURATION_SECONDS)
+    if duration <= window + 0.5:
+        return [{"start": 0.0, "duration": window, "score": None}]
+
+    fps = ACTION_WINDOW_SAMPLE_FPS
+    energy = _motion_energy_curve(video_path, job_id=job_id)
+    k = max(1, int(round(0.5 * fps)))
+    smooth = np.convolve(energy, np.ones(k) / k, mode="same")
+    baseline = float(np.median(smooth))
+    spread = float(np.median(np.abs(smooth - baseline)))
+    threshold = max(baseline + SESSION_MOTION_THRESHOLD_MADS * spread, SESSION_MIN_MOTION_ENERGY)
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], (smooth > threshold).astype(np.int8), [0]))))
+    bursts = []
+    for lo, hi in zip(edges[::2], edges[1::2]):
+        if bursts and (lo - bursts[-1][1]) / fps < SESSION_MIN_GAP_SECONDS:
+            bursts[-1][1] = hi
+        else:
+            bursts.append([lo, hi])
+    bursts = [b for b in bursts if (b[1] - b[0]) / fps >= SESSION_MIN_BURST_SECONDS]
+
+    segments = []
+    for lo, hi in bursts:
+        weights = smooth[lo:hi]
+        centre = float(np.average(np.arange(lo, hi), weights=weights)) / fps
+        start = min(max(0.0, centre - window / 2), max(0.0, duration - window))
+        if segments and start < segments[-1]["start"] + window:
+            # Overlaps the previous window: start right after it, or fold into it.
+            start = segments[-1]["start"] + window
+            if start > duration - window / 2:
+                continue
+        segments.append({"start": round(start, 3), "duration": window, "score": round(float(weights.mean()), 3)})
+
+    if len(segments) > SESSION_MAX_SEGMENTS:
+        keep = sorted(segments, key=lambda s: s["score"], reverse=True)[:SESSION_MAX_SEGMENTS]
+        segments = sorted(keep, key=lambda s: s["start"])
+    logger.info(
+        f"✂️ [JOB {job_id}] Found {len(segments)} delivery segment(s) in {duration:.1f}s "
+        f"(motion threshold {threshold:.2f})"
     )
+    return segments
 
 def get_user_upload_folder(user_id):
     """
@@ -1392,12 +2550,20 @@ def _job_file_path(user_id, job_id):
     return os.path.join(get_user_jobs_folder(user_id), f"job_{job_id}.json")
 
 def save_job(user_id, job):
-    """Persist job state to disk (per-user)."""
+    """Persist job state to disk (per-user). Written to a temp file and renamed
+    into place, so a concurrent load_job never sees half-written JSON."""
     job_id = job.get("job_id")
     if not job_id:
         raise ValueError("job missing job_id")
-    with open(_job_file_path(user_id, job_id), "w") as f:
-        json.dump(job, f, indent=2, default=str)
+    path = _job_file_path(user_id, job_id)
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(job, f, indent=2, default=str)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
 
 def load_job(user_id, job_id):
     path = _job_file_path(user_id, job_id)
@@ -1406,6 +2572,27 @@ def load_job(user_id, job_id):
     with open(path, "r") as f:
         return json.load(f)
 
+@contextmanager
+def job_update(user_id, job_id, create=True):
+    """
+    Load, modify and save a job while holding the user's jobs lock (an flock, so
+    it also covers other gunicorn workers). The analysis thread, upload callbacks
+    and API requests each write only their own fields and never put back a stale
+    copy of someone else's. Yields the job dict ({} for a new job, or None when
+    create=False and it doesn't exist); it is saved when the block exits cleanly.
+    Don't nest: a second job_update for the same user in the same block deadlocks.
+    """
+    with open(os.path.join(get_user_jobs_folder(user_id), ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        job = load_job(user_id, job_id)
+        if job is None and not create:
+            yield None
+            return
+        job = job or {}
+        yield job
+        job["job_id"] = job_id
+        save_job(user_id, job)
+
 def send_expo_push(expo_push_token, title, body, data=None):
     """
     Send a push notification via Expo Push API.
@@ -1438,194 +2625,885 @@ def send_expo_push(expo_push_token, title, body, data=None):
     except Exception as e:
         logger.error(f"❌ [PUSH] Failed to send Expo push: {str(e)}", exc_info=True)
 
-def process_analysis_job(job_id, user_id, username, filepath, filename, form, expo_push_token=None):
+def _fetch_job_source_video(job, user_id, job_id, filename):
     """
-    Background worker that runs the heavy analysis and stores results keyed by job_id.
-    Runs server-side so it continues even if the mobile app is backgrounded/closed.
+    Stream the job's video from object storage down to scratch (presigned uploads,
+    remote workers) and apply the same duration limit the upload endpoints enforce
+    on the request path. The probe is stored on `job` as video_probe; one recorded at
+    upload time is reused, since the stored object has the same content hash.
     """
-    try:
-        job = load_job(user_id, job_id) or {}
-        job.update({
-            "job_id": job_id,
-            "status": "processing",
-            "updated_at": datetime.utcnow().isoformat() + "Z",
-        })
-        save_job(user_id, job)
+    bucket, key = job.get("video_s3_bucket"), job.get("video_s3_key")
+    if not bucket or not key:
+        raise ValueError("Job has no source video to analyse.")
+    tmp_dir = os.path.join(UPLOAD_FOLDER, "_tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    local_path = download_video_from_s3(bucket, key, os.path.join(tmp_dir, f"{user_id}_{job_id}_{filename}"))
+    logger.info(f"☁️ [JOB {job_id}] Downloaded source video s3://{bucket}/{key}")
+
+    probe = job.get("video_probe") if job.get("video_sha256") else None
+    probe = probe or probe_video(local_path, content_hash=job.get("video_sha256"))
+    job["video_probe"] = probe
+    duration = probe.get("duration") if probe else None
+    error = None
+    if duration is None:
+        error = "We couldn't read this video. Please upload a valid video of a particular shot that is 5 seconds or less."
+    elif duration > _max_accepted_duration(job.get("form")) + 0.5:
+        error = _video_too_long_message()
+    if error:
+        try:
+            os.remove(local_path)
+        except OSError:
+            pass
+        raise ValueError(error)
+    return local_path
+
+# ==================== POSE QUALITY GATE ====================
+# Dark, blurry or person-less clips used to go through both Gemini stages and
+# come back as "Unable to generate feedback". Right after pose extraction the
+# keypoints are checked against these thresholds; a clip that fails is rejected
+# with a message telling the user what to fix, before any Gemini call and
+# without counting towards their daily usage.
+QUALITY_GATE_ENABLED = os.getenv('QUALITY_GATE_ENABLED', '1') == '1'
+# A frame shows a body when at least QUALITY_MIN_VISIBLE_KEYPOINTS of the 17
+# keypoints reach QUALITY_KEYPOINT_CONFIDENCE.
+QUALITY_KEYPOINT_CONFIDENCE = float(os.getenv('QUALITY_KEYPOINT_CONFIDENCE', '0.3'))
+QUALITY_MIN_VISIBLE_KEYPOINTS = int(os.getenv('QUALITY_MIN_VISIBLE_KEYPOINTS', '8'))
+QUALITY_MIN_BODY_FRACTION = float(os.getenv('QUALITY_MIN_BODY_FRACTION', '0.5'))
+QUALITY_MIN_MEAN_CONFIDENCE = float(os.getenv('QUALITY_MIN_MEAN_CONFIDENCE', '0.2'))
+# Framing: median body height as a fraction of the frame, and the share of body
+# frames with a keypoint on the frame edge.
+QUALITY_MIN_BODY_HEIGHT = float(os.getenv('QUALITY_MIN_BODY_HEIGHT', '0.1'))
+QUALITY_MAX_CLIPPED_FRACTION = float(os.getenv('QUALITY_MAX_CLIPPED_FRACTION', '0.5'))
+# Motion: largest keypoint travel (5th-95th percentile), in body heights.
+QUALITY_MIN_MOTION = float(os.getenv('QUALITY_MIN_MOTION', '0.1'))
+
+_QUALITY_MESSAGES = {
+    "no_body": "We couldn't see a player in most of this video. Keep the whole player in frame for the entire clip.",
+    "low_confidence": "This video is too dark or blurry to read the player's movement. Record in good light and hold the camera steady.",
+    "too_small": "The player is too far from the camera. Move closer so the player fills more of the frame.",
+    "clipped": "The player is cut off at the edge of the frame. Step back so the whole body stays in view.",
+    "no_motion": "We couldn't see a shot or delivery being played. Upload a clip of the action itself.",
+}
 
-        player_type = form.get("player_type", "batsman")
 
-        # Track this analysis for the daily per-account usage report, and start
-        # measuring Gemini token usage for this request.
-        analysis_log_id = log_video_analysis(user_id, username, filename, player_type, job_id)
-        gemini.begin_request()
+class PoseQualityError(ValueError):
+    """A clip failed the pose quality gate; `report` holds the measured metrics."""
 
-        results = None
-        user_folder = get_user_upload_folder(user_id)
-        analysis_video_path = ensure_video_readable_for_analysis(filepath, job_id=job_id, user_id=str(user_id))
-        # Downscale high-resolution videos to prevent OOM kills on low-memory servers
-        analysis_video_path = _downscale_video_for_memory_efficiency(analysis_video_path, job_id=job_id, user_id=str(user_id))
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = report or {}
 
-        if player_type == "batsman":
-            shot_type = (form.get("shot_type", "") or "").strip()
-            if not shot_type:
-                raise ValueError("Shot type is required. Please select a shot type.")
 
-            batter_side = form.get("batter_side", "right")
+def assess_pose_quality(keypoints_path):
+    """
+    Measure a keypoints CSV against the gate thresholds. Returns
+    {"passed", "failures" (codes, most important first), "message", "metrics"}.
+    """
+    try:
+        df = pd.read_csv(keypoints_path)
+    except pd.errors.EmptyDataError:
+        df = pd.DataFrame()
+    conf = df[[f"{name}_conf" for name in keypoints_names]].to_numpy(dtype=float) if len(df) else np.zeros((0, 17))
+    xs = df[[f"{name}_x" for name in keypoints_names]].to_numpy(dtype=float) if len(df) else conf
+    ys = df[[f"{name}_y" for name in keypoints_names]].to_numpy(dtype=float) if len(df) else conf
+
+    visible = conf >= QUALITY_KEYPOINT_CONFIDENCE
+    body = visible.sum(axis=1) >= QUALITY_MIN_VISIBLE_KEYPOINTS
+    metrics = {
+        "frames": int(len(df)),
+        "mean_confidence": round(float(conf.mean()), 3) if conf.size else 0.0,
+        "body_fraction": round(float(body.mean()), 3) if len(body) else 0.0,
+        "body_height": None,
+        "clipped_fraction": None,
+        "motion": None,
+    }
+    if body.any():
+        vx = np.where(visible[body], xs[body], np.nan)
+        vy = np.where(visible[body], ys[body], np.nan)
+        heights = np.nanmax(vy, axis=1) - np.nanmin(vy, axis=1)
+        body_height = float(np.median(heights))
+        edge = (vx <= 0.01) | (vx >= 0.99) | (vy <= 0.01) | (vy >= 0.99)
+        metrics["body_height"] = round(body_height, 3)
+        metrics["clipped_fraction"] = round(float(edge.any(axis=1).mean()), 3)
+        with np.errstate(all="ignore"):
+            travel = np.maximum(
+                np.nanpercentile(vx, 95, axis=0) - np.nanpercentile(vx, 5, axis=0),
+                np.nanpercentile(vy, 95, axis=0) - np.nanpercentile(vy, 5, axis=0),
+            )
+        travel = travel[~np.isnan(travel)]
+        metrics["motion"] = round(float(travel.max()) / max(body_height, 1e-3), 3) if travel.size else 0.0
+
+    failures = []
+    if metrics["mean_confidence"] < QUALITY_MIN_MEAN_CONFIDENCE:
+        failures.append("low_confidence")
+    if metrics["body_fraction"] < QUALITY_MIN_BODY_FRACTION:
+        failures.append("no_body")
+    if metrics["body_height"] is not None:
+        if metrics["body_height"] < QUALITY_MIN_BODY_HEIGHT:
+            failures.append("too_small")
+        if metrics["clipped_fraction"] > QUALITY_MAX_CLIPPED_FRACTION:
+            failures.append("clipped")
+        if metrics["motion"] < QUALITY_MIN_MOTION:
+            failures.append("no_motion")
+    return {
+        "passed": not failures,
+        "failures": failures,
+        "message": _QUALITY_MESSAGES[failures[0]] if failures else None,
+        "metrics": metrics,
+    }
 
-            logger.info(f"🎬 [JOB {job_id}] Batting analysis started for {filename}")
-            keypoints_path, annotated_video_path = extract_pose_keypoints(analysis_video_path, "batting")
-            _ = compute_features(keypoints_path, batter_side, "batting")
-            try:
-                gpt_feedback = get_feedback_from_gpt(shot_type, keypoints_path)
-            except Exception as e:
-                logger.error(f"❌ [JOB {job_id}] Error in Gemini feedback: {str(e)}", exc_info=True)
-                gpt_feedback = "Unable to generate feedback at this time."
-
-            results = {
-                "success": True,
-                "job_id": job_id,
-                "user_id": user_id,
-                "username": username,
-                "player_type": "batsman",
-                "shot_type": shot_type,
-                "batter_side": batter_side,
-                "gpt_feedback": gpt_feedback,
-                "filename": filename,
-                "annotated_video_path": annotated_video_path,
-            }
 
-            try:
-                report_path = generate_report(results, "batsman", shot_type, batter_side, None, None, filename, user_id=user_id)
-                results["report_path"] = report_path
-            except Exception as e:
-                logger.error(f"❌ [JOB {job_id}] Error generating report: {str(e)}", exc_info=True)
-                results["report_path"] = None
+def check_pose_quality(keypoints_path, job_id=""):
+    """Raise PoseQualityError if the clip fails the gate (no-op when QUALITY_GATE_ENABLED is off)."""
+    if not QUALITY_GATE_ENABLED:
+        return None
+    report = assess_pose_quality(keypoints_path)
+    if not report["passed"]:
+        logger.warning(f"🚫 [JOB {job_id}] Pose quality gate failed {report['failures']}: {report['metrics']}")
+        raise PoseQualityError(report["message"], report)
+    logger.info(f"✅ [JOB {job_id}] Pose quality gate passed: {report['metrics']}")
+    return report
 
-        elif player_type == "bowler":
-            bowler_side = form.get("bowler_side", "right")
-            bowler_type = form.get("bowler_type", "fast_bowler")
 
-            logger.info(f"🎬 [JOB {job_id}] Bowling analysis started for {filename}")
-            keypoints_path, annotated_video_path = extract_pose_keypoints(analysis_video_path, "bowling")
-            _ = compute_features(keypoints_path, bowler_side, "bowling")
-            try:
-                gpt_feedback = get_feedback_from_gpt_for_bowling(keypoints_path, bowler_type)
-            except Exception as e:
-                logger.error(f"❌ [JOB {job_id}] Error in Gemini feedback: {str(e)}", exc_info=True)
-                gpt_feedback = "Unable to generate feedback at this time."
-
-            results = {
-                "success": True,
-                "job_id": job_id,
-                "user_id": user_id,
-                "username": username,
-                "player_type": "bowler",
-                "bowler_side": bowler_side,
-                "bowler_type": bowler_type,
-                "gpt_feedback": gpt_feedback,
-                "filename": filename,
-                "annotated_video_path": annotated_video_path,
-            }
+def _run_analysis_pipeline(job_id, user_id, username, filepath, filename, form, probe=None):
+    """
+    Decode/transcode, pose, features, Gemini feedback and report for one video.
+    Returns the results dict. Shared by the in-process worker thread and the
+    remote worker (see run_analysis_worker). `probe` is the job's stored
+    probe_video() result for `filepath`.
+    """
+    if _is_session_upload(form):
+        return run_session_pipeline(job_id, user_id, username, filepath, filename, form, probe=probe)
+
+    player_type = form.get("player_type", "batsman")
+    probe = probe or probe_video(filepath)
+    duration = probe.get("duration") if probe else None
+    action_window = None
+    if duration and duration > MAX_VIDEO_DURATION_SECONDS + 0.5:
+        # Long clip: analyse only the window where the shot happens.
+        action_window = find_action_window(filepath, duration, job_id=job_id)
+    # One ffmpeg pass at most: trim, transcode, downscale and fps cap together (avoids OOM on small servers)
+    analysis_video_path = prepare_analysis_input(
+        filepath, job_id=job_id, user_id=str(user_id), probe=probe, trim=action_window
+    )
 
-            try:
-                report_path = generate_report(results, "bowler", None, None, bowler_side, bowler_type, filename, user_id=user_id)
-                results["report_path"] = report_path
-            except Exception as e:
-                logger.error(f"❌ [JOB {job_id}] Error generating report: {str(e)}", exc_info=True)
-                results["report_path"] = None
+    if player_type == "batsman":
+        shot_type = (form.get("shot_type", "") or "").strip()
+        if not shot_type:
+            raise ValueError("Shot type is required. Please select a shot type.")
 
-        elif player_type == "keeper":
-            keeping_type = form.get("keeping_type", "standing_up")
-            keeper_side = form.get("keeper_side", "right")
+        batter_side = form.get("batter_side", "right")
 
-            logger.info(f"🎬 [JOB {job_id}] Keeping analysis started for {filename}")
-            keypoints_path, annotated_video_path = extract_pose_keypoints(analysis_video_path, "keeping")
-            _ = compute_features(keypoints_path, keeper_side, "keeping")
-            try:
-                gpt_feedback = get_feedback_from_gpt_for_keeping(keypoints_path, keeping_type)
-            except Exception as e:
-                logger.error(f"❌ [JOB {job_id}] Error in Gemini feedback: {str(e)}", exc_info=True)
-                gpt_feedback = "Unable to generate feedback at this time."
-
-            results = {
-                "success": True,
-                "job_id": job_id,
-                "user_id": user_id,
-                "username": username,
-                "player_type": "keeper",
-                "keeper_side": keeper_side,
-                "keeping_type": keeping_type,
-                "gpt_feedback": gpt_feedback,
-                "filename": filename,
-                "annotated_video_path": annotated_video_path,
-            }
+        logger.info(f"🎬 [JOB {job_id}] Batting analysis started for {filename}")
+        keypoints_path, annotated_video_path = extract_pose_keypoints(analysis_video_path, "batting")
+        check_pose_quality(keypoints_path, job_id=job_id)
+        _ = compute_features(keypoints_path, batter_side, "batting")
+        try:
+            gpt_feedback = get_feedback_from_gpt(shot_type, keypoints_path)
+        except Exception as e:
+            logger.error(f"❌ [JOB {job_id}] Error in Gemini feedback: {str(e)}", exc_info=True)
+            gpt_feedback = "Unable to generate feedback at this time."
+
+        results = {
+            "success": True,
+            "job_id": job_id,
+            "user_id": user_id,
+            "username": username,
+            "player_type": "batsman",
+            "shot_type": shot_type,
+            "batter_side": batter_side,
+            "gpt_feedback": gpt_feedback,
+            "filename": filename,
+            "annotated_video_path": annotated_video_path,
+        }
+
+        try:
+            report_path = generate_report(results, "batsman", shot_type, batter_side, None, None, filename, user_id=user_id)
+            results["report_path"] = report_path
+        except Exception as e:
+            logger.error(f"❌ [JOB {job_id}] Error generating report: {str(e)}", exc_info=True)
+            results["report_path"] = None
+
+    elif player_type == "bowler":
+        bowler_side = form.get("bowler_side", "right")
+        bowler_type = form.get("bowler_type", "fast_bowler")
 
+        logger.info(f"🎬 [JOB {job_id}] Bowling analysis started for {filename}")
+        keypoints_path, annotated_video_path = extract_pose_keypoints(analysis_video_path, "bowling")
+        check_pose_quality(keypoints_path, job_id=job_id)
+        _ = compute_features(keypoints_path, bowler_side, "bowling")
+        try:
+            gpt_feedback = get_feedback_from_gpt_for_bowling(keypoints_path, bowler_type)
+        except Exception as e:
+            logger.error(f"❌ [JOB {job_id}] Error in Gemini feedback: {str(e)}", exc_info=True)
+            gpt_feedback = "Unable to generate feedback at this time."
+
+        results = {
+            "success": True,
+            "job_id": job_id,
+            "user_id": user_id,
+            "username": username,
+            "player_type": "bowler",
+            "bowler_side": bowler_side,
+            "bowler_type": bowler_type,
+            "gpt_feedback": gpt_feedback,
+            "filename": filename,
+            "annotated_video_path": annotated_video_path,
+        }
+
+        try:
+            report_path = generate_report(results, "bowler", None, None, bowler_side, bowler_type, filename, user_id=user_id)
+            results["report_path"] = report_path
+        except Exception as e:
+            logger.error(f"❌ [JOB {job_id}] Error generating report: {str(e)}", exc_info=True)
+            results["report_path"] = None
+
+    elif player_type == "keeper":
+        keeping_type = form.get("keeping_type", "standing_up")
+        keeper_side = form.get("keeper_side", "right")
+
+        logger.info(f"🎬 [JOB {job_id}] Keeping analysis started for {filename}")
+        keypoints_path, annotated_video_path = extract_pose_keypoints(analysis_video_path, "keeping")
+        check_pose_quality(keypoints_path, job_id=job_id)
+        _ = compute_features(keypoints_path, keeper_side, "keeping")
+        try:
+            gpt_feedback = get_feedback_from_gpt_for_keeping(keypoints_path, keeping_type)
+        except Exception as e:
+            logger.error(f"❌ [JOB {job_id}] Error in Gemini feedback: {str(e)}", exc_info=True)
+            gpt_feedback = "Unable to generate feedback at this time."
+
+        results = {
+            "success": True,
+            "job_id": job_id,
+            "user_id": user_id,
+            "username": username,
+            "player_type": "keeper",
+            "keeper_side": keeper_side,
+            "keeping_type": keeping_type,
+            "gpt_feedback": gpt_feedback,
+            "filename": filename,
+            "annotated_video_path": annotated_video_path,
+        }
+
+        try:
+            # For keeper, we pass keeping_type in place of bowler_type parameter
+            report_path = generate_report(results, "keeper", None, None, keeper_side, keeping_type, filename, user_id=user_id)
+            results["report_path"] = report_path
+        except Exception as e:
+            logger.error(f"❌ [JOB {job_id}] Error generating report: {str(e)}", exc_info=True)
+            results["report_path"] = None
+
+    else:
+        raise ValueError(f"Unsupported player type: {player_type}. Supported types: batsman, bowler, keeper")
+
+    if action_window:
+        results["action_window"] = action_window
+    return results
+
+
+# ==================== NET SESSION ANALYSIS ====================
+# A form with analysis_mode=session is one long practice video with many balls.
+# find_session_segments() cuts it into one window per delivery/shot; the
+# segments are analysed in parallel (ffmpeg cut, pose, features, Gemini) and
+# rolled up into one session summary with a per-ball breakdown.
+SESSION_ANALYSIS_WORKERS = int(os.getenv('SESSION_ANALYSIS_WORKERS', '4'))
+# MoveNet runs one frame at a time, so concurrent pose runs only compete for the
+# same cores (and memory); overlap happens in the ffmpeg cuts and Gemini calls.
+SESSION_POSE_CONCURRENCY = int(os.getenv('SESSION_POSE_CONCURRENCY', '1'))
+SESSION_MAX_SEGMENTS = int(os.getenv('SESSION_MAX_SEGMENTS', '30'))
+SESSION_MOTION_THRESHOLD_MADS = float(os.getenv('SESSION_MOTION_THRESHOLD_MADS', '3'))
+SESSION_MIN_MOTION_ENERGY = float(os.getenv('SESSION_MIN_MOTION_ENERGY', '1.5'))
+SESSION_MIN_GAP_SECONDS = float(os.getenv('SESSION_MIN_GAP_SECONDS', '2'))
+SESSION_MIN_BURST_SECONDS = float(os.getenv('SESSION_MIN_BURST_SECONDS', '0.3'))
+
+_session_pose_slots = threading.BoundedSemaphore(max(1, SESSION_POSE_CONCURRENCY))
+
+
+def _is_session_upload(form) -> bool:
+    return str((form or {}).get("analysis_mode") or "").strip().lower() == "session"
+
+
+def _session_stage(player_type, form):
+    """Pose kind, result fields, Gemini feedback call and generate_report() args for a player type."""
+    if player_type == "batsman":
+        shot_type = (form.get("shot_type", "") or "").strip()
+        if not shot_type:
+            raise ValueError("Shot type is required. Please select a shot type.")
+        side = form.get("batter_side", "right")
+        return {
+            "kind": "batting",
+            "side": side,
+            "fields": {"shot_type": shot_type, "batter_side": side},
+            "feedback": lambda kp: get_feedback_from_gpt(shot_type, kp),
+            "report_args": (shot_type, side, None, None),
+        }
+    if player_type == "bowler":
+        side = form.get("bowler_side", "right")
+        bowler_type = form.get("bowler_type", "fast_bowler")
+        return {
+            "kind": "bowling",
+            "side": side,
+            "fields": {"bowler_side": side, "bowler_type": bowler_type},
+            "feedback": lambda kp: get_feedback_from_gpt_for_bowling(kp, bowler_type),
+            "report_args": (None, None, side, bowler_type),
+        }
+    if player_type == "keeper":
+        side = form.get("keeper_side", "right")
+        keeping_type = form.get("keeping_type", "standing_up")
+        return {
+            "kind": "keeping",
+            "side": side,
+            "fields": {"keeper_side": side, "keeping_type": keeping_type},
+            "feedback": lambda kp: get_feedback_from_gpt_for_keeping(kp, keeping_type),
+            # For keeper, we pass keeping_type in place of bowler_type parameter
+            "report_args": (None, None, side, keeping_type),
+        }
+    raise ValueError(f"Unsupported player type: {player_type}. Supported types: batsman, bowler, keeper")
+
+
+def _remove_annotated_video(user_id, annotated):
+    """Delete an annotated video nothing will link to, with its poster and HLS rendition."""
+    if not annotated:
+        return
+    for folder in (get_user_upload_folder(user_id), UPLOAD_FOLDER):
+        video_path = os.path.join(folder, os.path.basename(annotated))
+        if not os.path.isfile(video_path):
+            continue
+        shutil.rmtree(_hls_dir(video_path), ignore_errors=True)
+        for path in (_video_poster_path(video_path), video_path):
             try:
-                # For keeper, we pass keeping_type in place of bowler_type parameter
-                report_path = generate_report(results, "keeper", None, None, keeper_side, keeping_type, filename, user_id=user_id)
-                results["report_path"] = report_path
-            except Exception as e:
-                logger.error(f"❌ [JOB {job_id}] Error generating report: {str(e)}", exc_info=True)
-                results["report_path"] = None
+                os.remove(path)
+            except OSError:
+                pass
+        return
 
-        else:
-            raise ValueError(f"Unsupported player type: {player_type}. Supported types: batsman, bowler, keeper")
 
-        # Record how many Gemini tokens this analysis request consumed.
+def _analyse_session_segment(job_id, user_id, filepath, probe, number, segment, stage):
+    """Cut, pose, features and Gemini feedback for one segment (runs on a pool thread)."""
+    entry = {
+        "segment": number,
+        "start": segment["start"],
+        "end": round(segment["start"] + segment["duration"], 3),
+        "status": "analysed",
+    }
+    tmp_dir = os.path.join(UPLOAD_FOLDER, "_tmp")
+    keypoints_path = os.path.join(tmp_dir, f"{job_id}_s{number}_{stage['kind']}_keypoints.csv")
+    segment_path = annotated_video_path = None
+    gemini.begin_request()
+    try:
+        segment_path = prepare_analysis_input(
+            filepath, job_id=f"{job_id}#{number}", user_id=str(user_id), probe=probe, trim=segment, tag=f"s{number}"
+        )
+        with _session_pose_slots:
+            keypoints_path, annotated_video_path = extract_pose_keypoints(
+                segment_path, stage["kind"], keypoints_path=keypoints_path
+            )
+        if QUALITY_GATE_ENABLED:
+            quality = assess_pose_quality(keypoints_path)
+            entry["quality"] = quality["metrics"]
+            if not quality["passed"]:
+                # Motion without a usable player (fielder walking past, camera bump): no Gemini spend.
+                entry.update(status="skipped", reason=quality["message"], quality_failures=quality["failures"])
+                return entry
+        entry["annotated_video_path"] = annotated_video_path
+
+        _ = compute_features(keypoints_path, stage["side"], stage["kind"])
         try:
-            update_analysis_tokens(analysis_log_id, gemini.request_usage())
-        except Exception as token_err:
-            logger.warning(f"⚠️ [JOB {job_id}] Token usage record failed: {token_err}")
+            feedback = stage["feedback"](keypoints_path)
+        except Exception as e:
+            logger.error(f"❌ [JOB {job_id}] Error in Gemini feedback for segment {number}: {str(e)}", exc_info=True)
+            feedback = "Unable to generate feedback at this time."
+        entry["gpt_feedback"] = feedback
+        if isinstance(feedback, dict) and not feedback.get("error"):
+            entry["flaws"] = _compact_flaws(feedback)
+            entry["technique_score"] = _video_technique_score(entry["flaws"])
+        return entry
+    except Exception as e:
+        logger.error(f"❌ [JOB {job_id}] Segment {number} failed: {str(e)}", exc_info=True)
+        entry.update(status="failed", reason=str(e))
+        return entry
+    finally:
+        entry["token_usage"] = gemini.request_usage()
+        if entry["status"] != "analysed":
+            # Only analysed segments are shown (or uploaded by a remote worker).
+            entry.pop("annotated_video_path", None)
+            _remove_annotated_video(user_id, annotated_video_path)
+        for path in (segment_path if segment_path != filepath else None, keypoints_path):
+            _remove_tmp_upload(path)
+
+
+def summarize_session(segments):
+    """Roll per-segment results up into the session summary."""
+    analysed = [s for s in segments if s["status"] == "analysed"]
+    scored = [s for s in analysed if s.get("technique_score") is not None]
+    flaw_stats = {}
+    for seg in analysed:
+        for flaw in {f["feature"]: f for f in seg.get("flaws") or []}.values():
+            stat = flaw_stats.setdefault(flaw["feature"], {"feature": flaw["feature"], "count": 0, "severity": 0.0})
+            stat["count"] += 1
+            stat["severity"] += _flaw_severity(flaw)
+    common = sorted(flaw_stats.values(), key=lambda f: (-f["count"], -f["severity"]))[:5]
+    summary = {
+        "segments_found": len(segments),
+        "segments_analysed": len(analysed),
+        "segments_skipped": sum(1 for s in segments if s["status"] == "skipped"),
+        "segments_failed": sum(1 for s in segments if s["status"] == "failed"),
+        "average_score": round(sum(s["technique_score"] for s in scored) / len(scored), 1) if scored else None,
+        "best_segment": max(scored, key=lambda s: s["technique_score"])["segment"] if scored else None,
+        "worst_segment": min(scored, key=lambda s: s["technique_score"])["segment"] if scored else None,
+        "common_flaws": [
+            {
+                "feature": f["feature"],
+                "segments": f["count"],
+                "share": round(f["count"] / len(analysed), 2),
+                "avg_severity": round(f["severity"] / f["count"], 2),
+            }
+            for f in common
+        ],
+    }
+    return summary
 
-        # Save results by filename for history/backwards compatibility
-        results_file = os.path.join(user_folder, f"results_{filename}.json")
-        with open(results_file, "w") as f:
-            json.dump(results, f, indent=2)
 
-        job = load_job(user_id, job_id) or {}
+def run_session_pipeline(job_id, user_id, username, filepath, filename, form, probe=None):
+    """
+    Session-mode counterpart of _run_analysis_pipeline: segment, analyse every
+    segment on a thread pool, summarise. The top-level gpt_feedback, annotated
+    video and report are those of the median-scoring ball, so history and the
+    existing result screens keep working; `segments` holds the per-ball breakdown.
+    """
+    player_type = form.get("player_type", "batsman")
+    stage = _session_stage(player_type, form)
+    probe = probe or probe_video(filepath)
+    duration = probe.get("duration") if probe else None
+    if not duration:
+        raise ValueError("We couldn't read this video. Please upload a valid session video.")
+
+    windows = find_session_segments(filepath, duration, job_id=job_id)
+    if not windows:
+        raise ValueError("We couldn't find any deliveries in this video. Make sure the player is in frame and try again.")
+
+    logger.info(f"🎬 [JOB {job_id}] Session analysis of {len(windows)} segment(s) started for {filename}")
+    with ThreadPoolExecutor(max_workers=max(1, min(SESSION_ANALYSIS_WORKERS, len(windows)))) as pool:
+        futures = [
+            pool.submit(_analyse_session_segment, job_id, user_id, filepath, probe, n, w, stage)
+            for n, w in enumerate(windows, start=1)
+        ]
+        segments = [f.result() for f in futures]
+    for seg in segments:
+        gemini.add_request_usage(seg.pop("token_usage", None))
+
+    analysed = [s for s in segments if s["status"] == "analysed"]
+    if not analysed:
+        skipped = [s for s in segments if s["status"] == "skipped"]
+        if skipped:
+            raise PoseQualityError(skipped[0]["reason"], {"failures": skipped[0].get("quality_failures"),
+                                                          "metrics": skipped[0].get("quality"),
+                                                          "segments": len(segments)})
+        raise ValueError(f"None of the {len(segments)} segment(s) could be analysed: {segments[0].get('reason')}")
+    ranked = sorted(analysed, key=lambda s: s.get("technique_score") if s.get("technique_score") is not None else -1)
+    representative = ranked[len(ranked) // 2]
+
+    results = {
+        "success": True,
+        "job_id": job_id,
+        "user_id": user_id,
+        "username": username,
+        "player_type": player_type,
+        "analysis_mode": "session",
+        **stage["fields"],
+        "gpt_feedback": representative.get("gpt_feedback"),
+        "filename": filename,
+        "annotated_video_path": representative.get("annotated_video_path"),
+        "representative_segment": representative["segment"],
+        "segments": segments,
+        "session_summary": summarize_session(segments),
+    }
+
+    try:
+        report_path = generate_report(results, player_type, *stage["report_args"], filename, user_id=user_id)
+        results["report_path"] = report_path
+    except Exception as e:
+        logger.error(f"❌ [JOB {job_id}] Error generating report: {str(e)}", exc_info=True)
+        results["report_path"] = None
+
+    logger.info(
+        f"✅ [JOB {job_id}] Session analysed: {results['session_summary']['segments_analysed']}/{len(segments)} segment(s)"
+    )
+    return results
+
+
+def _hls_url(user_id, annotated):
+    """/api/hls playlist URL for an annotated video, or None if it has no HLS rendition
+    (packaging is optional and best-effort)."""
+    if not annotated:
+        return None
+    name = os.path.basename(annotated)
+    if not _resolve_user_file(user_id, f"{os.path.basename(_hls_dir(name))}/{HLS_PLAYLIST_NAME}"):
+        return None
+    return f"/api/hls/{name}/{HLS_PLAYLIST_NAME}"
+
+
+def _finish_analysis_job(job_id, user_id, filename, results, expo_push_token=None):
+    """Persist a finished analysis (results file, history index, job record) and notify."""
+    user_folder = get_user_upload_folder(user_id)
+    # Say whether an HLS rendition exists so the app needn't probe for one.
+    results["hls_url"] = _hls_url(user_id, results.get("annotated_video_path"))
+    for segment in results.get("segments") or []:
+        segment["hls_url"] = _hls_url(user_id, segment.get("annotated_video_path"))
+    # Save results by filename for history/backwards compatibility
+    results_file = os.path.join(user_folder, f"results_{filename}.json")
+    with open(results_file, "w") as f:
+        json.dump(results, f, indent=2)
+    index_analysis_result(user_id, filename, results, results_file)
+
+    with job_update(user_id, job_id) as job:
         job.update({
-            "job_id": job_id,
             "status": "completed",
             "result": results,
             "result_filename": filename,
             "updated_at": datetime.utcnow().isoformat() + "Z",
         })
-        save_job(user_id, job)
 
-        send_expo_push(
-            expo_push_token,
-            title="CrickCoach: Analysis ready",
-            body="Tap to view your results.",
-            data={"job_id": job_id, "filename": filename},
-        )
+    send_expo_push(
+        expo_push_token,
+        title="CrickCoach: Analysis ready",
+        body="Tap to view your results.",
+        data={"job_id": job_id, "filename": filename},
+    )
 
-        logger.info(f"✅ [JOB {job_id}] Completed successfully for {filename}")
-    except Exception as e:
-        logger.error(f"❌ [JOB {job_id}] Failed: {str(e)}", exc_info=True)
-        job = load_job(user_id, job_id) or {}
+
+def _fail_analysis_job(job_id, user_id, filename, error, expo_push_token=None):
+    with job_update(user_id, job_id) as job:
         job.update({
-            "job_id": job_id,
             "status": "failed",
-            "error": str(e),
+            "error": str(error),
             "updated_at": datetime.utcnow().isoformat() + "Z",
         })
-        save_job(user_id, job)
-        send_expo_push(
-            expo_push_token,
-            title="CrickCoach: Analysis failed",
-            body="There was an error processing your video.",
-            data={"job_id": job_id, "filename": filename, "error": str(e)},
-        )
+        if isinstance(error, PoseQualityError):
+            job.update({"error_code": "low_quality", "quality": error.report})
+    send_expo_push(
+        expo_push_token,
+        title="CrickCoach: Analysis failed",
+        body=str(error) if isinstance(error, PoseQualityError) else "There was an error processing your video.",
+        data={"job_id": job_id, "filename": filename, "error": str(error)},
+    )
+
+
+def process_analysis_job(job_id, user_id, username, filepath, filename, form, expo_push_token=None):
+    """
+    Background worker that runs the heavy analysis and stores results keyed by job_id.
+    Runs server-side so it continues even if the mobile app is backgrounded/closed.
+    """
+    try:
+        with job_update(user_id, job_id) as job:
+            job.update({
+                "status": "processing",
+                "updated_at": datetime.utcnow().isoformat() + "Z",
+            })
+
+        if not filepath:
+            # Direct-to-S3 upload: the video never touched this host.
+            filepath = _fetch_job_source_video(job, user_id, job_id, filename)
+
+        player_type = form.get("player_type", "batsman")
+
+        # Start measuring Gemini token usage for this request.
+        gemini.begin_request()
+        try:
+            results = _run_analysis_pipeline(job_id, user_id, username, filepath, filename, form,
+                                             probe=job.get("video_probe"))
+        except PoseQualityError:
+            raise  # rejected before any Gemini call: not counted as an analysis
+        except Exception:
+            log_video_analysis(user_id, username, filename, player_type, job_id)
+            raise
+
+        # Track this analysis for the daily per-account usage report.
+        analysis_log_id = log_video_analysis(user_id, username, filename, player_type, job_id)
+
+        # Record how many Gemini tokens this analysis request consumed.
+        try:
+            update_analysis_tokens(analysis_log_id, gemini.request_usage())
+        except Exception as token_err:
+            logger.warning(f"⚠️ [JOB {job_id}] Token usage record failed: {token_err}")
+
+        _finish_analysis_job(job_id, user_id, filename, results, expo_push_token)
+        logger.info(f"✅ [JOB {job_id}] Completed successfully for {filename}")
+    except Exception as e:
+        logger.error(f"❌ [JOB {job_id}] Failed: {str(e)}", exc_info=True)
+        _fail_analysis_job(job_id, user_id, filename, e, expo_push_token)
     finally:
         # Best-effort cleanup of temp uploads (we keep job/results artifacts).
+        _remove_tmp_upload(filepath)
+
+
+# ==================== REMOTE ANALYSIS WORKERS ====================
+# ANALYSIS_DISPATCH_MODE=thread (default) runs each job on a thread of the API
+# process. With "queue", jobs go on a shared queue and `python backend_script.py
+# --worker` processes (on this or other machines) claim them, stream the source
+# video from object storage, and write their artifacts back to object storage.
+# The API host applies finished jobs (result files, history, push) itself.
+ANALYSIS_DISPATCH_MODE = os.getenv('ANALYSIS_DISPATCH_MODE', 'thread').strip().lower()
+# "sqlite" (the app database; workers must share the file) or "module:ClassName"
+# for a networked JobQueue backend, which receives url=ANALYSIS_QUEUE_URL.
+ANALYSIS_QUEUE_BACKEND = os.getenv('ANALYSIS_QUEUE_BACKEND', 'sqlite')
+ANALYSIS_QUEUE_URL = os.getenv('ANALYSIS_QUEUE_URL', '')
+ANALYSIS_QUEUE_LEASE_SECONDS = int(os.getenv('ANALYSIS_QUEUE_LEASE_SECONDS', '900'))
+ANALYSIS_QUEUE_MAX_ATTEMPTS = int(os.getenv('ANALYSIS_QUEUE_MAX_ATTEMPTS', '3'))
+ANALYSIS_WORKER_POLL_SECONDS = int(os.getenv('ANALYSIS_WORKER_POLL_SECONDS', '2'))
+ANALYSIS_RESULT_POLL_SECONDS = int(os.getenv('ANALYSIS_RESULT_POLL_SECONDS', '3'))
+
+_analysis_queue = None
+_analysis_queue_lock = threading.Lock()
+_analysis_collector_started = False
+
+
+def get_analysis_queue():
+    global _analysis_queue
+    if _analysis_queue is None:
+        with _analysis_queue_lock:
+            if _analysis_queue is None:
+                if ANALYSIS_QUEUE_BACKEND.strip() == 'sqlite':
+                    _analysis_queue = load_job_queue('sqlite', pool=db_pool, max_attempts=ANALYSIS_QUEUE_MAX_ATTEMPTS)
+                else:
+                    _analysis_queue = load_job_queue(ANALYSIS_QUEUE_BACKEND, url=ANALYSIS_QUEUE_URL,
+                                                     max_attempts=ANALYSIS_QUEUE_MAX_ATTEMPTS)
+    return _analysis_queue
+
+
+def _remove_tmp_upload(filepath):
+    """Delete a file only if it lives under uploads/_tmp."""
+    try:
+        tmp_root = os.path.abspath(os.path.join(UPLOAD_FOLDER, "_tmp"))
+        abs_path = os.path.abspath(filepath) if filepath else ""
+        if abs_path and os.path.exists(abs_path) and os.path.commonpath([abs_path, tmp_root]) == tmp_root:
+            os.remove(abs_path)
+    except Exception as e:
+        logger.warning(f"⚠️ Temp cleanup failed for {filepath}: {e}")
+
+
+def dispatch_analysis_job(job_id, user_id, username, filepath, filename, form, expo_push_token=None):
+    """
+    Start analysis for a saved job: on a local thread, or (queue mode) on the shared
+    queue. In queue mode the worker reads the video from object storage, so the
+    job must already have video_s3_bucket/key and the local temp copy is dropped.
+    """
+    if ANALYSIS_DISPATCH_MODE != 'queue':
+        worker = threading.Thread(
+            target=process_analysis_job,
+            args=(job_id, user_id, username, filepath, filename, form, expo_push_token),
+            daemon=True,
+        )
+        worker.start()
+        return
+
+    job = load_job(user_id, job_id) or {}
+    get_analysis_queue().enqueue(job_id, {
+        "user_id": user_id,
+        "username": username,
+        "filename": filename,
+        "form": form,
+        "expo_push_token": expo_push_token,
+        "video_s3_bucket": job.get("video_s3_bucket"),
+        "video_s3_key": job.get("video_s3_key"),
+        "video_sha256": job.get("video_sha256"),
+        "video_probe": job.get("video_probe"),
+    })
+    _remove_tmp_upload(filepath)
+    start_analysis_result_collector()
+
+
+def _artifact_key(user_id, job_id, name):
+    key = f"artifacts/{user_id}/{job_id}/{name}"
+    return f"{S3_BASE_PREFIX}/{key}" if S3_BASE_PREFIX else key
+
+
+def _job_artifact_files(user_id, results):
+    """(name, local_path) for every file a job produced that the API host serves:
+    annotated video(s), their posters and HLS renditions, and the text report."""
+    files = []
+    annotated_paths = [results.get("annotated_video_path")]
+    annotated_paths += [s.get("annotated_video_path") for s in results.get("segments") or []]
+    for annotated in dict.fromkeys(a for a in annotated_paths if a):
+        for folder in (get_user_upload_folder(user_id), UPLOAD_FOLDER):
+            video_path = os.path.join(folder, os.path.basename(annotated))
+            if os.path.isfile(video_path):
+                files.append((os.path.basename(video_path), video_path))
+                poster = _video_poster_path(video_path)
+                if os.path.isfile(poster):
+                    files.append((os.path.basename(poster), poster))
+                hls_dir = _hls_dir(video_path)
+                if os.path.isdir(hls_dir):
+                    for name in sorted(os.listdir(hls_dir)):
+                        files.append((f"{os.path.basename(hls_dir)}/{name}", os.path.join(hls_dir, name)))
+                break
+    report_path = results.get("report_path")
+    if report_path and os.path.isfile(report_path):
+        files.append((os.path.basename(report_path), report_path))
+    return files
+
+
+def _upload_job_artifacts(user_id, job_id, results):
+    """Push a job's artifacts to object storage, then drop the worker's local copies."""
+    artifacts, local_paths = [], []
+    for name, path in _job_artifact_files(user_id, results):
+        key = _artifact_key(user_id, job_id, name)
+        video_store.upload_file(path, key)
+        artifacts.append({"name": name, "key": key})
+        local_paths.append(path)
+    for path in local_paths:
+        parent = os.path.dirname(path)
+        if os.path.basename(parent).startswith("hls_"):
+            shutil.rmtree(parent, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+    return artifacts
+
+
+def _run_remote_analysis_item(queue, worker_id, item):
+    job_id = item["job_id"]
+    payload = item["payload"]
+    user_id = payload["user_id"]
+    filename = payload["filename"]
+    stop = threading.Event()
+
+    def keep_lease():
+        while not stop.wait(max(5, ANALYSIS_QUEUE_LEASE_SECONDS // 3)):
+            if not queue.heartbeat(job_id, worker_id, ANALYSIS_QUEUE_LEASE_SECONDS):
+                return
+
+    threading.Thread(target=keep_lease, daemon=True).start()
+    filepath = None
+    try:
+        logger.info(f"🛠️ [WORKER {worker_id}] Claimed job {job_id} (attempt {item['attempts']})")
+        gemini.begin_request()
+        filepath = _fetch_job_source_video(payload, user_id, job_id, filename)
+        results = _run_analysis_pipeline(job_id, user_id, payload.get("username"), filepath, filename,
+                                         payload.get("form") or {}, probe=payload.get("video_probe"))
+        artifacts = _upload_job_artifacts(user_id, job_id, results)
+        queue.complete(job_id, worker_id, {
+            "results": results,
+            "artifacts": artifacts,
+            "token_usage": gemini.request_usage(),
+        })
+        logger.info(f"✅ [WORKER {worker_id}] Job {job_id} done")
+    except PoseQualityError as e:
+        # A verdict, not a crash: hand the report back so the API host can show it.
+        logger.warning(f"🚫 [WORKER {worker_id}] Job {job_id} rejected by quality gate: {e}")
+        queue.complete(job_id, worker_id, {"rejected": {"error": str(e), "quality": e.report}})
+    except Exception as e:
+        logger.error(f"❌ [WORKER {worker_id}] Job {job_id} failed: {str(e)}", exc_info=True)
+        queue.fail(job_id, worker_id, str(e))
+    finally:
+        stop.set()
+        _remove_tmp_upload(filepath)
+
+
+def run_analysis_worker(worker_id=None):
+    """Claim and run queued analysis jobs forever (`python backend_script.py --worker`)."""
+    queue = get_analysis_queue()
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"🛠️ [WORKER {worker_id}] Waiting for analysis jobs ({ANALYSIS_QUEUE_BACKEND})")
+    while True:
         try:
-            tmp_root = os.path.abspath(os.path.join(UPLOAD_FOLDER, "_tmp"))
-            abs_path = os.path.abspath(filepath) if filepath else ""
-            if abs_path and os.path.exists(abs_path):
-                if os.path.commonpath([abs_path, tmp_root]) == tmp_root:
-                    os.remove(abs_path)
-        except Exception as cleanup_err:
-            logger.warning(f"⚠️ [JOB {job_id}] Temp cleanup failed: {cleanup_err}")
+            item = queue.claim(worker_id, ANALYSIS_QUEUE_LEASE_SECONDS)
+        except Exception as e:
+            logger.error(f"❌ [WORKER {worker_id}] Claim failed: {e}", exc_info=True)
+            item = None
+        if item is None:
+            time.sleep(ANALYSIS_WORKER_POLL_SECONDS)
+            continue
+        _run_remote_analysis_item(queue, worker_id, item)
+
+
+def _apply_remote_job(entry):
+    """API side of a finished queued job: fetch artifacts into the user's folder,
+    then record it exactly as process_analysis_job would have."""
+    job_id = entry["job_id"]
+    payload = entry["payload"]
+    user_id = payload["user_id"]
+    username = payload.get("username")
+    filename = payload["filename"]
+    token = payload.get("expo_push_token")
+
+    job = load_job(user_id, job_id) or {}
+    if job.get("status") in ("completed", "failed"):
+        return  # applied on an earlier pass whose ack() didn't go through
+
+    rejected = (entry.get("result") or {}).get("rejected")
+    if rejected:
+        _fail_analysis_job(job_id, user_id, filename, PoseQualityError(rejected["error"], rejected.get("quality")), token)
+        return
+
+    player_type = (payload.get("form") or {}).get("player_type", "batsman")
+    analysis_log_id = log_video_analysis(user_id, username, filename, player_type, job_id)
+    if entry["status"] != "done":
+        _fail_analysis_job(job_id, user_id, filename, entry.get("error") or "Analysis failed", token)
+        return
+
+    result = entry["result"] or {}
+    user_folder = get_user_upload_folder(user_id)
+    for artifact in result.get("artifacts") or []:
+        dest = safe_join(user_folder, artifact["name"])
+        if not dest:
+            continue
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        download_video_from_s3(video_store.bucket, artifact["key"], dest)
+
+    results = result.get("results") or {}
+    if results.get("report_path"):
+        results["report_path"] = os.path.join(user_folder, os.path.basename(results["report_path"]))
+    try:
+        update_analysis_tokens(analysis_log_id, result.get("token_usage"))
+    except Exception as token_err:
+        logger.warning(f"⚠️ [JOB {job_id}] Token usage record failed: {token_err}")
+    _finish_analysis_job(job_id, user_id, filename, results, token)
+    logger.info(f"✅ [JOB {job_id}] Applied remote result for {filename}")
+
+
+def _analysis_result_collector_loop():
+    queue = get_analysis_queue()
+    applier_id = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        try:
+            entries = queue.finished(limit=20)
+        except Exception as e:
+            logger.error(f"❌ [COLLECTOR] Reading finished jobs failed: {e}", exc_info=True)
+            entries = []
+        applied = 0
+        for entry in entries:
+            try:
+                # Every API process runs a collector; the SQL claim picks one to apply each job.
+                if not queue.claim_finished(entry["job_id"], applier_id, ANALYSIS_QUEUE_LEASE_SECONDS):
+                    continue
+            except Exception as e:
+                logger.error(f"❌ [COLLECTOR] Claiming job {entry.get('job_id')} failed: {e}", exc_info=True)
+                continue
+            try:
+                _apply_remote_job(entry)
+                queue.ack(entry["job_id"])
+                applied += 1
+            except Exception as e:
+                # Released un-acked, so it is retried on a later pass.
+                try:
+                    queue.release_finished(entry["job_id"], applier_id)
+                except Exception:
+                    pass  # The claim lapses with its lease instead
+                logger.error(f"❌ [COLLECTOR] Applying job {entry.get('job_id')} failed: {e}", exc_info=True)
+        if not applied:
+            time.sleep(ANALYSIS_RESULT_POLL_SECONDS)
+
+
+def start_analysis_result_collector():
+    """Start the finished-job collector (queue mode, API process only; idempotent)."""
+    global _analysis_collector_started
+    if ANALYSIS_DISPATCH_MODE != 'queue':
+        return
+    with _analysis_queue_lock:
+        if _analysis_collector_started:
+            return
+        _analysis_collector_started = True
+    threading.Thread(target=_analysis_result_collector_loop, name="analysis-result-collector", daemon=True).start()
 
 # Model configuration
 MODEL_PATH = "slowfast_cricket.pth"
@@ -3225,6 +5103,18 @@ def create_annotated_video(video_path, keypoints_path, player_type):
             logger.error(f"🎬 [ANNOTATED_VIDEO] File created but is empty (0 bytes)")
             os.remove(output_path)
             return None
+
+        # Streamable output: moov atom first, plus the history thumbnail.
+        if _faststart_remux_mp4(output_path):
+            logger.info(f"🎬 [ANNOTATED_VIDEO] Remuxed with faststart: {output_path}")
+        try:
+            ensure_video_poster(output_path)
+        except Exception as e:
+            logger.warning(f"🎬 [ANNOTATED_VIDEO] Poster frame failed: {e}")
+        if HLS_PACKAGING_ENABLED:
+            playlist = package_video_hls(output_path)
+            if playlist:
+                logger.info(f"🎬 [ANNOTATED_VIDEO] Packaged HLS: {playlist}")
         
         # Return just the filename for API access
         filename = os.path.basename(output_path)
@@ -3239,7 +5129,7 @@ def create_annotated_video(video_path, keypoints_path, player_type):
             out.release()
         return None
 
-def extract_pose_keypoints(video_path, player_type):
+def extract_pose_keypoints(video_path, player_type, keypoints_path=None):
     cap = cv2.VideoCapture(video_path)
     all_keypoints, frame_idx = [], 0
 
@@ -3306,11 +5196,13 @@ def extract_pose_keypoints(video_path, player_type):
     df = pd.DataFrame(all_keypoints)
     
     # Determine where to save keypoints - use user folder if video is in user folder
-    video_dir = os.path.dirname(video_path)
-    if os.path.basename(video_dir).isdigit():  # Check if parent directory is a user ID folder
-        keypoints_path = os.path.join(video_dir, f'{player_type}_keypoints.csv')
-    else:
-        keypoints_path = os.path.join(UPLOAD_FOLDER, f'{player_type}_keypoints.csv')
+    # (unless the caller picked a unique path, e.g. one per session segment)
+    if keypoints_path is None:
+        video_dir = os.path.dirname(video_path)
+        if os.path.basename(video_dir).isdigit():  # Check if parent directory is a user ID folder
+            keypoints_path = os.path.join(video_dir, f'{player_type}_keypoints.csv')
+        else:
+            keypoints_path = os.path.join(UPLOAD_FOLDER, f'{player_type}_keypoints.csv')
     
     df.to_csv(keypoints_path, index=False)
     
@@ -4523,6 +6415,120 @@ def upload_file():
     flash('Invalid file type. Please upload a video file.')
     return redirect(url_for('index'))
 
+def _start_job_for_uploaded_video(user_id, username, filepath, filename, form, *, job_id, now, content_type=None, sha256=None):
+    """
+    Shared tail of every upload path once the video is on local disk: duration
+    limit, canonical copy to object storage, job record, dispatch. Returns the
+    Flask response. The single probe_video() result is stored on the job so later
+    stages don't probe again; pass `sha256` if the caller already hashed the file.
+    """
+    sha256 = sha256 or _file_sha256(filepath)
+    probe = probe_video(filepath, content_hash=sha256)
+
+    # Enforce the maximum video length (clips over 5 seconds are trimmed during analysis).
+    duration = probe.get("duration") if probe else None
+    if duration is None:
+        try:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        except Exception:
+            pass
+        logger.warning(f"Could not determine duration for uploaded video: {filename}")
+        return jsonify({
+            "error": "We couldn't read this video. Please upload a valid video of a particular shot that is 5 seconds or less."
+        }), 400
+
+    # Allow a tiny tolerance so a clip that is ~5s isn't wrongly rejected.
+    max_duration = _max_accepted_duration(form)
+    if duration > max_duration + 0.5:
+        try:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        except Exception:
+            pass
+        logger.warning(
+            f"Rejected upload: video too long ({duration:.2f}s) for user {username}, file {filename}"
+        )
+        return jsonify({
+            "error": _video_too_long_message(),
+            "duration": round(duration, 2),
+            "max_duration": max_duration,
+        }), 400
+
+    expo_push_token = form.get('expo_push_token') or form.get('push_token')
+
+    job = {
+        "job_id": job_id,
+        "status": "queued",
+        "created_at": now,
+        "updated_at": now,
+        "user_id": user_id,
+        "username": username,
+        "filename": filename,
+        "player_type": form.get("player_type", "batsman"),
+        "video_sha256": sha256,
+        "video_probe": probe,
+    }
+    # Remote workers read the video from object storage, so with a background
+    # upload the job is dispatched by _on_video_uploaded once it has landed.
+    dispatch_after_upload = S3_ASYNC_UPLOADS and ANALYSIS_DISPATCH_MODE == 'queue'
+    if dispatch_after_upload:
+        job.update({"dispatch_pending": True, "form": form, "expo_push_token": expo_push_token})
+
+    try:
+        if S3_ASYNC_UPLOADS:
+            s3_info = enqueue_video_upload(
+                filepath,
+                username,
+                filename,
+                user_id=user_id,
+                job_id=job_id,
+                content_type=content_type,
+                job=job,
+            )
+            logger.info(f"☁️ Queued video upload to {s3_info['uri']}")
+        else:
+            s3_info = upload_video_to_s3(
+                filepath,
+                username,
+                filename,
+                job_id=job_id,
+                content_type=content_type,
+            )
+            job.update({
+                "video_s3_bucket": s3_info.get("bucket"),
+                "video_s3_key": s3_info.get("key"),
+                "video_s3_uri": s3_info.get("uri"),
+                "video_s3_status": "uploaded",
+            })
+            save_job(user_id, job)
+            logger.info(f"☁️ Uploaded video to S3: {s3_info['uri']}")
+    except Exception as e:
+        try:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        except Exception:
+            pass
+        logger.error(f"❌ S3 upload failed for user {username}: {e}", exc_info=True)
+        return jsonify({"error": "Failed to upload video to S3", "details": str(e)}), 500
+
+    if dispatch_after_upload:
+        # The outbox holds its own link to the bytes.
+        _remove_tmp_upload(filepath)
+    else:
+        dispatch_analysis_job(job_id, user_id, username, filepath, filename, form, expo_push_token)
+
+    logger.info(f"🧵 [JOB {job_id}] Enqueued analysis for {username} file {filename}")
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "filename": filename,
+        "status": "queued",
+        "video_s3_bucket": s3_info.get("bucket"),
+        "video_s3_key": s3_info.get("key"),
+    })
+
+
 # Mobile API endpoints
 @app.route('/api/upload', methods=['POST'])
 @require_auth
@@ -4572,90 +6578,773 @@ def api_upload_file():
         filepath = os.path.join(tmp_dir, f"{user_id}_{job_id}_{filename}")
         file.save(filepath)
 
-        # Enforce a maximum video length of 5 seconds.
-        MAX_VIDEO_DURATION_SECONDS = 5
-        duration = get_video_duration_seconds(filepath)
-        if duration is None:
-            try:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            except Exception:
-                pass
-            logger.warning(f"Could not determine duration for uploaded video: {filename}")
+        return _start_job_for_uploaded_video(
+            user_id, username, filepath, filename, dict(request.form),
+            job_id=job_id, now=now, content_type=getattr(file, "mimetype", None),
+        )
+    
+    logger.warning("Invalid file type")
+    return jsonify({'error': 'Invalid file type. Please upload a video file.'}), 400
+
+_upload_complete_lock = threading.Lock()
+
+
+@app.route('/api/upload/presign', methods=['POST'])
+@require_auth
+def api_presign_upload():
+    """
+    Step 1 of a direct upload: create the job and return a presigned S3 PUT URL.
+    Body (JSON): filename, content_type, plus the usual /api/upload form fields
+    (player_type, shot_type, batter_side, ..., expo_push_token).
+    """
+    user_id = request.user['user_id']
+    username = request.user['username']
+    data = request.get_json(silent=True) or {}
+
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Please upload a video file.'}), 400
+
+    player_type = data.get('player_type', 'batsman')
+    if player_type == 'batsman' and not str(data.get('shot_type') or '').strip():
+        return jsonify({'error': 'Shot type is required. Please select a shot type.'}), 400
+
+    form = {
+        k: str(v) for k, v in data.items()
+        if v is not None and k not in ('filename', 'content_type', 'expo_push_token', 'push_token')
+    }
+    form['player_type'] = player_type
+    expo_push_token = data.get('expo_push_token') or data.get('push_token')
+
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow().isoformat() + "Z"
+    try:
+        upload = presign_video_upload(username, filename, job_id=job_id, content_type=data.get('content_type'))
+    except Exception as e:
+        logger.error(f"❌ Presign failed for user {username}: {e}", exc_info=True)
+        return jsonify({"error": "Failed to prepare upload", "details": str(e)}), 500
+
+    save_job(user_id, {
+        "job_id": job_id,
+        "status": "awaiting_upload",
+        "upload_mode": "presigned",
+        "created_at": now,
+        "updated_at": now,
+        "user_id": user_id,
+        "username": username,
+        "filename": filename,
+        "player_type": player_type,
+        "form": form,
+        "expo_push_token": expo_push_token,
+        "video_s3_bucket": upload["bucket"],
+        "video_s3_key": upload["key"],
+        "video_s3_uri": upload["uri"],
+    })
+
+    logger.info(f"☁️ [JOB {job_id}] Issued presigned upload for {username} file {filename}")
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "filename": filename,
+        "status": "awaiting_upload",
+        "upload_url": upload["upload_url"],
+        "method": upload["method"],
+        "headers": upload["headers"],
+        "expires_in": upload["expires_in"],
+        "video_s3_bucket": upload["bucket"],
+        "video_s3_key": upload["key"],
+    })
+
+
+@app.route('/api/upload/complete', methods=['POST'])
+@require_auth
+def api_complete_upload():
+    """
+    Step 2 of a direct upload: check the object landed in S3 and enqueue analysis.
+    The worker streams the video down itself. Safe to retry: a job that is already
+    queued (or further along) just reports its status.
+    """
+    user_id = request.user['user_id']
+    username = request.user['username']
+    data = request.get_json(silent=True) or {}
+    job_id = str(data.get('job_id') or '').strip()
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        return jsonify({'error': 'Invalid job_id'}), 400
+
+    with _upload_complete_lock:
+        job = load_job(user_id, job_id)
+        if not job or job.get('upload_mode') != 'presigned':
+            return jsonify({'error': 'Upload not found'}), 404
+        if job.get('status') != 'awaiting_upload':
+            return jsonify({"success": True, "job_id": job_id, "filename": job.get('filename'), "status": job.get('status')})
+
+        try:
+            head = head_s3_object(job['video_s3_bucket'], job['video_s3_key'])
+        except Exception as e:
+            logger.error(f"❌ [JOB {job_id}] Could not verify upload: {e}", exc_info=True)
+            return jsonify({"error": "Could not verify upload", "details": str(e)}), 502
+        if head is None:
+            return jsonify({'error': 'Upload not found in storage yet. Finish the upload and retry.'}), 409
+        size = int(head.get('ContentLength') or 0)
+        if size <= 0 or size > S3_DIRECT_UPLOAD_MAX_BYTES:
             return jsonify({
-                "error": "We couldn't read this video. Please upload a valid video of a particular shot that is 5 seconds or less."
+                'error': 'Uploaded video is empty or too large.',
+                'size_bytes': size,
+                'max_bytes': S3_DIRECT_UPLOAD_MAX_BYTES,
             }), 400
 
-        # Allow a tiny tolerance so a clip that is ~5s isn't wrongly rejected.
-        if duration > MAX_VIDEO_DURATION_SECONDS + 0.5:
+        job.update({
+            "status": "queued",
+            "video_size_bytes": size,
+            "updated_at": datetime.utcnow().isoformat() + "Z",
+        })
+        save_job(user_id, job)
+
+    filename = job['filename']
+    dispatch_analysis_job(job_id, user_id, username, None, filename, job.get('form') or {}, job.get('expo_push_token'))
+
+    logger.info(f"🧵 [JOB {job_id}] Enqueued analysis for {username} file {filename} (direct upload, {size} bytes)")
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "filename": filename,
+        "status": "queued",
+        "video_s3_bucket": job.get("video_s3_bucket"),
+        "video_s3_key": job.get("video_s3_key"),
+    })
+
+
+# ==================== RESUMABLE UPLOADS ====================
+# tus-style chunked uploads for unreliable mobile networks. The client creates an
+# upload, PATCHes chunks at the current offset (after a drop it asks for the
+# offset and carries on), then finalises, which hands the file to the same
+# duration check + analysis enqueue as /api/upload. Chunks are streamed straight
+# to disk and hashed as they arrive, so the body is never held in memory.
+RESUMABLE_UPLOAD_DIR = os.path.join(UPLOAD_FOLDER, "_resumable")
+RESUMABLE_UPLOAD_MAX_BYTES = int(os.getenv('RESUMABLE_UPLOAD_MAX_BYTES', str(500 * 1024 * 1024)))
+RESUMABLE_UPLOAD_TTL_HOURS = int(os.getenv('RESUMABLE_UPLOAD_TTL_HOURS', '24'))
+RESUMABLE_READ_BYTES = 1024 * 1024
+TUS_VERSION = '1.0.0'
+
+# Per-process cache; bytes below the committed offset never change, so a hasher
+# is valid for as long as its offset matches the row.
+_resumable_hashers = {}  # upload_id -> (offset, sha256 of bytes [0, offset))
+
+
+def _resumable_part_path(upload_id):
+    return os.path.join(RESUMABLE_UPLOAD_DIR, f"{upload_id}.part")
+
+
+def _resumable_lock_path(upload_id):
+    return os.path.join(RESUMABLE_UPLOAD_DIR, f"{upload_id}.lock")
+
+
+@contextmanager
+def _resumable_lock(upload_id):
+    """One PATCH/DELETE/finalise at a time per upload, across threads and processes
+    (flock on the upload's lock file). Only take it for an upload_id whose row
+    exists, and re-read the row once held: it may have gone while waiting."""
+    os.makedirs(RESUMABLE_UPLOAD_DIR, exist_ok=True)
+    with open(_resumable_lock_path(upload_id), "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+def _forget_resumable(upload_id):
+    _resumable_hashers.pop(upload_id, None)
+    try:
+        os.remove(_resumable_lock_path(upload_id))
+    except OSError:
+        pass
+
+
+def _resumable_hasher(upload_id, offset):
+    """Running SHA-256 of the first `offset` bytes; rebuilt from disk after a restart."""
+    cached = _resumable_hashers.get(upload_id)
+    if cached and cached[0] == offset:
+        return cached[1]
+    hasher = hashlib.sha256()
+    remaining = offset
+    with open(_resumable_part_path(upload_id), 'rb') as f:
+        while remaining > 0:
+            buf = f.read(min(RESUMABLE_READ_BYTES, remaining))
+            if not buf:
+                break
+            hasher.update(buf)
+            remaining -= len(buf)
+    _resumable_hashers[upload_id] = (offset, hasher)
+    return hasher
+
+
+def _parse_upload_metadata(header):
+    """tus Upload-Metadata: 'key base64value,key2 base64value2'."""
+    fields = {}
+    for pair in (header or '').split(','):
+        parts = pair.strip().split(' ', 1)
+        if not parts[0]:
+            continue
+        try:
+            fields[parts[0]] = base64.b64decode(parts[1]).decode('utf-8') if len(parts) > 1 else ''
+        except Exception:
+            continue
+    return fields
+
+
+def _tus_response(payload=None, status=200, **headers):
+    resp = jsonify(payload) if payload is not None else app.response_class(status=status)
+    resp.status_code = status
+    resp.headers['Tus-Resumable'] = TUS_VERSION
+    resp.headers['Cache-Control'] = 'no-store'
+    for name, value in headers.items():
+        resp.headers[name.replace('_', '-')] = str(value)
+    return resp
+
+
+def _load_resumable_upload(user_id, upload_id):
+    conn = get_db_connection()
+    try:
+        return conn.execute(
+            'SELECT * FROM resumable_uploads WHERE upload_id = ? AND user_id = ?', (upload_id, user_id)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def _expire_resumable_uploads():
+    """Drop uploads untouched for RESUMABLE_UPLOAD_TTL_HOURS, with their partial files."""
+    cutoff = (datetime.utcnow() - timedelta(hours=RESUMABLE_UPLOAD_TTL_HOURS)).strftime('%Y-%m-%d %H:%M:%S')
+    with db_transaction(immediate=True) as conn:
+        rows = conn.execute('SELECT upload_id FROM resumable_uploads WHERE updated_at < ?', (cutoff,)).fetchall()
+        conn.execute('DELETE FROM resumable_uploads WHERE updated_at < ?', (cutoff,))
+        live = {r['upload_id'] for r in conn.execute('SELECT upload_id FROM resumable_uploads').fetchall()}
+    for row in rows:
+        _forget_resumable(row['upload_id'])
+        try:
+            os.remove(_resumable_part_path(row['upload_id']))
+        except OSError:
+            pass
+    # Cached hashers for uploads another process finished or expired.
+    for upload_id in [u for u in list(_resumable_hashers) if u not in live]:
+        _resumable_hashers.pop(upload_id, None)
+
+
+@app.route('/api/uploads/resumable', methods=['POST'])
+@require_auth
+def create_resumable_upload():
+    """
+    Create a resumable upload. Total size comes from the Upload-Length header (or
+    "length" in the JSON body); filename and the usual /api/upload form fields come
+    from the JSON body or tus Upload-Metadata.
+    """
+    user_id = request.user['user_id']
+    fields = _parse_upload_metadata(request.headers.get('Upload-Metadata'))
+    fields.update(request.get_json(silent=True) or {})
+
+    try:
+        length = int(request.headers.get('Upload-Length') or fields.get('length') or 0)
+    except (TypeError, ValueError):
+        length = 0
+    if length <= 0:
+        return _tus_response({'error': 'Upload-Length is required'}, 400)
+    if length > RESUMABLE_UPLOAD_MAX_BYTES:
+        return _tus_response({'error': 'Video is too large', 'max_bytes': RESUMABLE_UPLOAD_MAX_BYTES}, 413,
+                             Tus_Max_Size=RESUMABLE_UPLOAD_MAX_BYTES)
+
+    filename = secure_filename(fields.get('filename') or '')
+    if not filename or not allowed_file(filename):
+        return _tus_response({'error': 'Invalid file type. Please upload a video file.'}, 400)
+    if fields.get('player_type', 'batsman') == 'batsman' and not str(fields.get('shot_type') or '').strip():
+        return _tus_response({'error': 'Shot type is required. Please select a shot type.'}, 400)
+    form = {
+        k: str(v) for k, v in fields.items()
+        if v is not None and k not in ('filename', 'length', 'content_type', 'filetype')
+    }
+    form.setdefault('player_type', 'batsman')
+
+    try:
+        _expire_resumable_uploads()
+    except Exception as e:
+        logger.warning(f"Resumable upload cleanup failed: {e}")
+
+    upload_id = uuid.uuid4().hex
+    os.makedirs(RESUMABLE_UPLOAD_DIR, exist_ok=True)
+    open(_resumable_part_path(upload_id), 'wb').close()
+    with db_transaction(immediate=True) as conn:
+        conn.execute(
+            '''INSERT INTO resumable_uploads (upload_id, user_id, filename, content_type, form, upload_length)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            (upload_id, user_id, filename, fields.get('content_type') or fields.get('filetype'),
+             json.dumps(form), length),
+        )
+
+    location = f"/api/uploads/resumable/{upload_id}"
+    return _tus_response(
+        {'success': True, 'upload_id': upload_id, 'upload_url': location, 'offset': 0, 'length': length},
+        201, Location=location, Upload_Offset=0, Upload_Length=length,
+    )
+
+
+@app.route('/api/uploads/resumable/<upload_id>', methods=['GET', 'HEAD'])
+@require_auth
+def get_resumable_upload(upload_id):
+    """Current offset, so an interrupted client knows where to resume."""
+    row = _load_resumable_upload(request.user['user_id'], upload_id)
+    if not row:
+        return _tus_response({'error': 'Upload not found'}, 404)
+    return _tus_response(
+        {'upload_id': upload_id, 'offset': row['upload_offset'], 'length': row['upload_length'], 'job_id': row['job_id']},
+        200, Upload_Offset=row['upload_offset'], Upload_Length=row['upload_length'],
+    )
+
+
+@app.route('/api/uploads/resumable/<upload_id>', methods=['PATCH'])
+@require_auth
+def patch_resumable_upload(upload_id):
+    """
+    Append one chunk (Content-Type: application/offset+octet-stream) at Upload-Offset.
+    Optional Upload-Checksum: "sha256 <base64 digest>" of the chunk. If the
+    connection drops mid-chunk, the bytes received so far are kept (unless a
+    checksum was sent) and the next HEAD reports the new offset.
+    """
+    user_id = request.user['user_id']
+    if (request.mimetype or '') != 'application/offset+octet-stream':
+        return _tus_response({'error': 'Content-Type must be application/offset+octet-stream'}, 415)
+    try:
+        client_offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return _tus_response({'error': 'Upload-Offset header is required'}, 400)
+
+    checksum = None
+    checksum_header = (request.headers.get('Upload-Checksum') or '').strip()
+    if checksum_header:
+        algo, _, digest = checksum_header.partition(' ')
+        if algo.lower() != 'sha256':
+            return _tus_response({'error': 'Only sha256 checksums are supported'}, 400)
+        checksum = digest.strip()
+
+    if not _load_resumable_upload(user_id, upload_id):
+        return _tus_response({'error': 'Upload not found'}, 404)
+    with _resumable_lock(upload_id):
+        row = _load_resumable_upload(user_id, upload_id)
+        if not row:
+            _forget_resumable(upload_id)
+            return _tus_response({'error': 'Upload not found'}, 404)
+        if row['job_id']:
+            return _tus_response({'error': 'Upload already finalised', 'job_id': row['job_id']}, 409)
+        offset, length = row['upload_offset'], row['upload_length']
+        if client_offset != offset:
+            return _tus_response({'error': 'Offset mismatch', 'offset': offset}, 409, Upload_Offset=offset)
+
+        running = _resumable_hasher(upload_id, offset).copy()
+        chunk_hasher = hashlib.sha256() if checksum else None
+        remaining = length - offset
+        written = 0
+        too_large = interrupted = False
+        with open(_resumable_part_path(upload_id), 'r+b') as f:
+            # Anything past the committed offset is debris from an earlier failed PATCH.
+            f.seek(offset)
+            f.truncate()
             try:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            except Exception:
-                pass
-            logger.warning(
-                f"Rejected upload: video too long ({duration:.2f}s) for user {username}, file {filename}"
+                while True:
+                    buf = request.stream.read(RESUMABLE_READ_BYTES)
+                    if not buf:
+                        break
+                    if written + len(buf) > remaining:
+                        too_large = True
+                        break
+                    f.write(buf)
+                    running.update(buf)
+                    if chunk_hasher:
+                        chunk_hasher.update(buf)
+                    written += len(buf)
+            except Exception as e:
+                interrupted = True
+                logger.info(f"Resumable upload {upload_id} interrupted after {written} bytes: {e}")
+
+            bad_checksum = bool(chunk_hasher) and (
+                interrupted or base64.b64encode(chunk_hasher.digest()).decode() != checksum
             )
-            return jsonify({
-                "error": "The video you uploaded is large. You need to upload a video of a particular shot and of 5 seconds.",
-                "duration": round(duration, 2),
-                "max_duration": MAX_VIDEO_DURATION_SECONDS,
-            }), 400
+            if too_large or bad_checksum:
+                f.seek(offset)
+                f.truncate()
+                written = 0
+            f.flush()
+            os.fsync(f.fileno())
+
+        if too_large:
+            return _tus_response({'error': 'Chunk exceeds Upload-Length', 'offset': offset}, 413, Upload_Offset=offset)
+        if bad_checksum:
+            return _tus_response({'error': 'Checksum mismatch', 'offset': offset}, 460, Upload_Offset=offset)
+
+        new_offset = offset + written
+        with db_transaction(immediate=True) as conn:
+            committed = conn.execute(
+                '''UPDATE resumable_uploads SET upload_offset = ?, updated_at = CURRENT_TIMESTAMP
+                   WHERE upload_id = ? AND upload_offset = ? AND job_id IS NULL''',
+                (new_offset, upload_id, offset),
+            ).rowcount == 1
+        if not committed:
+            # Expired (and deleted) while we wrote; the client re-syncs via HEAD.
+            _resumable_hashers.pop(upload_id, None)
+            current = _load_resumable_upload(user_id, upload_id)
+            current_offset = current['upload_offset'] if current else offset
+            return _tus_response({'error': 'Upload changed concurrently', 'offset': current_offset}, 409,
+                                 Upload_Offset=current_offset)
+        _resumable_hashers[upload_id] = (new_offset, running)
+
+    return _tus_response(None, 204, Upload_Offset=new_offset)
+
+
+@app.route('/api/uploads/resumable/<upload_id>', methods=['DELETE'])
+@require_auth
+def delete_resumable_upload(upload_id):
+    """Abandon an unfinished upload and free its disk space."""
+    user_id = request.user['user_id']
+    if not _load_resumable_upload(user_id, upload_id):
+        return _tus_response({'error': 'Upload not found'}, 404)
+    with _resumable_lock(upload_id):
+        row = _load_resumable_upload(user_id, upload_id)
+        if not row:
+            _forget_resumable(upload_id)
+            return _tus_response({'error': 'Upload not found'}, 404)
+        with db_transaction(immediate=True) as conn:
+            conn.execute('DELETE FROM resumable_uploads WHERE upload_id = ?', (upload_id,))
+        try:
+            os.remove(_resumable_part_path(upload_id))
+        except OSError:
+            pass
+    _forget_resumable(upload_id)
+    return _tus_response(None, 204)
+
 
+@app.route('/api/uploads/resumable/<upload_id>/finalize', methods=['POST'])
+@require_auth
+def finalize_resumable_upload(upload_id):
+    """Hand a complete upload to the normal duration check + analysis enqueue.
+    Safe to retry: an already finalised upload reports its job."""
+    user_id = request.user['user_id']
+    username = request.user['username']
+    if not _load_resumable_upload(user_id, upload_id):
+        return _tus_response({'error': 'Upload not found'}, 404)
+    with _resumable_lock(upload_id):
+        row = _load_resumable_upload(user_id, upload_id)
+        if not row:
+            _forget_resumable(upload_id)
+            return _tus_response({'error': 'Upload not found'}, 404)
+        if row['job_id']:
+            job = load_job(user_id, row['job_id']) or {}
+            return _tus_response({'success': True, 'job_id': row['job_id'], 'filename': row['filename'],
+                                  'status': job.get('status', 'queued')})
+        if row['upload_offset'] != row['upload_length']:
+            return _tus_response({'error': 'Upload is incomplete', 'offset': row['upload_offset'],
+                                  'length': row['upload_length']}, 409, Upload_Offset=row['upload_offset'])
+
+        sha256 = _resumable_hasher(upload_id, row['upload_offset']).hexdigest()
+        job_id = uuid.uuid4().hex
+        # Claim the upload before moving its file, in case another process is finalising it too.
+        with db_transaction(immediate=True) as conn:
+            claimed = conn.execute(
+                '''UPDATE resumable_uploads SET job_id = ?, sha256 = ?, updated_at = CURRENT_TIMESTAMP
+                   WHERE upload_id = ? AND job_id IS NULL AND upload_offset = upload_length''',
+                (job_id, sha256, upload_id),
+            ).rowcount == 1
+        if not claimed:
+            return _tus_response({'error': 'Upload is being finalised by another request'}, 409)
+        now = datetime.utcnow().isoformat() + "Z"
+        filename = row['filename']
+        tmp_dir = os.path.join(UPLOAD_FOLDER, "_tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        filepath = os.path.join(tmp_dir, f"{user_id}_{job_id}_{filename}")
+        part_path = _resumable_part_path(upload_id)
         try:
-            s3_info = upload_video_to_s3(
-                filepath,
-                username,
-                filename,
-                job_id=job_id,
-                content_type=getattr(file, "mimetype", None),
+            os.replace(part_path, filepath)
+            resp = _start_job_for_uploaded_video(
+                user_id, username, filepath, filename, json.loads(row['form'] or '{}'),
+                job_id=job_id, now=now, content_type=row['content_type'], sha256=sha256,
             )
-            logger.info(f"☁️ Uploaded video to S3: {s3_info['uri']}")
-        except Exception as e:
-            try:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            except Exception:
-                pass
-            logger.error(f"❌ S3 upload failed for user {username}: {e}", exc_info=True)
-            return jsonify({"error": "Failed to upload video to S3", "details": str(e)}), 500
+        except Exception:
+            # Don't leave a job_id with no job behind: give the bytes back and drop the
+            # claim so a retry finalises again (or, if the bytes are gone, the upload).
+            if os.path.exists(filepath) and not os.path.exists(part_path):
+                os.replace(filepath, part_path)
+            with db_transaction(immediate=True) as conn:
+                if os.path.exists(part_path):
+                    conn.execute(
+                        '''UPDATE resumable_uploads SET job_id = NULL, sha256 = NULL, updated_at = CURRENT_TIMESTAMP
+                           WHERE upload_id = ? AND job_id = ?''',
+                        (upload_id, job_id),
+                    )
+                else:
+                    conn.execute('DELETE FROM resumable_uploads WHERE upload_id = ?', (upload_id,))
+            raise
+        if isinstance(resp, tuple):
+            # Rejected (too long, unreadable, storage error): the file is gone, so is the upload.
+            with db_transaction(immediate=True) as conn:
+                conn.execute('DELETE FROM resumable_uploads WHERE upload_id = ?', (upload_id,))
+    _forget_resumable(upload_id)
+    return resp
+
+# ==================== ON-DEVICE KEYPOINTS ====================
+# The app can run MoveNet itself and send the keypoint series instead of the
+# video, so the server skips decode/transcode/pose and goes straight to
+# compute_features and the Gemini stages. Same 17-keypoint schema as
+# extract_pose_keypoints(): x/y normalised to the frame, plus confidence.
+#
+# Accepted as the `keypoints` part of a multipart request, either
+#   - CSV with extract_pose_keypoints()'s header (frame, nose_x, nose_y, nose_conf, ...), or
+#   - binary: 12-byte header struct "<4sIB3x" (b"KP17", frame count, dtype 1=float16 /
+#     2=float32), then frames x 17 x (x, y, conf) values in keypoints_names order.
+# The video is optional and only archived; it can also follow later on
+# /api/analyze/keypoints/<job_id>/video, so analysis never waits for it.
+KEYPOINTS_MAX_BYTES = int(os.getenv('KEYPOINTS_MAX_BYTES', str(5 * 1024 * 1024)))
+KEYPOINTS_MAX_FRAMES = int(os.getenv('KEYPOINTS_MAX_FRAMES', '900'))
+KEYPOINTS_MIN_FRAMES = int(os.getenv('KEYPOINTS_MIN_FRAMES', '5'))
+_KEYPOINTS_BINARY_HEADER = struct.Struct("<4sIB3x")
+_KEYPOINTS_BINARY_DTYPES = {1: np.dtype("<f2"), 2: np.dtype("<f4")}
+
+
+def _keypoint_columns():
+    return [f"{name}_{axis}" for name in keypoints_names for axis in ("x", "y", "conf")]
+
+
+def parse_keypoints_upload(data: bytes) -> pd.DataFrame:
+    """Decode an uploaded keypoint series (binary or CSV) into extract_pose_keypoints()'s layout."""
+    columns = _keypoint_columns()
+    if data[:4] == b"KP17":
+        if len(data) < _KEYPOINTS_BINARY_HEADER.size:
+            raise ValueError("Keypoints file is truncated.")
+        _, frames, dtype_code = _KEYPOINTS_BINARY_HEADER.unpack_from(data)
+        dtype = _KEYPOINTS_BINARY_DTYPES.get(dtype_code)
+        if dtype is None:
+            raise ValueError(f"Unsupported keypoints dtype {dtype_code}; expected 1 (float16) or 2 (float32).")
+        expected = frames * len(columns) * dtype.itemsize
+        body = data[_KEYPOINTS_BINARY_HEADER.size:]
+        if len(body) != expected:
+            raise ValueError(f"Keypoints file has {len(body)} data bytes; {frames} frames need {expected}.")
+        values = np.frombuffer(body, dtype=dtype).astype(np.float64).reshape(frames, len(columns))
+        df = pd.DataFrame(values, columns=columns)
+    else:
+        try:
+            df = pd.read_csv(io.BytesIO(data))
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+            raise ValueError(f"Keypoints file is not a valid CSV: {e}")
+        missing = [c for c in columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"Keypoints CSV is missing {len(missing)} column(s), e.g. {', '.join(missing[:3])}.")
+        df = df[columns].apply(pd.to_numeric, errors="coerce")
+
+    if df.isna().to_numpy().any() or not np.isfinite(df.to_numpy()).all():
+        raise ValueError("Keypoints contain missing or non-numeric values.")
+    if not KEYPOINTS_MIN_FRAMES <= len(df) <= KEYPOINTS_MAX_FRAMES:
+        raise ValueError(f"Keypoints must cover {KEYPOINTS_MIN_FRAMES}-{KEYPOINTS_MAX_FRAMES} frames (got {len(df)}).")
+    conf = df[[c for c in columns if c.endswith("_conf")]].to_numpy()
+    if conf.min() < 0 or conf.max() > 1:
+        raise ValueError("Keypoint confidences must be between 0 and 1.")
+    df.insert(0, "frame", np.arange(len(df)))
+    return df
+
+
+def _archive_job_video(user_id, job_id, file, username):
+    """Store an on-device job's video for the record; analysis does not wait for it."""
+    filename = secure_filename(file.filename or "") or f"{job_id}.mp4"
+    tmp_dir = os.path.join(UPLOAD_FOLDER, "_tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    filepath = os.path.join(tmp_dir, f"{user_id}_{job_id}_{filename}")
+    file.save(filepath)
+    content_type = getattr(file, "mimetype", None)
+    try:
+        if S3_ASYNC_UPLOADS:
+            info = enqueue_video_upload(filepath, username, filename, user_id=user_id, job_id=job_id,
+                                        content_type=content_type)
+        else:
+            info = upload_video_to_s3(filepath, username, filename, job_id=job_id, content_type=content_type)
+    except Exception as e:
+        with job_update(user_id, job_id) as job:
+            job.update({"video_s3_status": "failed", "video_s3_error": str(e)})
+        raise
+    finally:
+        # The outbox holds its own link to the bytes.
+        _remove_tmp_upload(filepath)
 
-        expo_push_token = request.form.get('expo_push_token') or request.form.get('push_token')
+    # Only the video fields: the analysis thread may be writing its status meanwhile.
+    with job_update(user_id, job_id) as job:
+        job.update({
+            "video_s3_bucket": info.get("bucket"),
+            "video_s3_key": info.get("key"),
+            "video_s3_uri": info.get("uri"),
+        })
+        status = info.get("status", "uploaded")
+        # A fast background upload may already have recorded its outcome.
+        if status == "uploaded" or job.get("video_s3_status") not in ("uploaded", "failed"):
+            job["video_s3_status"] = status
+    return info
 
-        job = {
+
+def process_keypoints_job(job_id, user_id, username, keypoints_path, filename, form, expo_push_token=None):
+    """Background worker for on-device keypoints: quality gate, features, Gemini, report."""
+    try:
+        with job_update(user_id, job_id) as job:
+            job.update({
+                "status": "processing",
+                "updated_at": datetime.utcnow().isoformat() + "Z",
+            })
+
+        player_type = form.get("player_type", "batsman")
+        stage = _session_stage(player_type, form)
+        check_pose_quality(keypoints_path, job_id=job_id)
+
+        gemini.begin_request()
+        analysis_log_id = log_video_analysis(user_id, username, filename, player_type, job_id)
+        logger.info(f"🎬 [JOB {job_id}] On-device keypoints analysis started for {filename}")
+        _ = compute_features(keypoints_path, stage["side"], stage["kind"])
+        try:
+            gpt_feedback = stage["feedback"](keypoints_path)
+        except Exception as e:
+            logger.error(f"❌ [JOB {job_id}] Error in Gemini feedback: {str(e)}", exc_info=True)
+            gpt_feedback = "Unable to generate feedback at this time."
+
+        results = {
+            "success": True,
             "job_id": job_id,
-            "status": "queued",
-            "created_at": now,
-            "updated_at": now,
             "user_id": user_id,
             "username": username,
-            "filename": filename,
             "player_type": player_type,
-            "video_s3_bucket": s3_info.get("bucket"),
-            "video_s3_key": s3_info.get("key"),
-            "video_s3_uri": s3_info.get("uri"),
+            "analysis_source": "on_device",
+            **stage["fields"],
+            "gpt_feedback": gpt_feedback,
+            "filename": filename,
+            "annotated_video_path": None,
         }
-        save_job(user_id, job)
+        try:
+            results["report_path"] = generate_report(results, player_type, *stage["report_args"], filename, user_id=user_id)
+        except Exception as e:
+            logger.error(f"❌ [JOB {job_id}] Error generating report: {str(e)}", exc_info=True)
+            results["report_path"] = None
 
-        worker = threading.Thread(
-            target=process_analysis_job,
-            args=(job_id, user_id, username, filepath, filename, dict(request.form), expo_push_token),
-            daemon=True,
-        )
-        worker.start()
+        try:
+            update_analysis_tokens(analysis_log_id, gemini.request_usage())
+        except Exception as token_err:
+            logger.warning(f"⚠️ [JOB {job_id}] Token usage record failed: {token_err}")
+
+        _finish_analysis_job(job_id, user_id, filename, results, expo_push_token)
+        logger.info(f"✅ [JOB {job_id}] Completed successfully for {filename}")
+    except Exception as e:
+        logger.error(f"❌ [JOB {job_id}] Failed: {str(e)}", exc_info=True)
+        _fail_analysis_job(job_id, user_id, filename, e, expo_push_token)
+
+
+@app.route('/api/analyze/keypoints', methods=['POST'])
+@require_auth
+def api_analyze_keypoints():
+    """
+    Analyse a keypoint series computed on the device. Multipart form: `keypoints`
+    (CSV or binary, see above), the usual /api/upload fields (player_type,
+    shot_type, batter_side, ..., expo_push_token), optional `filename` and an
+    optional `video` that is archived only.
+    """
+    user_id = request.user['user_id']
+    username = request.user['username']
+
+    upload = request.files.get('keypoints')
+    if upload is None or upload.filename == '':
+        return jsonify({'error': 'No keypoints file provided'}), 400
+    data = upload.read(KEYPOINTS_MAX_BYTES + 1)
+    if len(data) > KEYPOINTS_MAX_BYTES:
+        return jsonify({'error': 'Keypoints file is too large', 'max_bytes': KEYPOINTS_MAX_BYTES}), 413
+
+    form = dict(request.form)
+    player_type = form.get('player_type', 'batsman')
+    try:
+        stage = _session_stage(player_type, form)
+        df = parse_keypoints_upload(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    video = request.files.get('video')
+    if video is not None and video.filename and not allowed_file(video.filename):
+        return jsonify({'error': 'Invalid file type. Please upload a video file.'}), 400
+
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow().isoformat() + "Z"
+    filename = secure_filename(form.get('filename') or (video.filename if video is not None else '') or '')
+    filename = filename or f"{job_id}_keypoints.csv"
+    keypoints_path = os.path.join(get_user_upload_folder(user_id), f"{job_id}_{stage['kind']}_keypoints.csv")
+    df.to_csv(keypoints_path, index=False)
+
+    expo_push_token = form.get('expo_push_token') or form.get('push_token')
+    job = {
+        "job_id": job_id,
+        "status": "queued",
+        "created_at": now,
+        "updated_at": now,
+        "user_id": user_id,
+        "username": username,
+        "filename": filename,
+        "player_type": player_type,
+        "analysis_source": "on_device",
+        "keypoints_frames": len(df),
+    }
+    save_job(user_id, job)
+
+    # No decode or pose here, so a local thread is enough even in queue dispatch mode.
+    # Started before the archive upload, which the analysis never waits for.
+    threading.Thread(
+        target=process_keypoints_job,
+        args=(job_id, user_id, username, keypoints_path, filename, form, expo_push_token),
+        daemon=True,
+    ).start()
+
+    video_info = None
+    if video is not None and video.filename:
+        try:
+            video_info = _archive_job_video(user_id, job_id, video, username)
+        except Exception as e:
+            # Archival only: the analysis doesn't need the video.
+            logger.error(f"❌ [JOB {job_id}] Video archive failed for user {username}: {e}", exc_info=True)
+
+    logger.info(f"🧵 [JOB {job_id}] Enqueued on-device keypoints analysis ({len(df)} frames) for {username}")
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "filename": filename,
+        "status": "queued",
+        "frames": len(df),
+        "video_s3_key": video_info.get("key") if video_info else None,
+    })
+
+
+@app.route('/api/analyze/keypoints/<job_id>/video', methods=['POST'])
+@require_auth
+def api_attach_keypoints_video(job_id):
+    """Archive the video for an on-device job after the fact (multipart `video`)."""
+    user_id = request.user['user_id']
+    username = request.user['username']
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        return jsonify({'error': 'Invalid job_id'}), 400
+    video = request.files.get('video')
+    if video is None or not video.filename or not allowed_file(video.filename):
+        return jsonify({'error': 'Invalid file type. Please upload a video file.'}), 400
+
+    # Reserve the slot under the job lock so two attach calls can't both archive.
+    with job_update(user_id, job_id, create=False) as job:
+        if job is None or job.get('analysis_source') != 'on_device':
+            return jsonify({'error': 'Job not found'}), 404
+        if job.get('video_s3_key') or job.get('video_s3_status') in ('attaching', 'pending', 'uploaded'):
+            return jsonify({'error': 'A video is already attached to this job'}), 409
+        job['video_s3_status'] = 'attaching'
+    try:
+        info = _archive_job_video(user_id, job_id, video, username)
+    except Exception as e:
+        logger.error(f"❌ [JOB {job_id}] Video archive failed for user {username}: {e}", exc_info=True)
+        return jsonify({"error": "Failed to upload video to S3", "details": str(e)}), 500
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "video_s3_bucket": info.get("bucket"),
+        "video_s3_key": info.get("key"),
+        "video_s3_status": info.get("status", "uploaded"),
+    })
 
-        logger.info(f"🧵 [JOB {job_id}] Enqueued analysis for {username} file {filename}")
-        return jsonify({
-            "success": True,
-            "job_id": job_id,
-            "filename": filename,
-            "status": "queued",
-            "video_s3_bucket": s3_info.get("bucket"),
-            "video_s3_key": s3_info.get("key"),
-        })
-    
-    logger.warning("Invalid file type")
-    return jsonify({'error': 'Invalid file type. Please upload a video file.'}), 400
 
 @app.route('/api/test-upload', methods=['POST'])
 def test_upload():
@@ -4706,7 +7395,10 @@ def get_job_results(job_id):
                 logger.warning(f"⚠️ [GET_JOB_RESULTS] Job {job_id} marked completed but result is missing!")
                 return jsonify({'success': True, 'status': 'completed', 'result': None, 'error': 'Result not yet available'})
         if status == 'failed':
-            return jsonify({'success': False, 'status': 'failed', 'error': job.get('error') or 'Analysis failed'})
+            payload = {'success': False, 'status': 'failed', 'error': job.get('error') or 'Analysis failed'}
+            if job.get('error_code'):
+                payload.update({'error_code': job['error_code'], 'quality': job.get('quality')})
+            return jsonify(payload)
 
         return jsonify({'success': True, 'status': status, 'filename': job.get('filename')})
     except Exception as e:
@@ -4741,22 +7433,31 @@ def get_analysis_results_by_filename(filename):
 @app.route('/api/reports', methods=['GET'])
 def list_reports():
     """List all available reports"""
+    limit, after = _page_args(cursor_types=(str, str))
     try:
-        reports = []
-        for file in os.listdir(UPLOAD_FOLDER):
-            if file.startswith('report_') and file.endswith('.txt'):
-                file_path = os.path.join(UPLOAD_FOLDER, file)
-                file_stats = os.stat(file_path)
-                reports.append({
-                    'filename': file,
-                    'size': file_stats.st_size,
-                    'created': datetime.fromtimestamp(file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
-                    'modified': datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                })
-        
-        # Sort by creation time (newest first)
-        reports.sort(key=lambda x: x['created'], reverse=True)
-        return jsonify({'reports': reports})
+        # Adding/removing a file bumps the folder's mtime, so it versions the listing.
+        folder_stat = os.stat(UPLOAD_FOLDER)
+        modified = datetime.fromtimestamp(folder_stat.st_mtime, tz=timezone.utc)
+
+        def build():
+            reports = []
+            for file in os.listdir(UPLOAD_FOLDER):
+                if file.startswith('report_') and file.endswith('.txt'):
+                    file_path = os.path.join(UPLOAD_FOLDER, file)
+                    file_stats = os.stat(file_path)
+                    reports.append({
+                        'filename': file,
+                        'size': file_stats.st_size,
+                        'created': datetime.fromtimestamp(file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
+                        'modified': datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+                    })
+
+            # Sort by creation time (newest first)
+            reports.sort(key=lambda x: (x['created'], x['filename']), reverse=True)
+            page, next_cursor = _paginate_list(reports, lambda x: (x['created'], x['filename']), limit, after)
+            return {'reports': page, 'next_cursor': next_cursor}
+
+        return conditional_json(_list_etag('reports', folder_stat.st_mtime_ns), modified, build)
     except Exception as e:
         return jsonify({'error': f'Error listing reports: {str(e)}'}), 500
 
@@ -4782,8 +7483,10 @@ def get_report(filename):
 def download_report(filename):
     """Download a specific report file"""
     try:
-        report_path = os.path.join(UPLOAD_FOLDER, filename)
-        if os.path.exists(report_path):
+        report_path = safe_join(UPLOAD_FOLDER, filename)
+        if report_path and os.path.isfile(report_path):
+            if X_ACCEL_REDIRECT_ENABLED:
+                return _accel_redirect_response(report_path, 'application/octet-stream', download_name=filename)
             from flask import send_file
             return send_file(report_path, as_attachment=True, download_name=filename)
         else:
@@ -4791,59 +7494,159 @@ def download_report(filename):
     except Exception as e:
         return jsonify({'error': f'Error downloading report: {str(e)}'}), 500
 
+# Videos are written once per analysis, so clients may reuse them for a while and
+# then revalidate with the ETag.
+VIDEO_CACHE_MAX_AGE = int(os.getenv('VIDEO_CACHE_MAX_AGE', '3600'))
+
+# Opt-in: let nginx stream the bytes. Flask still authenticates and resolves the
+# path, then answers with X-Accel-Redirect to the `internal` location in
+# nginx_config.conf (which must alias the same uploads directory), so slow mobile
+# downloads no longer hold a Python worker. Only enable behind that nginx config.
+X_ACCEL_REDIRECT_ENABLED = os.getenv('X_ACCEL_REDIRECT_ENABLED', '0') == '1'
+X_ACCEL_REDIRECT_PREFIX = os.getenv('X_ACCEL_REDIRECT_PREFIX', '/_protected/uploads/')
+
+
+def _resolve_user_file(user_id, filename):
+    """Path of `filename` in the user's folder, else the shared upload folder, or None.
+    safe_join rejects '..' / absolute paths so one user can't reach another's files."""
+    for folder in (get_user_upload_folder(user_id), UPLOAD_FOLDER):
+        path = safe_join(folder, filename)
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+def _video_mime_type(filename):
+    lower = filename.lower()
+    if lower.endswith('.mov'):
+        return 'video/quicktime'
+    if lower.endswith('.avi'):
+        return 'video/x-msvideo'
+    return 'video/mp4'
+
+
+def _accel_redirect_response(path, mimetype, download_name=None, max_age=None):
+    """Empty response telling nginx to serve `path` itself (sendfile, Range, ETag).
+    Falls back to send_file for anything outside UPLOAD_FOLDER, which nginx can't map."""
+    from flask import send_file
+    root = os.path.abspath(UPLOAD_FOLDER)
+    full = os.path.abspath(path)
+    if os.path.commonpath([root, full]) != root:
+        logger.warning(f"X-Accel-Redirect skipped, {path} is outside {UPLOAD_FOLDER}")
+        return send_file(path, mimetype=mimetype, as_attachment=bool(download_name),
+                         download_name=download_name, conditional=True, max_age=max_age)
+    rel = os.path.relpath(full, root).replace(os.sep, '/')
+    resp = app.response_class(status=200, mimetype=mimetype)
+    resp.headers['X-Accel-Redirect'] = X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(rel)
+    if download_name:
+        resp.headers['Content-Disposition'] = f'attachment; filename="{secure_filename(download_name) or "download"}"'
+    if max_age is not None:
+        resp.cache_control.max_age = max_age
+        resp.cache_control.private = True
+    # Flask must not add its own body length; nginx sets it from the file.
+    resp.headers.pop('Content-Length', None)
+    return resp
+
+
+def _send_cached_file(path, mimetype):
+    """send_file with Range/206, ETag and Last-Modified, so players can seek and
+    revalidate instead of re-downloading."""
+    from flask import send_file
+    if X_ACCEL_REDIRECT_ENABLED:
+        return _accel_redirect_response(path, mimetype, max_age=VIDEO_CACHE_MAX_AGE)
+    resp = send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=VIDEO_CACHE_MAX_AGE)
+    resp.headers['Accept-Ranges'] = 'bytes'
+    resp.cache_control.private = True
+    resp.cache_control.public = False
+    return resp
+
+
 @app.route('/api/video/<path:filename>', methods=['GET'])
 @require_auth
 def serve_video(filename):
-    """Serve video files (annotated or original)"""
+    """Serve video files (annotated or original), with byte-range support."""
     try:
         user_id = request.user['user_id']
-        
-        # Try user folder first
-        user_folder = get_user_upload_folder(user_id)
-        video_path = os.path.join(user_folder, filename)
-        
-        if not os.path.exists(video_path):
-            # Try general upload folder
-            video_path = os.path.join(UPLOAD_FOLDER, filename)
-        
-        if os.path.exists(video_path):
-            from flask import send_file
-            # Determine MIME type
-            mime_type = 'video/mp4'
-            if filename.lower().endswith('.mov'):
-                mime_type = 'video/quicktime'
-            elif filename.lower().endswith('.avi'):
-                mime_type = 'video/x-msvideo'
-            
-            return send_file(video_path, mimetype=mime_type)
-        else:
+        video_path = _resolve_user_file(user_id, filename)
+        if not video_path:
             return jsonify({'error': 'Video not found'}), 404
+        return _send_cached_file(video_path, _video_mime_type(filename))
     except Exception as e:
         logger.error(f"Error serving video: {str(e)}", exc_info=True)
         return jsonify({'error': f'Error serving video: {str(e)}'}), 500
 
+
+@app.route('/api/poster/<path:filename>', methods=['GET'])
+@require_auth
+def serve_video_poster(filename):
+    """JPEG poster frame for a video (history thumbnails); generated once and cached."""
+    try:
+        user_id = request.user['user_id']
+        video_path = _resolve_user_file(user_id, filename)
+        if not video_path:
+            return jsonify({'error': 'Video not found'}), 404
+        poster_path = ensure_video_poster(video_path)
+        if not poster_path:
+            return jsonify({'error': 'Could not extract a poster frame'}), 422
+        return _send_cached_file(poster_path, 'image/jpeg')
+    except Exception as e:
+        logger.error(f"Error serving poster: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Error serving poster: {str(e)}'}), 500
+
+
+@app.route('/api/hls/<path:filename>/<asset>', methods=['GET'])
+@require_auth
+def serve_video_hls(filename, asset):
+    """HLS playlist and segments for an annotated video (see package_video_hls).
+    The playlist names segments relatively, so players request them from this same
+    route with the same Authorization header."""
+    try:
+        if asset == HLS_PLAYLIST_NAME:
+            mimetype = 'application/vnd.apple.mpegurl'
+        elif _HLS_SEGMENT_RE.match(asset):
+            mimetype = 'video/mp2t'
+        else:
+            return jsonify({'error': 'Not found'}), 404
+        user_id = request.user['user_id']
+        hls_name = os.path.basename(_hls_dir(filename))
+        path = _resolve_user_file(user_id, f"{os.path.dirname(filename)}/{hls_name}/{asset}".lstrip('/'))
+        if not path:
+            return jsonify({'error': 'HLS stream not found'}), 404
+        return _send_cached_file(path, mimetype)
+    except Exception as e:
+        logger.error(f"Error serving HLS asset: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Error serving HLS asset: {str(e)}'}), 500
+
 @app.route('/api/files', methods=['GET'])
 def list_files():
     """List all files in the upload folder"""
+    limit, after = _page_args(cursor_types=(str, str))
     try:
-        files = []
-        for file in os.listdir(UPLOAD_FOLDER):
-            file_path = os.path.join(UPLOAD_FOLDER, file)
-            file_stats = os.stat(file_path)
-            files.append({
-                'filename': file,
-                'size': file_stats.st_size,
-                'type': 'video' if file.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')) else 
-                       'report' if file.startswith('report_') else
-                       'results' if file.startswith('results_') else
-                       'data' if file.endswith('.csv') else 'other',
-                'created': datetime.fromtimestamp(file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
-                'modified': datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-            })
-        
-        # Sort by creation time (newest first)
-        files.sort(key=lambda x: x['created'], reverse=True)
-        return jsonify({'files': files})
+        folder_stat = os.stat(UPLOAD_FOLDER)
+        modified = datetime.fromtimestamp(folder_stat.st_mtime, tz=timezone.utc)
+
+        def build():
+            files = []
+            for file in os.listdir(UPLOAD_FOLDER):
+                file_path = os.path.join(UPLOAD_FOLDER, file)
+                file_stats = os.stat(file_path)
+                files.append({
+                    'filename': file,
+                    'size': file_stats.st_size,
+                    'type': 'video' if file.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')) else
+                           'report' if file.startswith('report_') else
+                           'results' if file.startswith('results_') else
+                           'data' if file.endswith('.csv') else 'other',
+                    'created': datetime.fromtimestamp(file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
+                    'modified': datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+                })
+
+            # Sort by creation time (newest first)
+            files.sort(key=lambda x: (x['created'], x['filename']), reverse=True)
+            page, next_cursor = _paginate_list(files, lambda x: (x['created'], x['filename']), limit, after)
+            return {'files': page, 'next_cursor': next_cursor}
+
+        return conditional_json(_list_etag('files', folder_stat.st_mtime_ns), modified, build)
     except Exception as e:
         return jsonify({'error': f'Error listing files: {str(e)}'}), 500
 
@@ -4985,61 +7788,377 @@ def razorpay_verify_payment():
         return jsonify({"error": str(e)}), 500
 
 
+# ==================== LIST PAGINATION / CONDITIONAL GET ====================
+# List endpoints page with an opaque keyset cursor (?limit=N&cursor=...) rather
+# than OFFSET, and carry ETag/Last-Modified validators derived from a per-user
+# version counter (user_versions, bumped by triggers on every write). A request
+# whose If-None-Match still matches gets a 304 before any rows are read.
+LIST_PAGE_DEFAULT_LIMIT = 50
+LIST_PAGE_MAX_LIMIT = 200
+
+
+def get_user_version(user_id, scope):
+    """(version, last_modified UTC datetime or None) of one user's data scope."""
+    conn = get_db_connection()
+    row = conn.execute('SELECT version, updated_at FROM user_versions WHERE user_id = ? AND scope = ?',
+                       (user_id, scope)).fetchone()
+    conn.close()
+    if not row:
+        return 0, None
+    try:
+        modified = datetime.strptime(row['updated_at'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        modified = None
+    return row['version'], modified
+
+
+def _list_etag(*parts):
+    """ETag over the request path + query string and the given version parts."""
+    blob = json.dumps([request.path, sorted(request.args.items(multi=True))] + list(parts), default=str)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+
+def conditional_json(etag, last_modified, build):
+    """304 if If-None-Match matches `etag` (build() is never called); otherwise
+    jsonify(build()). Both carry the ETag and Last-Modified validators."""
+    if request.if_none_match.contains_weak(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify(build())
+    resp.set_etag(etag, weak=True)
+    if last_modified:
+        resp.last_modified = last_modified
+    # Always revalidate; the ETag makes that a cheap 304.
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
+def _encode_page_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip('=')
+
+
+def _decode_page_cursor(cursor):
+    values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    if not isinstance(values, list):
+        raise ValueError('malformed cursor')
+    return values
+
+
+def _page_args(default_limit=None, max_limit=LIST_PAGE_MAX_LIMIT, cursor_types=(str, int)):
+    """(limit, after) from ?limit=N&cursor=...; cursor_types is the type of each
+    sort key in the list's cursor. Bad input raises BadRequest with a JSON body,
+    so call it outside the handler's catch-all try.
+    limit is None (unpaged) when neither is given and there's no default."""
+    raw_limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    try:
+        if raw_limit:
+            limit = max(1, min(int(raw_limit), max_limit))
+        elif cursor or default_limit:
+            limit = default_limit or LIST_PAGE_DEFAULT_LIMIT
+        else:
+            limit = None
+        # binascii.Error and UnicodeDecodeError are ValueErrors too.
+        after = _decode_page_cursor(cursor) if cursor else None
+        if after is not None and (
+            len(after) != len(cursor_types)
+            or any(isinstance(v, bool) or not isinstance(v, t) for v, t in zip(after, cursor_types))
+        ):
+            raise ValueError('cursor does not match this list')
+    except ValueError:
+        resp = jsonify({'error': 'limit must be an integer and cursor valid'})
+        resp.status_code = 400
+        raise BadRequest(response=resp)
+    return limit, after
+
+
+def _keyset_where(cols, after, descending):
+    """Row-value predicate selecting rows strictly after the cursor in sort order."""
+    op = '<' if descending else '>'
+    return f"({', '.join(cols)}) {op} ({', '.join('?' * len(cols))})", list(after)
+
+
+def _keyset_page(cur, sql_select, where, params, cols, descending, limit, after):
+    """Run SELECT ... WHERE ... ORDER BY cols with keyset paging.
+    Returns (rows, next_cursor); next_cursor is None on the last page."""
+    where = list(where)
+    params = list(params)
+    if after is not None:
+        if len(after) != len(cols):
+            raise ValueError('cursor does not match this list')
+        clause, extra = _keyset_where(cols, after, descending)
+        where.append(clause)
+        params.extend(extra)
+    direction = 'DESC' if descending else 'ASC'
+    sql = f"{sql_select} WHERE {' AND '.join(where)} ORDER BY {', '.join(f'{c} {direction}' for c in cols)}"
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit + 1)
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_page_cursor([rows[-1][c] for c in cols])
+    return rows, next_cursor
+
+
+def _paginate_list(items, key, limit, after):
+    """Keyset paging for an in-memory list already sorted newest-first by key(item)."""
+    if after is not None:
+        after = tuple(after)
+        items = [it for it in items if key(it) < after]
+    if limit is None or len(items) <= limit:
+        return items, None
+    page = items[:limit]
+    return page, _encode_page_cursor(key(page[-1]))
+
+
+# ==================== ANALYSIS RESULTS INDEX ====================
+# One analysis_results row per results_<filename>.json. Written when a job
+# completes (and backfilled once from disk), then read by history, the weekly
+# shot report and training-plan lookup instead of scanning the user folder.
+# created_at is server-local time, matching the file ctime history used to show.
+
+HISTORY_MAX_LIMIT = 200
+
+
+def _compact_flaws(feedback):
+    """The slice of each flaw the shot report and technique score need."""
+    flaws = feedback.get('flaws', []) if isinstance(feedback, dict) else []
+    return [{
+        'feature': _flaw_feature_label(fl),
+        'observed': fl.get('observed'),
+        'ideal_range': fl.get('ideal_range'),
+        'issue': fl.get('issue'),
+    } for fl in flaws if isinstance(fl, dict)]
+
+
+def _upsert_analysis_result(conn, user_id, filename, results, results_path, created_at=None):
+    fb = results.get('gpt_feedback')
+    flaws = _compact_flaws(fb)
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        results_size = os.path.getsize(results_path) if results_path else None
+    except OSError:
+        results_size = None
+    conn.execute(
+        '''INSERT INTO analysis_results
+             (user_id, filename, job_id, player_type, shot_type, bowler_type, keeping_type,
+              batter_side, bowler_side, success, has_gpt_feedback, technique_score, flaws_json,
+              report_path, results_path, results_size, created_at, updated_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(user_id, filename) DO UPDATE SET
+             job_id=excluded.job_id,
+             player_type=excluded.player_type,
+             shot_type=excluded.shot_type,
+             bowler_type=excluded.bowler_type,
+             keeping_type=excluded.keeping_type,
+             batter_side=excluded.batter_side,
+             bowler_side=excluded.bowler_side,
+             success=excluded.success,
+             has_gpt_feedback=excluded.has_gpt_feedback,
+             technique_score=excluded.technique_score,
+             flaws_json=excluded.flaws_json,
+             report_path=excluded.report_path,
+             results_path=excluded.results_path,
+             results_size=excluded.results_size,
+             created_at=excluded.created_at,
+             updated_at=excluded.updated_at''',
+        (user_id, filename, results.get('job_id'), results.get('player_type', 'unknown'),
+         results.get('shot_type'), results.get('bowler_type'), results.get('keeping_type'),
+         results.get('batter_side'), results.get('bowler_side'),
+         1 if results.get('success', True) else 0,
+         1 if fb is not None else 0,
+         _video_technique_score(flaws), json.dumps(flaws, default=str),
+         results.get('report_path'), results_path, results_size,
+         created_at or now, now),
+    )
+
+
+def index_analysis_result(user_id, filename, results, results_path):
+    """Record a completed analysis in analysis_results (called by the job worker)."""
+    try:
+        conn = get_db_connection()
+        _upsert_analysis_result(conn, user_id, filename, results, results_path)
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        logger.warning(f"Failed to index analysis result {filename} for user {user_id}: {e}")
+
+
+def backfill_analysis_results():
+    """Index results files written before analysis_results existed. Only walks
+    the upload folders while the table is empty, so later starts cost one query."""
+    conn = get_db_connection()
+    try:
+        if conn.execute('SELECT 1 FROM analysis_results LIMIT 1').fetchone():
+            return 0
+        indexed = 0
+        if not os.path.isdir(UPLOAD_FOLDER):
+            return 0
+        for entry in os.listdir(UPLOAD_FOLDER):
+            user_folder = os.path.join(UPLOAD_FOLDER, entry)
+            if not (entry.isdigit() and os.path.isdir(user_folder)):
+                continue
+            user_id = int(entry)
+            for fname in os.listdir(user_folder):
+                if not (fname.startswith('results_') and fname.endswith('.json')):
+                    continue
+                fpath = os.path.join(user_folder, fname)
+                try:
+                    with open(fpath, 'r', encoding='utf-8') as f:
+                        res = json.load(f)
+                except Exception:
+                    continue
+                if res.get('user_id') != user_id:
+                    continue
+                created = datetime.fromtimestamp(os.stat(fpath).st_ctime).strftime('%Y-%m-%d %H:%M:%S')
+                filename = fname[len('results_'):-len('.json')]
+                _upsert_analysis_result(conn, user_id, filename, res, fpath, created_at=created)
+                indexed += 1
+        conn.commit()
+        if indexed:
+            logger.info(f"Backfilled {indexed} analysis results into analysis_results")
+        return indexed
+    except Exception as e:
+        logger.warning(f"Analysis results backfill skipped: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def query_analysis_results(user_id, player_type=None, skill=None, date_from=None, date_to=None,
+                           limit=None, offset=0, oldest_first=False, after=None):
+    """Indexed lookup of a user's analyses. date_from/date_to are inclusive
+    'YYYY-MM-DD' bounds on created_at; skill matches the shot, bowler or keeping type.
+    after=(created_at, id) continues a keyset page after that row."""
+    where = ['user_id = ?']
+    params = [user_id]
+    if player_type:
+        where.append('player_type = ?')
+        params.append(player_type)
+    if skill:
+        where.append('? IN (shot_type, bowler_type, keeping_type)')
+        params.append(skill)
+    if date_from:
+        where.append('created_at >= ?')
+        params.append(date_from)
+    if date_to:
+        # Upper bound as "< next day" so the created_at index stays usable.
+        next_day = datetime.strptime(date_to, '%Y-%m-%d').date() + timedelta(days=1)
+        where.append('created_at < ?')
+        params.append(next_day.strftime('%Y-%m-%d'))
+    if after is not None:
+        clause, extra = _keyset_where(('created_at', 'id'), after, descending=not oldest_first)
+        where.append(clause)
+        params.extend(extra)
+    sql = (f"SELECT * FROM analysis_results WHERE {' AND '.join(where)} "
+           f"ORDER BY created_at {'ASC' if oldest_first else 'DESC'}, id {'ASC' if oldest_first else 'DESC'}")
+    if limit is not None:
+        sql += ' LIMIT ? OFFSET ?'
+        params.extend([int(limit), int(offset or 0)])
+    conn = get_db_connection()
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return rows
+
+
+def count_analysis_results(user_id, player_type=None, skill=None):
+    where = ['user_id = ?']
+    params = [user_id]
+    if player_type:
+        where.append('player_type = ?')
+        params.append(player_type)
+    if skill:
+        where.append('? IN (shot_type, bowler_type, keeping_type)')
+        params.append(skill)
+    conn = get_db_connection()
+    n = conn.execute(f"SELECT COUNT(*) FROM analysis_results WHERE {' AND '.join(where)}", params).fetchone()[0]
+    conn.close()
+    return n
+
+
+def get_analysis_result_row(user_id, filename):
+    conn = get_db_connection()
+    row = conn.execute(
+        'SELECT * FROM analysis_results WHERE user_id = ? AND filename = ?', (user_id, filename)
+    ).fetchone()
+    conn.close()
+    return row
+
+
+def delete_analysis_results(user_id, filenames=None):
+    """Drop index rows for a user (all of them, or just the given filenames)."""
+    conn = get_db_connection()
+    if filenames is None:
+        conn.execute('DELETE FROM analysis_results WHERE user_id = ?', (user_id,))
+    else:
+        conn.executemany('DELETE FROM analysis_results WHERE user_id = ? AND filename = ?',
+                         [(user_id, f) for f in filenames])
+    conn.commit()
+    conn.close()
+
+
+def _history_item_from_row(r):
+    return {
+        'id': f"results_{r['filename']}.json",
+        'filename': r['filename'],
+        'player_type': r['player_type'] or 'unknown',
+        'shot_type': r['shot_type'],
+        'bowler_type': r['bowler_type'],
+        'batter_side': r['batter_side'],
+        'bowler_side': r['bowler_side'],
+        'created': r['created_at'],
+        'modified': r['updated_at'],
+        'size': r['results_size'],
+        'success': bool(r['success']),
+        'has_gpt_feedback': bool(r['has_gpt_feedback']),
+    }
+
+
 @app.route('/api/history', methods=['GET'])
 @require_auth
 def get_analysis_history():
-    """Get all analysis history with results for the authenticated user"""
+    """Analysis history for the authenticated user, newest first.
+
+    Optional filters: ?player_type=batsman|bowler|keeper and ?shot_type=<shot,
+    bowler or keeping type>. Optional paging: ?limit=N&cursor=<next_cursor> (keyset)
+    or ?limit=N&offset=M; no limit returns the full list, as older clients expect.
+    Responses carry an ETag; a matching If-None-Match gets 304.
+    """
+    limit, after = _page_args(max_limit=HISTORY_MAX_LIMIT)
     try:
-        # Get user info from authentication
         user_id = request.user['user_id']
         username = request.user['username']
-        print(f"Getting history for user: {username} (ID: {user_id})")
-        
-        # Get user's upload folder
-        user_folder = get_user_upload_folder(user_id)
-        
-        history = []
-        if os.path.exists(user_folder):
-            for file in os.listdir(user_folder):
-                if file.startswith('results_') and file.endswith('.json'):
-                    file_path = os.path.join(user_folder, file)
-                    file_stats = os.stat(file_path)
-                    
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            result_data = json.load(f)
-                        
-                        # Only include results for the authenticated user
-                        result_user_id = result_data.get('user_id')
-                        if result_user_id != user_id:
-                            continue
-                        
-                        # Extract filename from results_ prefix
-                        original_filename = file.replace('results_', '').replace('.json', '')
-                        
-                        history_item = {
-                            'id': file,
-                            'filename': original_filename,
-                            'player_type': result_data.get('player_type', 'unknown'),
-                            'shot_type': result_data.get('shot_type'),
-                            'bowler_type': result_data.get('bowler_type'),
-                            'batter_side': result_data.get('batter_side'),
-                            'bowler_side': result_data.get('bowler_side'),
-                            'created': datetime.fromtimestamp(file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
-                            'modified': datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                            'size': file_stats.st_size,
-                            'success': result_data.get('success', True),
-                            'has_gpt_feedback': 'gpt_feedback' in result_data and result_data['gpt_feedback'] is not None
-                        }
-                        history.append(history_item)
-                    except Exception as e:
-                        logging.warning(f"Failed to parse {file}: {e}")
-                        continue
-        
-        # Sort by creation time (newest first)
-        history.sort(key=lambda x: x['created'], reverse=True)
-        print(f"Found {len(history)} analysis results for user {username}")
-        return jsonify({'history': history})
+        player_type = request.args.get('player_type') or None
+        skill = request.args.get('shot_type') or None
+        try:
+            offset = max(0, int(request.args.get('offset', 0)))
+        except ValueError:
+            return jsonify({'error': 'offset must be an integer'}), 400
+
+        version, modified = get_user_version(user_id, 'history')
+
+        def build():
+            rows = query_analysis_results(user_id, player_type=player_type, skill=skill,
+                                          limit=(limit + 1) if limit is not None else None,
+                                          offset=0 if after is not None else offset, after=after)
+            has_more = limit is not None and len(rows) > limit
+            rows = rows[:limit] if limit is not None else rows
+            history = [_history_item_from_row(r) for r in rows]
+            payload = {'history': history}
+            if limit is not None:
+                payload.update({'limit': limit, 'has_more': has_more,
+                                'next_cursor': _encode_page_cursor([rows[-1]['created_at'], rows[-1]['id']])
+                                if has_more else None})
+                if after is None:
+                    total = count_analysis_results(user_id, player_type=player_type, skill=skill)
+                    payload.update({'total': total, 'offset': offset})
+            print(f"Found {len(history)} analysis results for user {username}")
+            return payload
+
+        return conditional_json(_list_etag('history', user_id, version), modified, build)
     except Exception as e:
         logging.exception("Failed to get analysis history")
         return jsonify({'error': f'Error retrieving history: {str(e)}'}), 500
@@ -5054,6 +8173,9 @@ ACWR_ACUTE_DAYS = 7
 ACWR_CHRONIC_DAYS = 28
 ACWR_LOW = 0.8
 ACWR_HIGH = 1.3
+# /api/monitor/workload/acwr-series range: default ~6 months, hard cap 2 years.
+ACWR_SERIES_DEFAULT_DAYS = 182
+ACWR_SERIES_MAX_DAYS = 730
 
 
 def _today_str():
@@ -5120,11 +8242,101 @@ def _injury_to_dict(r):
     }
 
 
-def _compute_workload_summary(rows):
+# Adds one session (user_id, date, load, balls) to that day's workload_daily row.
+_WORKLOAD_DAILY_UPSERT_SQL = '''INSERT INTO workload_daily (user_id, date, total_load, session_count, balls_bowled)
+    VALUES (?, ?, ?, 1, ?)
+    ON CONFLICT(user_id, date) DO UPDATE SET
+      total_load = total_load + excluded.total_load,
+      session_count = session_count + 1,
+      balls_bowled = balls_bowled + excluded.balls_bowled,
+      updated_at = CURRENT_TIMESTAMP'''
+
+
+def _bump_workload_daily(cur, user_id, date, load, balls_bowled):
+    """Add one session to the user's workload_daily row for `date`."""
+    cur.execute(_WORKLOAD_DAILY_UPSERT_SQL, (user_id, date, float(load or 0), int(balls_bowled or 0)))
+
+
+def _acwr_flag(acwr, chronic):
+    if chronic <= 0 or acwr < ACWR_LOW:
+        return 'low'
+    if acwr > ACWR_HIGH:
+        return 'high'
+    return 'optimal'
+
+
+def _compute_acwr_series(user_id, start, end):
+    """Rolling ACWR for every day in [start, end] from workload_daily.
+
+    Rolling-average ACWR uses the same convention as _compute_workload_summary
+    (7-day sum vs 28-day sum / 4), computed for all days at once from a cumulative
+    sum. EWMA ACWR uses decay 2/(N+1) for N=7 and N=28 and is seeded from the
+    athlete's first logged day, so values don't depend on the requested range."""
+    window_start = start - timedelta(days=ACWR_CHRONIC_DAYS - 1)
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT MIN(date) AS first_day FROM workload_daily WHERE user_id = ?', (user_id,))
+    first = cur.fetchone()['first_day']
+    first_day = datetime.strptime(first, '%Y-%m-%d').date() if first else None
+    # The EWMA needs history back to the first logged day; rolling sums only need 28 days.
+    load_from = min(window_start, first_day) if first_day else window_start
+    cur.execute(
+        'SELECT date, total_load FROM workload_daily WHERE user_id = ? AND date >= ? AND date <= ?',
+        (user_id, load_from.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')),
+    )
+    rows = cur.fetchall()
+    conn.close()
+
+    n = (end - load_from).days + 1
+    loads = np.zeros(n, dtype=float)
+    for r in rows:
+        try:
+            idx = (datetime.strptime(r['date'], '%Y-%m-%d').date() - load_from).days
+        except Exception:
+            continue
+        if 0 <= idx < n:
+            loads[idx] += float(r['total_load'] or 0)
+
+    # Trailing window sums: csum[i+1] - csum[i+1-w] (days before load_from count as 0).
+    csum = np.concatenate(([0.0], np.cumsum(loads)))
+    idx = np.arange(1, n + 1)
+    acute = csum[idx] - csum[np.maximum(idx - ACWR_ACUTE_DAYS, 0)]
+    chronic = (csum[idx] - csum[np.maximum(idx - ACWR_CHRONIC_DAYS, 0)]) / (ACWR_CHRONIC_DAYS / ACWR_ACUTE_DAYS)
+    acwr = np.divide(acute, chronic, out=np.zeros(n), where=chronic > 0)
+
+    series = pd.Series(loads)
+    ewma_acute = series.ewm(alpha=2.0 / (ACWR_ACUTE_DAYS + 1), adjust=False).mean().to_numpy()
+    ewma_chronic = series.ewm(alpha=2.0 / (ACWR_CHRONIC_DAYS + 1), adjust=False).mean().to_numpy()
+    ewma_acwr = np.divide(ewma_acute, ewma_chronic, out=np.zeros(n), where=ewma_chronic > 0)
+
+    offset = (start - load_from).days
+    points = []
+    for i in range(offset, n):
+        points.append({
+            'date': (load_from + timedelta(days=i)).strftime('%Y-%m-%d'),
+            'load': round(float(loads[i])),
+            'acute_load': round(float(acute[i])),
+            'chronic_load': round(float(chronic[i])),
+            'acwr': round(float(acwr[i]), 2),
+            'flag': _acwr_flag(acwr[i], chronic[i]),
+            'ewma_acwr': round(float(ewma_acwr[i]), 2),
+            'ewma_flag': _acwr_flag(ewma_acwr[i], ewma_chronic[i]),
+        })
+    return {
+        'from': start.strftime('%Y-%m-%d'),
+        'to': end.strftime('%Y-%m-%d'),
+        'acute_days': ACWR_ACUTE_DAYS,
+        'chronic_days': ACWR_CHRONIC_DAYS,
+        'series': points,
+    }
+
+
+def _compute_workload_summary(rows, as_of=None):
     """Compute ACWR from workload rows. Mirrors src/utils/workload.ts so the
     client and server agree. Chronic load is the 28-day total expressed as a
-    weekly average (÷4) for direct comparison with the 7-day acute load."""
-    today = datetime.now().date()
+    weekly average (÷4) for direct comparison with the 7-day acute load.
+    Windows end on as_of (a date; default today)."""
+    today = as_of or datetime.now().date()
     acute = 0.0
     chronic_total = 0.0
     weekly_balls = 0
@@ -5143,12 +8355,7 @@ def _compute_workload_summary(rows):
             weekly_balls += int(r['balls_bowled'] or 0)
     chronic = chronic_total / (ACWR_CHRONIC_DAYS / ACWR_ACUTE_DAYS)
     acwr = (acute / chronic) if chronic > 0 else 0.0
-    if chronic <= 0 or acwr < ACWR_LOW:
-        flag = 'low'
-    elif acwr > ACWR_HIGH:
-        flag = 'high'
-    else:
-        flag = 'optimal'
+    flag = _acwr_flag(acwr, chronic)
     return {
         'acute_load': round(acute),
         'chronic_load': round(chronic),
@@ -5164,6 +8371,23 @@ def _compute_workload_summary(rows):
 WEEKLY_REPORT_MODEL = "gemini-2.5-pro"
 
 
+def _truthy_flag(value):
+    """Interpret a JSON bool or query-string flag ('1', 'true', 'yes')."""
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes')
+
+
+def _report_input_hash(username, data):
+    """Stable fingerprint of everything a weekly/shot report prompt is built from.
+    week_end is left out: it defaults to "today", so it moves daily mid-week even
+    when no new data has arrived."""
+    payload = {k: v for k, v in data.items() if k != 'week_end'}
+    blob = json.dumps({'model': WEEKLY_REPORT_MODEL, 'username': username, 'data': payload},
+                      sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
 def _weekly_report_to_dict(r):
     return {
         'id': str(r['id']),
@@ -5195,13 +8419,15 @@ def _gather_weekly_monitoring_data(user_id, week_start, week_end):
     )
     workload = [_workload_to_dict(r) for r in cur.fetchall()]
 
-    chronic_cutoff = (datetime.strptime(week_end, '%Y-%m-%d').date()
-                      - timedelta(days=ACWR_CHRONIC_DAYS)).strftime('%Y-%m-%d')
+    week_end_date = datetime.strptime(week_end, '%Y-%m-%d').date()
+    chronic_cutoff = (week_end_date - timedelta(days=ACWR_CHRONIC_DAYS)).strftime('%Y-%m-%d')
     cur.execute(
         'SELECT date, type, duration_min, rpe, balls_bowled, load FROM workload_sessions WHERE user_id = ? AND date >= ?',
         (user_id, chronic_cutoff),
     )
-    workload_summary = _compute_workload_summary(cur.fetchall())
+    # Measured from week_end, not the wall clock, so the report input (and its hash) is
+    # the same whenever the same week is gathered.
+    workload_summary = _compute_workload_summary(cur.fetchall(), as_of=week_end_date)
 
     cur.execute(
         "SELECT * FROM injuries WHERE user_id = ? AND (status IS NULL OR status != 'fit') ORDER BY date_reported DESC",
@@ -5294,9 +8520,11 @@ STRICT RULES:
 """
 
 
-def generate_weekly_report_for_user(user_id, week_start=None, week_end=None):
+def generate_weekly_report_for_user(user_id, week_start=None, week_end=None, force=False):
     """Generate (and upsert) the weekly monitoring report for one user. Defaults to the
-    trailing 7 days ending today. Returns the report dict, or None if there's no activity."""
+    trailing 7 days ending today. Returns the report dict, or None if there's no activity.
+    If the stored report for the week was built from identical input it is returned
+    as-is (with 'cached': True) instead of calling Gemini again, unless force=True."""
     end = (datetime.strptime(week_end, '%Y-%m-%d').date() if week_end else datetime.now().date())
     if week_start:
         start = datetime.strptime(week_start, '%Y-%m-%d').date()
@@ -5315,8 +8543,14 @@ def generate_weekly_report_for_user(user_id, week_start=None, week_end=None):
     cur = conn.cursor()
     cur.execute('SELECT username FROM users WHERE id = ?', (user_id,))
     urow = cur.fetchone()
-    conn.close()
     username = (urow['username'] if urow else None) or 'Athlete'
+    input_hash = _report_input_hash(username, data)
+    cur.execute('SELECT * FROM weekly_reports WHERE user_id = ? AND week_start = ?', (user_id, ws))
+    stored = cur.fetchone()
+    conn.close()
+    if stored and not force and stored['input_hash'] == input_hash:
+        logger.info(f"Weekly report unchanged for user {user_id} ({ws}..{we}), reusing stored report")
+        return dict(_weekly_report_to_dict(stored), cached=True)
 
     prompt = _build_weekly_report_prompt(username, data)
     resp = gemini.generate_content(
@@ -5338,15 +8572,16 @@ def generate_weekly_report_for_user(user_id, week_start=None, week_end=None):
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute(
-        '''INSERT INTO weekly_reports (user_id, week_start, week_end, report_md, model, total_tokens)
-           VALUES (?, ?, ?, ?, ?, ?)
+        '''INSERT INTO weekly_reports (user_id, week_start, week_end, report_md, model, total_tokens, input_hash)
+           VALUES (?, ?, ?, ?, ?, ?, ?)
            ON CONFLICT(user_id, week_start) DO UPDATE SET
              week_end=excluded.week_end,
              report_md=excluded.report_md,
              model=excluded.model,
              total_tokens=excluded.total_tokens,
+             input_hash=excluded.input_hash,
              generated_at=CURRENT_TIMESTAMP''',
-        (user_id, ws, we, report_md, WEEKLY_REPORT_MODEL, total_tokens),
+        (user_id, ws, we, report_md, WEEKLY_REPORT_MODEL, total_tokens, input_hash),
     )
     conn.commit()
     cur.execute('SELECT * FROM weekly_reports WHERE user_id = ? AND week_start = ?', (user_id, ws))
@@ -5358,7 +8593,31 @@ def generate_weekly_report_for_user(user_id, week_start=None, week_end=None):
 
 # ==================== ANALYSIS STREAK ====================
 # A "streak" counts consecutive calendar days on which the user analyzed at least
-# one video. Derived from analysis_log.analyzed_at (no extra table needed).
+# one video. Kept per user in user_streaks and advanced in O(1) by
+# log_video_analysis(), so reading it never scans analysis_log.
+
+def _bump_user_streak(cur, user_id, day):
+    """Record activity on `day` ('YYYY-MM-DD') for the user's streak row in one
+    atomic upsert: same day is a no-op, the next day extends the run, a gap resets it."""
+    cur.execute(
+        '''INSERT INTO user_streaks (user_id, current_streak, longest_streak, last_active_date, total_active_days)
+           VALUES (?, 1, 1, ?, 1)
+           ON CONFLICT(user_id) DO UPDATE SET
+             current_streak = CASE
+                 WHEN last_active_date >= excluded.last_active_date THEN current_streak
+                 WHEN last_active_date = date(excluded.last_active_date, '-1 day') THEN current_streak + 1
+                 ELSE 1 END,
+             longest_streak = MAX(longest_streak, CASE
+                 WHEN last_active_date >= excluded.last_active_date THEN current_streak
+                 WHEN last_active_date = date(excluded.last_active_date, '-1 day') THEN current_streak + 1
+                 ELSE 1 END),
+             total_active_days = total_active_days
+                 + CASE WHEN last_active_date >= excluded.last_active_date THEN 0 ELSE 1 END,
+             last_active_date = MAX(COALESCE(last_active_date, ''), excluded.last_active_date),
+             updated_at = CURRENT_TIMESTAMP''',
+        (user_id, day),
+    )
+
 
 def _user_analysis_days(user_id):
     """Set of 'YYYY-MM-DD' dates on which the user analyzed >=1 video."""
@@ -5373,41 +8632,76 @@ def _user_analysis_days(user_id):
     return days
 
 
+def _streak_from_days(days):
+    """(run ending on the last active day, longest run, last day, total days) from a set of dates."""
+    if not days:
+        return 0, 0, None, 0
+    sorted_days = sorted(datetime.strptime(x, '%Y-%m-%d').date() for x in days)
+    run = 1
+    longest = 1
+    for i in range(1, len(sorted_days)):
+        if (sorted_days[i] - sorted_days[i - 1]).days == 1:
+            run += 1
+        else:
+            run = 1
+        longest = max(longest, run)
+    return run, longest, sorted_days[-1].strftime('%Y-%m-%d'), len(sorted_days)
+
+
+def backfill_user_streaks():
+    """Seed user_streaks from analysis_log history. Only runs while the table is
+    empty, so later starts cost one query."""
+    conn = get_db_connection()
+    try:
+        if conn.execute('SELECT 1 FROM user_streaks LIMIT 1').fetchone():
+            return 0
+        user_ids = [r['user_id'] for r in conn.execute(
+            'SELECT DISTINCT user_id FROM analysis_log WHERE user_id IS NOT NULL').fetchall()]
+        rows = []
+        for uid in user_ids:
+            current, longest, last, total = _streak_from_days(_user_analysis_days(uid))
+            if last:
+                rows.append((uid, current, longest, last, total))
+        conn.executemany(
+            '''INSERT OR IGNORE INTO user_streaks
+                   (user_id, current_streak, longest_streak, last_active_date, total_active_days)
+               SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM users WHERE id = ?)''',
+            [r + (r[0],) for r in rows],
+        )
+        conn.commit()
+        if rows:
+            logger.info(f"Backfilled analysis streaks for {len(rows)} user(s)")
+        return len(rows)
+    except Exception as e:
+        logger.warning(f"Streak backfill skipped: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
 def compute_streak(user_id):
     """Current/longest consecutive-day analysis streak for a user.
     Returns a dict the frontend can render directly."""
-    days = _user_analysis_days(user_id)
-    today = datetime.now().date()
-
-    # Current streak: walk back from today (or yesterday, so a not-yet-active
-    # today doesn't break a streak the user can still continue).
-    current = 0
-    if days:
-        anchor = today if today.strftime('%Y-%m-%d') in days else today - timedelta(days=1)
-        d = anchor
-        while d.strftime('%Y-%m-%d') in days:
-            current += 1
-            d -= timedelta(days=1)
-
-    # Longest streak across all history.
-    longest = 0
-    if days:
-        sorted_days = sorted(datetime.strptime(x, '%Y-%m-%d').date() for x in days)
-        run = 1
-        longest = 1
-        for i in range(1, len(sorted_days)):
-            if (sorted_days[i] - sorted_days[i - 1]).days == 1:
-                run += 1
-            else:
-                run = 1
-            longest = max(longest, run)
+    conn = get_db_connection()
+    row = conn.execute(
+        'SELECT current_streak, longest_streak, last_active_date, total_active_days '
+        'FROM user_streaks WHERE user_id = ?',
+        (user_id,),
+    ).fetchone()
+    conn.close()
+    today = datetime.now().date().strftime('%Y-%m-%d')
+    yesterday = (datetime.now().date() - timedelta(days=1)).strftime('%Y-%m-%d')
+    last = row['last_active_date'] if row else None
 
+    # The stored run is still "current" if it ended today or yesterday (so a
+    # not-yet-active today doesn't break a streak the user can still continue).
+    current = row['current_streak'] if last in (today, yesterday) else 0
     return {
         'current_streak': current,
-        'longest_streak': longest,
-        'active_today': today.strftime('%Y-%m-%d') in days,
-        'total_active_days': len(days),
-        'last_active': max(days) if days else None,
+        'longest_streak': row['longest_streak'] if row else 0,
+        'active_today': last == today,
+        'total_active_days': row['total_active_days'] if row else 0,
+        'last_active': last,
     }
 
 
@@ -5519,49 +8813,27 @@ def _gather_weekly_shot_data(user_id, week_start, week_end, category='batting'):
     score and improvement % per video. Returns (data_dict, has_videos)."""
     category = _normalize_shot_category(category)
     want_player_type = SHOT_REPORT_CATEGORIES[category]
-    user_folder = get_user_upload_folder(user_id)
-    start_d = datetime.strptime(week_start, '%Y-%m-%d').date()
-    end_d = datetime.strptime(week_end, '%Y-%m-%d').date()
 
     videos = []
-    if os.path.exists(user_folder):
-        for fname in os.listdir(user_folder):
-            if not (fname.startswith('results_') and fname.endswith('.json')):
-                continue
-            fpath = os.path.join(user_folder, fname)
-            try:
-                with open(fpath, 'r', encoding='utf-8') as f:
-                    res = json.load(f)
-            except Exception:
-                continue
-            if res.get('user_id') != user_id:
-                continue
-            # Only videos for the requested discipline.
-            if res.get('player_type') != want_player_type:
-                continue
-            created = datetime.fromtimestamp(os.stat(fpath).st_ctime)
-            if not (start_d <= created.date() <= end_d):
-                continue
-
-            fb = res.get('gpt_feedback')
-            flaws = fb.get('flaws', []) if isinstance(fb, dict) else []
-            # The shot/skill key: batting shot_type, else bowling/keeping type.
-            skill = (res.get('shot_type') or res.get('bowler_type')
-                     or res.get('keeping_type') or 'unspecified')
-            videos.append({
-                'filename': res.get('filename') or fname,
-                'player_type': res.get('player_type', 'unknown'),
-                'shot': skill,
-                'date': created.strftime('%Y-%m-%d'),
-                'created_ts': created.timestamp(),
-                'score': _video_technique_score(flaws),
-                'flaws': [{
-                    'feature': _flaw_feature_label(fl),
-                    'observed': fl.get('observed'),
-                    'ideal_range': fl.get('ideal_range'),
-                    'issue': fl.get('issue'),
-                } for fl in flaws],
-            })
+    rows = query_analysis_results(user_id, player_type=want_player_type,
+                                  date_from=week_start, date_to=week_end, oldest_first=True)
+    for r in rows:
+        created = datetime.strptime(r['created_at'], '%Y-%m-%d %H:%M:%S')
+        try:
+            flaws = json.loads(r['flaws_json'] or '[]')
+        except Exception:
+            flaws = []
+        # The shot/skill key: batting shot_type, else bowling/keeping type.
+        skill = r['shot_type'] or r['bowler_type'] or r['keeping_type'] or 'unspecified'
+        videos.append({
+            'filename': r['filename'],
+            'player_type': r['player_type'] or 'unknown',
+            'shot': skill,
+            'date': created.strftime('%Y-%m-%d'),
+            'created_ts': created.timestamp(),
+            'score': r['technique_score'] if r['technique_score'] is not None else _video_technique_score(flaws),
+            'flaws': flaws,
+        })
 
     # Group by shot, ordered chronologically within each group.
     groups = {}
@@ -5669,10 +8941,11 @@ STRICT RULES:
 """
 
 
-def generate_shot_report_for_user(user_id, category='batting', week_start=None, week_end=None):
+def generate_shot_report_for_user(user_id, category='batting', week_start=None, week_end=None, force=False):
     """Generate (and upsert) the weekly shot-progress report for one category
     (batting/bowling/keeping). Defaults to the current calendar week. Returns the
-    report dict, or None if no videos of that category were analyzed."""
+    report dict, or None if no videos of that category were analyzed. An unchanged
+    input reuses the stored report (with 'cached': True) unless force=True."""
     category = _normalize_shot_category(category)
     end = (datetime.strptime(week_end, '%Y-%m-%d').date() if week_end else datetime.now().date())
     if week_start:
@@ -5690,8 +8963,15 @@ def generate_shot_report_for_user(user_id, category='batting', week_start=None,
     cur = conn.cursor()
     cur.execute('SELECT username FROM users WHERE id = ?', (user_id,))
     urow = cur.fetchone()
-    conn.close()
     username = (urow['username'] if urow else None) or 'Player'
+    input_hash = _report_input_hash(username, data)
+    cur.execute('SELECT * FROM shot_reports WHERE user_id = ? AND week_start = ? AND category = ?',
+                (user_id, ws, category))
+    stored = cur.fetchone()
+    conn.close()
+    if stored and not force and stored['input_hash'] == input_hash:
+        logger.info(f"Shot report unchanged for user {user_id} ({category}, {ws}..{we}), reusing stored report")
+        return dict(_shot_report_to_dict(stored), cached=True)
 
     prompt = _build_shot_report_prompt(username, data)
     resp = gemini.generate_content(
@@ -5713,16 +8993,18 @@ def generate_shot_report_for_user(user_id, category='batting', week_start=None,
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute(
-        '''INSERT INTO shot_reports (user_id, week_start, week_end, category, report_md, stats_json, model, total_tokens)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        '''INSERT INTO shot_reports (user_id, week_start, week_end, category, report_md, stats_json, model, total_tokens, input_hash)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
            ON CONFLICT(user_id, week_start, category) DO UPDATE SET
              week_end=excluded.week_end,
              report_md=excluded.report_md,
              stats_json=excluded.stats_json,
              model=excluded.model,
              total_tokens=excluded.total_tokens,
+             input_hash=excluded.input_hash,
              generated_at=CURRENT_TIMESTAMP''',
-        (user_id, ws, we, category, report_md, json.dumps(data, default=str), WEEKLY_REPORT_MODEL, total_tokens),
+        (user_id, ws, we, category, report_md, json.dumps(data, default=str), WEEKLY_REPORT_MODEL, total_tokens,
+         input_hash),
     )
     conn.commit()
     cur.execute('SELECT * FROM shot_reports WHERE user_id = ? AND week_start = ? AND category = ?',
@@ -5737,19 +9019,28 @@ def generate_shot_report_for_user(user_id, category='batting', week_start=None,
 @app.route('/api/monitor/wellness', methods=['GET'])
 @require_auth
 def monitor_get_wellness():
+    limit, after = _page_args()
     try:
         user_id = int(request.user['user_id'])
-        days = int(request.args.get('days', 30))
+        try:
+            days = int(request.args.get('days', 30))
+        except ValueError:
+            return jsonify({'error': 'days must be an integer'}), 400
         cutoff = (datetime.now().date() - timedelta(days=days)).strftime('%Y-%m-%d')
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            'SELECT * FROM wellness_entries WHERE user_id = ? AND date >= ? ORDER BY date ASC',
-            (user_id, cutoff),
-        )
-        rows = cur.fetchall()
-        conn.close()
-        return jsonify({'entries': [_wellness_to_dict(r) for r in rows]})
+        version, modified = get_user_version(user_id, 'wellness')
+
+        def build():
+            conn = get_db_connection()
+            cur = conn.cursor()
+            rows, next_cursor = _keyset_page(
+                cur, 'SELECT * FROM wellness_entries', ['user_id = ?', 'date >= ?'], [user_id, cutoff],
+                ('date', 'id'), False, limit, after,
+            )
+            conn.close()
+            return {'entries': [_wellness_to_dict(r) for r in rows], 'next_cursor': next_cursor}
+
+        # The window is relative to today, so the date is part of the validator.
+        return conditional_json(_list_etag('wellness', user_id, version, cutoff), modified, build)
     except Exception as e:
         logger.error(f"Get wellness failed: {e}", exc_info=True)
         return jsonify({'error': 'Failed to load wellness'}), 500
@@ -5796,19 +9087,27 @@ def monitor_log_wellness():
 @app.route('/api/monitor/workload', methods=['GET'])
 @require_auth
 def monitor_get_workload():
+    limit, after = _page_args()
     try:
         user_id = int(request.user['user_id'])
-        days = int(request.args.get('days', 30))
+        try:
+            days = int(request.args.get('days', 30))
+        except ValueError:
+            return jsonify({'error': 'days must be an integer'}), 400
         cutoff = (datetime.now().date() - timedelta(days=days)).strftime('%Y-%m-%d')
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            'SELECT * FROM workload_sessions WHERE user_id = ? AND date >= ? ORDER BY date ASC, id ASC',
-            (user_id, cutoff),
-        )
-        rows = cur.fetchall()
-        conn.close()
-        return jsonify({'entries': [_workload_to_dict(r) for r in rows]})
+        version, modified = get_user_version(user_id, 'workload')
+
+        def build():
+            conn = get_db_connection()
+            cur = conn.cursor()
+            rows, next_cursor = _keyset_page(
+                cur, 'SELECT * FROM workload_sessions', ['user_id = ?', 'date >= ?'], [user_id, cutoff],
+                ('date', 'id'), False, limit, after,
+            )
+            conn.close()
+            return {'entries': [_workload_to_dict(r) for r in rows], 'next_cursor': next_cursor}
+
+        return conditional_json(_list_etag('workload', user_id, version, cutoff), modified, build)
     except Exception as e:
         logger.error(f"Get workload failed: {e}", exc_info=True)
         return jsonify({'error': 'Failed to load workload'}), 500
@@ -5835,8 +9134,9 @@ def monitor_log_workload():
             (user_id, date, data.get('type', 'other'), duration_min, rpe,
              data.get('balls_bowled'), load, data.get('notes')),
         )
-        conn.commit()
         new_id = cur.lastrowid
+        _bump_workload_daily(cur, user_id, date, load, data.get('balls_bowled'))
+        conn.commit()
         cur.execute('SELECT * FROM workload_sessions WHERE id = ?', (new_id,))
         row = cur.fetchone()
         conn.close()
@@ -5854,40 +9154,69 @@ def monitor_workload_summary():
         cutoff = (datetime.now().date() - timedelta(days=ACWR_CHRONIC_DAYS)).strftime('%Y-%m-%d')
         conn = get_db_connection()
         cur = conn.cursor()
+        # One pre-summed row per day; load is already set, so rpe/duration aren't needed.
         cur.execute(
-            'SELECT date, type, duration_min, rpe, balls_bowled, load FROM workload_sessions WHERE user_id = ? AND date >= ?',
+            '''SELECT date, NULL AS duration_min, NULL AS rpe, balls_bowled, total_load AS load
+               FROM workload_daily WHERE user_id = ? AND date >= ?''',
             (user_id, cutoff),
         )
         rows = cur.fetchall()
         conn.close()
         return jsonify({'summary': _compute_workload_summary(rows)})
     except Exception as e:
-        logger.error(f"Workload summary failed: {e}", exc_info=True)
-        return jsonify({'error': 'Failed to load summary'}), 500
+        logger.error(f"Workload summary failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to load summary'}), 500
+
+
+@app.route('/api/monitor/workload/acwr-series', methods=['GET'])
+@require_auth
+def monitor_workload_acwr_series():
+    """Daily rolling acute/chronic load and ACWR (rolling-average and EWMA) for a
+    date range: ?from=YYYY-MM-DD&to=YYYY-MM-DD, or ?days=N ending today (default 182)."""
+    try:
+        user_id = int(request.user['user_id'])
+        end = (datetime.strptime(request.args['to'][:10], '%Y-%m-%d').date()
+               if request.args.get('to') else datetime.now().date())
+        if request.args.get('from'):
+            start = datetime.strptime(request.args['from'][:10], '%Y-%m-%d').date()
+        else:
+            days = int(request.args.get('days', ACWR_SERIES_DEFAULT_DAYS))
+            start = end - timedelta(days=max(1, days) - 1)
+        if start > end:
+            return jsonify({'error': "'from' must be on or before 'to'"}), 400
+        if (end - start).days + 1 > ACWR_SERIES_MAX_DAYS:
+            return jsonify({'error': f'Range is limited to {ACWR_SERIES_MAX_DAYS} days'}), 400
+        return jsonify(_compute_acwr_series(user_id, start, end))
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD and days an integer'}), 400
+    except Exception as e:
+        logger.error(f"Workload ACWR series failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to load ACWR series'}), 500
 
 
 # ---- Fitness tests ----
 @app.route('/api/monitor/fitness', methods=['GET'])
 @require_auth
 def monitor_get_fitness():
+    limit, after = _page_args()
     try:
         user_id = int(request.user['user_id'])
         metric = request.args.get('metric')
-        conn = get_db_connection()
-        cur = conn.cursor()
-        if metric:
-            cur.execute(
-                'SELECT * FROM fitness_tests WHERE user_id = ? AND metric = ? ORDER BY date ASC, id ASC',
-                (user_id, metric),
-            )
-        else:
-            cur.execute(
-                'SELECT * FROM fitness_tests WHERE user_id = ? ORDER BY date ASC, id ASC',
-                (user_id,),
-            )
-        rows = cur.fetchall()
-        conn.close()
-        return jsonify({'tests': [_fitness_to_dict(r) for r in rows]})
+        version, modified = get_user_version(user_id, 'fitness')
+
+        def build():
+            where, params = ['user_id = ?'], [user_id]
+            if metric:
+                where.append('metric = ?')
+                params.append(metric)
+            conn = get_db_connection()
+            cur = conn.cursor()
+            rows, next_cursor = _keyset_page(cur, 'SELECT * FROM fitness_tests', where, params,
+                                             ('date', 'id'), False, limit, after)
+            conn.close()
+            return {'tests': [_fitness_to_dict(r) for r in rows], 'next_cursor': next_cursor}
+
+        return conditional_json(_list_etag('fitness', user_id, version), modified, build)
     except Exception as e:
         logger.error(f"Get fitness failed: {e}", exc_info=True)
         return jsonify({'error': 'Failed to load fitness tests'}), 500
@@ -5924,17 +9253,20 @@ def monitor_log_fitness():
 @app.route('/api/monitor/injuries', methods=['GET'])
 @require_auth
 def monitor_get_injuries():
+    limit, after = _page_args()
     try:
         user_id = int(request.user['user_id'])
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            'SELECT * FROM injuries WHERE user_id = ? ORDER BY date_reported DESC, id DESC',
-            (user_id,),
-        )
-        rows = cur.fetchall()
-        conn.close()
-        return jsonify({'injuries': [_injury_to_dict(r) for r in rows]})
+        version, modified = get_user_version(user_id, 'injuries')
+
+        def build():
+            conn = get_db_connection()
+            cur = conn.cursor()
+            rows, next_cursor = _keyset_page(cur, 'SELECT * FROM injuries', ['user_id = ?'], [user_id],
+                                             ('date_reported', 'id'), True, limit, after)
+            conn.close()
+            return {'injuries': [_injury_to_dict(r) for r in rows], 'next_cursor': next_cursor}
+
+        return conditional_json(_list_etag('injuries', user_id, version), modified, build)
     except Exception as e:
         logger.error(f"Get injuries failed: {e}", exc_info=True)
         return jsonify({'error': 'Failed to load injuries'}), 500
@@ -6003,6 +9335,576 @@ def monitor_update_injury(injury_id):
         return jsonify({'error': 'Failed to update injury'}), 500
 
 
+# ---- Offline sync (bulk ingest) ----
+# The app queues wellness/workload/fitness entries while offline and replays them
+# here in one request. Every record carries a client-generated id, so a replayed
+# batch (e.g. after a dropped response) never creates duplicates.
+SYNC_MAX_RECORDS = int(os.getenv('SYNC_MAX_RECORDS', '500'))
+SYNC_KINDS = ('wellness', 'workload', 'fitness')
+
+
+def _sync_date(data):
+    return (data.get('date') or _today_str())[:10]
+
+
+def _sync_validate(kind, data):
+    """Return an error message for an unusable record, or None. Checks every field
+    the batch transaction converts, so one bad record can't roll back the rest."""
+    date = data.get('date')
+    if date:
+        try:
+            datetime.strptime(date[:10], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return 'date must be YYYY-MM-DD'
+    if kind == 'workload':
+        try:
+            float(data.get('duration_min'))
+            float(data.get('rpe'))
+        except (TypeError, ValueError):
+            return 'duration_min and rpe are required'
+        try:
+            if data.get('balls_bowled'):
+                int(data['balls_bowled'])
+            if data.get('load') is not None:
+                float(data['load'])
+        except (TypeError, ValueError):
+            return 'balls_bowled and load must be numbers'
+    elif kind == 'fitness':
+        if data.get('metric') is None or data.get('value') is None:
+            return 'metric and value are required'
+    return None
+
+
+def ingest_monitoring_records(user_id, records):
+    """Upsert a mixed batch of monitoring records in one transaction.
+
+    Records are grouped by kind and written with executemany. Workload and fitness
+    records whose client_id was already stored are reported as 'duplicate'.
+    Wellness upserts on (user, date) like the single-entry endpoint; of several
+    wellness records for one date the last wins and the others are reported as
+    'superseded' (with the day's row id). Returns one result per input record,
+    in input order."""
+    results = [None] * len(records)
+    by_kind = {k: [] for k in SYNC_KINDS}
+    seen = set()
+    for i, rec in enumerate(records):
+        rec = rec if isinstance(rec, dict) else {}
+        kind = rec.get('kind')
+        client_id = str(rec.get('client_id') or '').strip()[:64]
+        data = rec.get('data') if isinstance(rec.get('data'), dict) else rec
+        base = {'client_id': client_id or None, 'kind': kind}
+        if kind not in SYNC_KINDS:
+            results[i] = dict(base, status='error', error=f"kind must be one of {', '.join(SYNC_KINDS)}")
+            continue
+        if not client_id:
+            results[i] = dict(base, status='error', error='client_id is required')
+            continue
+        if (kind, client_id) in seen:
+            results[i] = dict(base, status='duplicate')
+            continue
+        err = _sync_validate(kind, data)
+        if err:
+            results[i] = dict(base, status='error', error=err)
+            continue
+        seen.add((kind, client_id))
+        by_kind[kind].append((i, client_id, data))
+
+    # The upsert would leave only the last record's client_id on the day's row.
+    last_for_date = {}
+    for i, cid, d in by_kind['wellness']:
+        last_for_date[_sync_date(d)] = (i, cid)
+    superseded = [(i, cid, d) for i, cid, d in by_kind['wellness'] if last_for_date[_sync_date(d)][0] != i]
+    if superseded:
+        dropped = {i for i, _, _ in superseded}
+        by_kind['wellness'] = [item for item in by_kind['wellness'] if item[0] not in dropped]
+
+    with db_transaction(immediate=True) as conn:
+        # Wellness: one row per day, a replay just rewrites the same values.
+        wellness = by_kind['wellness']
+        if wellness:
+            conn.executemany(
+                '''INSERT INTO wellness_entries
+                     (user_id, date, sleep_quality, sleep_hours, soreness, fatigue, stress, mood, score, notes, client_id)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(user_id, date) DO UPDATE SET
+                     sleep_quality=excluded.sleep_quality,
+                     sleep_hours=excluded.sleep_hours,
+                     soreness=excluded.soreness,
+                     fatigue=excluded.fatigue,
+                     stress=excluded.stress,
+                     mood=excluded.mood,
+                     score=excluded.score,
+                     notes=excluded.notes,
+                     client_id=excluded.client_id''',
+                [(user_id, _sync_date(d), d.get('sleep_quality'), d.get('sleep_hours'),
+                  d.get('soreness'), d.get('fatigue'), d.get('stress'), d.get('mood'), d.get('score'),
+                  d.get('notes'), cid) for _, cid, d in wellness],
+            )
+
+        for kind, table in (('workload', 'workload_sessions'), ('fitness', 'fitness_tests')):
+            items = by_kind[kind]
+            if not items:
+                continue
+            placeholders = ','.join('?' * len(items))
+            existing = {
+                r['client_id'] for r in conn.execute(
+                    f'SELECT client_id FROM {table} WHERE user_id = ? AND client_id IN ({placeholders})',
+                    [user_id] + [cid for _, cid, _ in items],
+                ).fetchall()
+            }
+            fresh = [(i, cid, d) for i, cid, d in items if cid not in existing]
+            for i, cid, _ in items:
+                if cid in existing:
+                    results[i] = {'client_id': cid, 'kind': kind, 'status': 'duplicate'}
+            if not fresh:
+                continue
+            if kind == 'workload':
+                rows = []
+                for _, cid, d in fresh:
+                    load = d.get('load')
+                    if load is None:
+                        load = _session_load(d.get('rpe'), d.get('duration_min'), None)
+                    rows.append((user_id, _sync_date(d), d.get('type', 'other'),
+                                 d.get('duration_min'), d.get('rpe'), d.get('balls_bowled'), load,
+                                 d.get('notes'), cid))
+                conn.executemany(
+                    '''INSERT INTO workload_sessions
+                         (user_id, date, type, duration_min, rpe, balls_bowled, load, notes, client_id)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    rows,
+                )
+                conn.executemany(
+                    _WORKLOAD_DAILY_UPSERT_SQL,
+                    [(user_id, r[1], float(r[6] or 0), int(r[5] or 0)) for r in rows],
+                )
+            else:
+                conn.executemany(
+                    '''INSERT INTO fitness_tests (user_id, date, metric, value, unit, notes, client_id)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                    [(user_id, _sync_date(d), d.get('metric'), d.get('value'),
+                      d.get('unit'), d.get('notes'), cid) for _, cid, d in fresh],
+                )
+            for i, cid, _ in fresh:
+                results[i] = {'client_id': cid, 'kind': kind, 'status': 'created'}
+
+        # Resolve server ids for everything that landed (one query per kind).
+        for kind, table in (('wellness', 'wellness_entries'), ('workload', 'workload_sessions'),
+                            ('fitness', 'fitness_tests')):
+            items = by_kind[kind]
+            if not items:
+                continue
+            placeholders = ','.join('?' * len(items))
+            ids = {
+                r['client_id']: r['id'] for r in conn.execute(
+                    f'SELECT id, client_id FROM {table} WHERE user_id = ? AND client_id IN ({placeholders})',
+                    [user_id] + [cid for _, cid, _ in items],
+                ).fetchall()
+            }
+            for i, cid, _ in items:
+                if kind == 'wellness':
+                    results[i] = {'client_id': cid, 'kind': kind, 'status': 'upserted'}
+                if cid in ids:
+                    results[i]['id'] = str(ids[cid])
+
+        if superseded:
+            dates = sorted({_sync_date(d) for _, _, d in superseded})
+            day_ids = {
+                r['date']: r['id'] for r in conn.execute(
+                    f"SELECT id, date FROM wellness_entries WHERE user_id = ? AND date IN ({','.join('?' * len(dates))})",
+                    [user_id] + dates,
+                ).fetchall()
+            }
+            for i, cid, d in superseded:
+                date = _sync_date(d)
+                results[i] = {'client_id': cid, 'kind': 'wellness', 'status': 'superseded',
+                              'superseded_by': last_for_date[date][1]}
+                if date in day_ids:
+                    results[i]['id'] = str(day_ids[date])
+    return results
+
+
+@app.route('/api/monitor/sync', methods=['POST'])
+@require_auth
+def monitor_sync():
+    """Bulk ingest of offline-queued monitoring records:
+    {"records": [{"client_id": "...", "kind": "wellness|workload|fitness", "data": {...}}, ...]}
+    Returns {"results": [...]} with one status per record, in the same order."""
+    try:
+        user_id = int(request.user['user_id'])
+        body = request.get_json(silent=True) or {}
+        records = body.get('records')
+        if not isinstance(records, list):
+            return jsonify({'error': 'records must be a list'}), 400
+        if len(records) > SYNC_MAX_RECORDS:
+            return jsonify({'error': f'At most {SYNC_MAX_RECORDS} records per request'}), 400
+        results = ingest_monitoring_records(user_id, records)
+        counts = {}
+        for r in results:
+            counts[r['status']] = counts.get(r['status'], 0) + 1
+        return jsonify({'results': results, 'counts': counts})
+    except Exception as e:
+        logger.error(f"Monitoring sync failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to sync records'}), 500
+
+
+# ---- Change feed (delta sync) ----
+# SQLite triggers append every insert/update/delete on the synced tables to
+# change_log (see init_database). A client keeps the opaque cursor from its last
+# call and gets back only the rows that changed since, plus tombstones for deletes.
+CHANGE_FEED_MAX_CHANGES = int(os.getenv('CHANGE_FEED_MAX_CHANGES', '500'))
+
+# entity -> (table, row serializer)
+CHANGE_FEED_ENTITIES = {
+    'history': ('analysis_results', _history_item_from_row),
+    'wellness': ('wellness_entries', _wellness_to_dict),
+    'workload': ('workload_sessions', _workload_to_dict),
+    'fitness': ('fitness_tests', _fitness_to_dict),
+    'injuries': ('injuries', _injury_to_dict),
+}
+
+
+def _encode_change_cursor(seq):
+    return base64.urlsafe_b64encode(f"v1:{int(seq)}".encode()).decode().rstrip('=')
+
+
+def _decode_change_cursor(cursor):
+    """Sequence number from an opaque cursor; raises ValueError if malformed."""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    version, _, seq = raw.partition(':')
+    if version != 'v1':
+        raise ValueError('unknown cursor version')
+    return int(seq)
+
+
+def _change_log_pruned_seq(cur):
+    cur.execute("SELECT value FROM app_meta WHERE key = 'change_log_pruned_seq'")
+    row = cur.fetchone()
+    return int(row['value']) if row else 0
+
+
+def build_change_feed(user_id, since_seq, limit=CHANGE_FEED_MAX_CHANGES):
+    """Changes for one user after `since_seq`. Several log entries for the same row
+    collapse to its current state (or a tombstone if its last change was a delete)."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    if since_seq < _change_log_pruned_seq(cur):
+        # The cursor points at history that has been pruned: the client must refetch.
+        cur.execute('SELECT COALESCE(MAX(seq), 0) AS seq FROM change_log')
+        head = cur.fetchone()['seq']
+        conn.close()
+        return {'cursor': _encode_change_cursor(head), 'full_resync': True, 'has_more': False,
+                'changes': {}, 'deleted': {}}
+
+    # Bounded by the head read first, so nothing committed meanwhile is skipped; with
+    # nothing new for this user the cursor moves to that head so later calls stay cheap.
+    entries, next_seq, has_more = read_change_entries(conn, user_id, since_seq, limit)
+
+    latest = {}
+    for e in entries:
+        latest[(e['entity'], e['row_id'])] = e
+    changes = {}
+    deleted = {}
+    for entity, (table, to_dict) in CHANGE_FEED_ENTITIES.items():
+        keys = [k for k in latest if k[0] == entity]
+        if not keys:
+            continue
+        upsert_ids = [row_id for (_, row_id) in keys if latest[(entity, row_id)]['op'] != 'delete']
+        found = set()
+        if upsert_ids:
+            placeholders = ','.join('?' * len(upsert_ids))
+            cur.execute(f'SELECT * FROM {table} WHERE user_id = ? AND id IN ({placeholders})',
+                        [user_id] + upsert_ids)
+            rows = cur.fetchall()
+            changes[entity] = [to_dict(r) for r in rows]
+            found = {r['id'] for r in rows}
+        # Deleted rows, and rows that vanished between the log read and the fetch.
+        gone = [latest[(entity, row_id)]['ref'] for (_, row_id) in keys if row_id not in found]
+        if gone:
+            deleted[entity] = gone
+    conn.close()
+    return {'cursor': _encode_change_cursor(next_seq), 'full_resync': False, 'has_more': has_more,
+            'changes': changes, 'deleted': deleted}
+
+
+@app.route('/api/sync/changes', methods=['GET'])
+@require_auth
+def get_sync_changes():
+    """Delta sync for history and monitoring data: ?since=<cursor from the last call>.
+    Without a cursor (first launch) it returns full_resync=true and a cursor to start
+    from; the client loads the full lists once and then only asks for changes."""
+    try:
+        user_id = int(request.user['user_id'])
+        since = request.args.get('since')
+        if not since:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            cur.execute('SELECT COALESCE(MAX(seq), 0) AS seq FROM change_log')
+            head = cur.fetchone()['seq']
+            conn.close()
+            return jsonify({'cursor': _encode_change_cursor(head), 'full_resync': True,
+                            'has_more': False, 'changes': {}, 'deleted': {}})
+        try:
+            since_seq = _decode_change_cursor(since)
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({'error': 'Invalid since cursor'}), 400
+        return jsonify(build_change_feed(user_id, since_seq))
+    except Exception as e:
+        logger.error(f"Change feed failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to load changes'}), 500
+
+
+# ---- Coach / squad ----
+# A coach invites an athlete by username or email; the link only becomes 'active'
+# once the athlete accepts, and only active links expose the athlete's data.
+
+# Active athletes of one coach (bind the coach id once per use).
+_SQUAD_ATHLETES_SQL = "SELECT athlete_id FROM coach_athletes WHERE coach_id = ? AND status = 'active'"
+
+
+def _coach_link_to_dict(r):
+    return {
+        'coach_id': str(r['coach_id']),
+        'athlete_id': str(r['athlete_id']),
+        'username': r['username'],
+        'status': r['status'],
+        'created_at': r['created_at'],
+        'accepted_at': r['accepted_at'],
+    }
+
+
+@app.route('/api/coach/athletes', methods=['GET'])
+@require_auth
+def coach_list_athletes():
+    """Athletes the authenticated coach has invited (pending) or coaches (active)."""
+    try:
+        coach_id = int(request.user['user_id'])
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(
+            '''SELECT ca.*, u.username FROM coach_athletes ca JOIN users u ON u.id = ca.athlete_id
+               WHERE ca.coach_id = ? ORDER BY u.username COLLATE NOCASE''',
+            (coach_id,),
+        )
+        rows = cur.fetchall()
+        conn.close()
+        return jsonify({'athletes': [_coach_link_to_dict(r) for r in rows]})
+    except Exception as e:
+        logger.error(f"List coach athletes failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to load athletes'}), 500
+
+
+@app.route('/api/coach/athletes', methods=['POST'])
+@require_auth
+def coach_invite_athlete():
+    """Invite an athlete by username or email: {"athlete": "<username or email>"}."""
+    try:
+        coach_id = int(request.user['user_id'])
+        data = request.get_json(silent=True) or {}
+        ident = (data.get('athlete') or data.get('username') or data.get('email') or '').strip()
+        if not ident:
+            return jsonify({'error': 'athlete (username or email) is required'}), 400
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute('SELECT id FROM users WHERE username = ? OR lower(email) = lower(?)', (ident, ident))
+        urow = cur.fetchone()
+        if not urow:
+            conn.close()
+            return jsonify({'error': 'No user with that username or email'}), 404
+        athlete_id = urow['id']
+        if athlete_id == coach_id:
+            conn.close()
+            return jsonify({'error': 'You cannot add yourself as an athlete'}), 400
+        cur.execute(
+            "INSERT OR IGNORE INTO coach_athletes (coach_id, athlete_id, status) VALUES (?, ?, 'pending')",
+            (coach_id, athlete_id),
+        )
+        conn.commit()
+        cur.execute(
+            '''SELECT ca.*, u.username FROM coach_athletes ca JOIN users u ON u.id = ca.athlete_id
+               WHERE ca.coach_id = ? AND ca.athlete_id = ?''',
+            (coach_id, athlete_id),
+        )
+        row = cur.fetchone()
+        conn.close()
+        return jsonify({'athlete': _coach_link_to_dict(row)})
+    except Exception as e:
+        logger.error(f"Invite athlete failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to invite athlete'}), 500
+
+
+@app.route('/api/coach/athletes/<int:athlete_id>', methods=['DELETE'])
+@require_auth
+def coach_remove_athlete(athlete_id):
+    try:
+        coach_id = int(request.user['user_id'])
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute('DELETE FROM coach_athletes WHERE coach_id = ? AND athlete_id = ?', (coach_id, athlete_id))
+        conn.commit()
+        removed = cur.rowcount
+        conn.close()
+        if not removed:
+            return jsonify({'error': 'Athlete not found'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        logger.error(f"Remove athlete failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to remove athlete'}), 500
+
+
+@app.route('/api/coach/invites', methods=['GET'])
+@require_auth
+def athlete_list_coaches():
+    """Coaches linked to the authenticated athlete (pending invites and active coaches)."""
+    try:
+        athlete_id = int(request.user['user_id'])
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(
+            '''SELECT ca.*, u.username FROM coach_athletes ca JOIN users u ON u.id = ca.coach_id
+               WHERE ca.athlete_id = ? ORDER BY ca.created_at DESC''',
+            (athlete_id,),
+        )
+        rows = cur.fetchall()
+        conn.close()
+        return jsonify({'coaches': [_coach_link_to_dict(r) for r in rows]})
+    except Exception as e:
+        logger.error(f"List coach invites failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to load coach invites'}), 500
+
+
+@app.route('/api/coach/invites/<int:coach_id>/accept', methods=['POST'])
+@require_auth
+def athlete_accept_coach(coach_id):
+    try:
+        athlete_id = int(request.user['user_id'])
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(
+            '''UPDATE coach_athletes SET status = 'active', accepted_at = CURRENT_TIMESTAMP
+               WHERE coach_id = ? AND athlete_id = ? AND status = 'pending' ''',
+            (coach_id, athlete_id),
+        )
+        conn.commit()
+        updated = cur.rowcount
+        conn.close()
+        if not updated:
+            return jsonify({'error': 'Invite not found'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        logger.error(f"Accept coach invite failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to accept invite'}), 500
+
+
+@app.route('/api/coach/invites/<int:coach_id>', methods=['DELETE'])
+@require_auth
+def athlete_remove_coach(coach_id):
+    """Decline a pending invite, or stop sharing data with an active coach."""
+    try:
+        athlete_id = int(request.user['user_id'])
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute('DELETE FROM coach_athletes WHERE coach_id = ? AND athlete_id = ?', (coach_id, athlete_id))
+        conn.commit()
+        removed = cur.rowcount
+        conn.close()
+        if not removed:
+            return jsonify({'error': 'Invite not found'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        logger.error(f"Remove coach failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to remove coach'}), 500
+
+
+def build_squad_dashboard(coach_id):
+    """Latest wellness, ACWR, active injuries and weekly balls for every active athlete
+    of a coach. Each metric is one grouped query over the whole squad (no per-athlete
+    loop), so cost stays flat as the squad grows."""
+    today = datetime.now().date()
+    acute_cutoff = (today - timedelta(days=ACWR_ACUTE_DAYS - 1)).strftime('%Y-%m-%d')
+    chronic_cutoff = (today - timedelta(days=ACWR_CHRONIC_DAYS - 1)).strftime('%Y-%m-%d')
+    today_str = today.strftime('%Y-%m-%d')
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        f'''SELECT u.id, u.username FROM users u
+            WHERE u.id IN ({_SQUAD_ATHLETES_SQL}) ORDER BY u.username COLLATE NOCASE''',
+        (coach_id,),
+    )
+    roster = cur.fetchall()
+
+    # Latest wellness check-in per athlete.
+    cur.execute(
+        f'''SELECT w.user_id, w.date, w.score FROM wellness_entries w
+            JOIN (SELECT user_id, MAX(date) AS last_date FROM wellness_entries
+                  WHERE user_id IN ({_SQUAD_ATHLETES_SQL}) GROUP BY user_id) m
+              ON m.user_id = w.user_id AND m.last_date = w.date''',
+        (coach_id,),
+    )
+    wellness = {r['user_id']: r for r in cur.fetchall()}
+
+    # Acute (7-day) / chronic (28-day) load and weekly balls from the daily rollup,
+    # same windows as _compute_workload_summary.
+    cur.execute(
+        f'''SELECT user_id,
+                   SUM(CASE WHEN date >= ? THEN total_load ELSE 0 END) AS acute,
+                   SUM(total_load) AS chronic_total,
+                   SUM(CASE WHEN date >= ? THEN balls_bowled ELSE 0 END) AS weekly_balls
+            FROM workload_daily
+            WHERE user_id IN ({_SQUAD_ATHLETES_SQL}) AND date >= ? AND date <= ?
+            GROUP BY user_id''',
+        (acute_cutoff, acute_cutoff, coach_id, chronic_cutoff, today_str),
+    )
+    workload = {r['user_id']: r for r in cur.fetchall()}
+
+    # Active (not yet 'fit') injuries per athlete.
+    cur.execute(
+        f'''SELECT user_id, COUNT(*) AS n, GROUP_CONCAT(body_part, ', ') AS body_parts
+            FROM injuries
+            WHERE user_id IN ({_SQUAD_ATHLETES_SQL}) AND (status IS NULL OR status != 'fit')
+            GROUP BY user_id''',
+        (coach_id,),
+    )
+    injuries = {r['user_id']: r for r in cur.fetchall()}
+    conn.close()
+
+    athletes = []
+    for a in roster:
+        uid = a['id']
+        w = wellness.get(uid)
+        wl = workload.get(uid)
+        acute = float(wl['acute'] or 0) if wl else 0.0
+        chronic = float(wl['chronic_total'] or 0) / (ACWR_CHRONIC_DAYS / ACWR_ACUTE_DAYS) if wl else 0.0
+        acwr = (acute / chronic) if chronic > 0 else 0.0
+        inj = injuries.get(uid)
+        athletes.append({
+            'athlete_id': str(uid),
+            'username': a['username'],
+            'wellness_score': w['score'] if w else None,
+            'wellness_date': w['date'] if w else None,
+            'acute_load': round(acute),
+            'chronic_load': round(chronic),
+            'acwr': round(acwr, 2),
+            'acwr_flag': _acwr_flag(acwr, chronic),
+            'weekly_balls': int(wl['weekly_balls'] or 0) if wl else 0,
+            'active_injuries': inj['n'] if inj else 0,
+            'injury_body_parts': inj['body_parts'] if inj else None,
+        })
+    return {'date': today_str, 'athletes': athletes}
+
+
+@app.route('/api/coach/squad', methods=['GET'])
+@require_auth
+def coach_squad_dashboard():
+    """Squad view for the authenticated coach: one row per active athlete."""
+    try:
+        coach_id = int(request.user['user_id'])
+        return jsonify(build_squad_dashboard(coach_id))
+    except Exception as e:
+        logger.error(f"Squad dashboard failed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to load squad'}), 500
+
+
 # ---- Weekly AI monitoring report ----
 @app.route('/api/monitor/weekly-report', methods=['GET'])
 @require_auth
@@ -6027,19 +9929,21 @@ def monitor_get_weekly_report():
 @app.route('/api/monitor/weekly-report/list', methods=['GET'])
 @require_auth
 def monitor_list_weekly_reports():
-    """Recent weekly reports (newest first) for history."""
+    """Recent weekly reports (newest first) for history; ?cursor= continues the list."""
+    limit, after = _page_args(default_limit=8, max_limit=52)
     try:
         user_id = int(request.user['user_id'])
-        limit = max(1, min(int(request.args.get('limit', 8)), 52))
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            'SELECT * FROM weekly_reports WHERE user_id = ? ORDER BY week_start DESC LIMIT ?',
-            (user_id, limit),
-        )
-        rows = cur.fetchall()
-        conn.close()
-        return jsonify({'reports': [_weekly_report_to_dict(r) for r in rows]})
+        version, modified = get_user_version(user_id, 'weekly_reports')
+
+        def build():
+            conn = get_db_connection()
+            cur = conn.cursor()
+            rows, next_cursor = _keyset_page(cur, 'SELECT * FROM weekly_reports', ['user_id = ?'], [user_id],
+                                             ('week_start', 'id'), True, limit, after)
+            conn.close()
+            return {'reports': [_weekly_report_to_dict(r) for r in rows], 'next_cursor': next_cursor}
+
+        return conditional_json(_list_etag('weekly_reports', user_id, version), modified, build)
     except Exception as e:
         logger.error(f"List weekly reports failed: {e}", exc_info=True)
         return jsonify({'error': 'Failed to load weekly reports'}), 500
@@ -6049,25 +9953,19 @@ def monitor_list_weekly_reports():
 @require_auth
 def monitor_generate_weekly_report():
     """On-demand generation of the current week's report for the user.
-    One report per calendar week: if it already exists, return it (no regeneration)."""
+    One report per calendar week: if this week's data hasn't changed since it was
+    generated, the stored report is returned (no Gemini call). Pass {"force": true}
+    (or ?force=1) to regenerate regardless."""
     try:
         user_id = int(request.user['user_id'])
-        today = datetime.now().date()
-        week_start = (today - timedelta(days=today.weekday())).strftime('%Y-%m-%d')
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            'SELECT * FROM weekly_reports WHERE user_id = ? AND week_start = ?',
-            (user_id, week_start),
-        )
-        existing = cur.fetchone()
-        conn.close()
-        if existing:
-            return jsonify({'report': _weekly_report_to_dict(existing), 'already_generated': True}), 200
-        report = generate_weekly_report_for_user(user_id)
+        body = request.get_json(silent=True) or {}
+        force = _truthy_flag(body.get('force', request.args.get('force')))
+        report = generate_weekly_report_for_user(user_id, force=force)
         if not report:
             return jsonify({'report': None,
                             'message': 'Not enough monitoring data this week to generate a report.'}), 200
+        if report.pop('cached', False):
+            return jsonify({'report': report, 'already_generated': True}), 200
         return jsonify({'report': report})
     except Exception as e:
         logger.error(f"Generate weekly report failed: {e}", exc_info=True)
@@ -6114,26 +10012,26 @@ def monitor_get_shot_report():
 @require_auth
 def monitor_list_shot_reports():
     """Recent shot-progress reports (newest first) for history. Optionally
-    filtered by ?category=batting|bowling|keeping."""
+    filtered by ?category=batting|bowling|keeping; ?cursor= continues the list."""
+    limit, after = _page_args(default_limit=8, max_limit=52)
     try:
         user_id = int(request.user['user_id'])
-        limit = max(1, min(int(request.args.get('limit', 8)), 52))
         raw_cat = request.args.get('category')
-        conn = get_db_connection()
-        cur = conn.cursor()
-        if raw_cat:
-            cur.execute(
-                'SELECT * FROM shot_reports WHERE user_id = ? AND category = ? ORDER BY week_start DESC LIMIT ?',
-                (user_id, _normalize_shot_category(raw_cat), limit),
-            )
-        else:
-            cur.execute(
-                'SELECT * FROM shot_reports WHERE user_id = ? ORDER BY week_start DESC LIMIT ?',
-                (user_id, limit),
-            )
-        rows = cur.fetchall()
-        conn.close()
-        return jsonify({'reports': [_shot_report_to_dict(r) for r in rows]})
+        version, modified = get_user_version(user_id, 'shot_reports')
+
+        def build():
+            where, params = ['user_id = ?'], [user_id]
+            if raw_cat:
+                where.append('category = ?')
+                params.append(_normalize_shot_category(raw_cat))
+            conn = get_db_connection()
+            cur = conn.cursor()
+            rows, next_cursor = _keyset_page(cur, 'SELECT * FROM shot_reports', where, params,
+                                             ('week_start', 'id'), True, limit, after)
+            conn.close()
+            return {'reports': [_shot_report_to_dict(r) for r in rows], 'next_cursor': next_cursor}
+
+        return conditional_json(_list_etag('shot_reports', user_id, version), modified, build)
     except Exception as e:
         logger.error(f"List shot reports failed: {e}", exc_info=True)
         return jsonify({'error': 'Failed to load shot reports'}), 500
@@ -6144,25 +10042,17 @@ def monitor_list_shot_reports():
 def monitor_generate_shot_report():
     """On-demand generation of the current week's shot-progress report for the
     chosen category (batting/bowling/keeping), taken from the JSON body
-    {"category": ...}. One report per calendar week per category: if it already
-    exists, it is returned as-is (no regeneration)."""
+    {"category": ...}. One report per calendar week per category: if no new videos
+    changed its input since it was generated, the stored report is returned as-is.
+    Pass {"force": true} (or ?force=1) to regenerate regardless."""
     try:
         user_id = int(request.user['user_id'])
         body = request.get_json(silent=True) or {}
         category = _normalize_shot_category(body.get('category') or request.args.get('category'))
-        today = datetime.now().date()
-        week_start = (today - timedelta(days=today.weekday())).strftime('%Y-%m-%d')
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            'SELECT * FROM shot_reports WHERE user_id = ? AND week_start = ? AND category = ?',
-            (user_id, week_start, category),
-        )
-        existing = cur.fetchone()
-        conn.close()
-        if existing:
-            return jsonify({'report': _shot_report_to_dict(existing), 'already_generated': True}), 200
-        report = generate_shot_report_for_user(user_id, category)
+        force = _truthy_flag(body.get('force', request.args.get('force')))
+        report = generate_shot_report_for_user(user_id, category, force=force)
+        if report and report.pop('cached', False):
+            return jsonify({'report': report, 'already_generated': True}), 200
         if not report:
             label = {'batting': 'batting shots', 'bowling': 'bowling',
                      'keeping': 'keeping'}.get(category, category)
@@ -6221,6 +10111,8 @@ def clear_analysis_history():
             except Exception as e:
                 logging.warning(f"Failed to delete {file_path}: {e}")
         
+        delete_analysis_results(user_id)
+
         print(f"Cleared {deleted_count} analysis results for user {username}")
         return jsonify({
             'message': f'Successfully cleared {deleted_count} analysis results',
@@ -6247,6 +10139,7 @@ def delete_all_videos():
         deleted_videos = 0
         deleted_files = 0
         files_to_delete = []
+        deleted_results = []
         
         # Video file extensions
         video_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.webm', '.flv', '.wmv', '.m4v']
@@ -6269,6 +10162,13 @@ def delete_all_videos():
                     annotated_pattern = f"annotated_*{file}*"
                     annotated_files = glob.glob(os.path.join(user_folder, annotated_pattern))
                     files_to_delete.extend(annotated_files)
+
+                    # Delete cached poster frames (original and annotated)
+                    poster_pattern = f"poster_*{file}*.jpg"
+                    files_to_delete.extend(glob.glob(os.path.join(user_folder, poster_pattern)))
+
+                    # Delete HLS renditions (directories)
+                    files_to_delete.extend(glob.glob(os.path.join(user_folder, f"hls_*{file}")))
                     
                     # Delete keypoints CSV if exists
                     keypoints_pattern = f"*{filename_without_ext}*keypoints*.csv"
@@ -6279,6 +10179,7 @@ def delete_all_videos():
                     results_file = os.path.join(user_folder, f"results_{file}.json")
                     if os.path.exists(results_file):
                         files_to_delete.append(results_file)
+                        deleted_results.append(file)
                     
                     # Delete report if exists
                     report_pattern = f"report_*{filename_without_ext}*.txt"
@@ -6301,13 +10202,20 @@ def delete_all_videos():
         # Delete the files
         for file_path in files_to_delete:
             try:
-                if os.path.exists(file_path):
+                if os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+                    deleted_files += 1
+                    logger.info(f"Deleted: {file_path}")
+                elif os.path.exists(file_path):
                     os.remove(file_path)
                     deleted_files += 1
                     logger.info(f"Deleted: {file_path}")
             except Exception as e:
                 logger.warning(f"Failed to delete {file_path}: {e}")
         
+        if deleted_results:
+            delete_analysis_results(user_id, deleted_results)
+
         logger.info(f"Deleted {deleted_videos} videos and {deleted_files} total files for user {username}")
         return jsonify({
             'success': True,
@@ -6377,81 +10285,23 @@ def generate_training_plan_api():
         
         print(f"Generating training plan for {player_type} - Shot: {shot_type}, Bowler Type: {bowler_type}")
         
-        # Find the latest report file for this user - this is critical for generating shot-specific training plans
-        # Reports are uniquely named with timestamps: report_{player_type}_{timestamp}.txt
+        # Find the latest report for this user - this is critical for generating shot-specific
+        # training plans. Prefer the newest indexed analysis whose report still exists on disk
+        # (the current analysis' own report is included in that list).
         report_path = None
-        latest_mtime = 0
-        
-        # First, try the report_path from current results if it exists and belongs to user
-        if results.get('report_path'):
-            potential_path = results.get('report_path')
-            if os.path.exists(potential_path):
-                # Verify this report belongs to the current user by checking its modification time
-                # and that it's linked to a results file with this user_id
-                mtime = os.path.getmtime(potential_path)
-                report_path = potential_path
-                latest_mtime = mtime
-                print(f"Found report from current results: {report_path}")
-        
-        # Find the latest report created by this user (across all their analyses)
-        # This ensures we use the most recent report even if it's from a different analysis
         try:
-            # Search through all results files in user's folder to find reports belonging to this user
-            results_files = glob.glob(os.path.join(user_folder, 'results_*.json'))
-            
-            for results_file in results_files:
-                try:
-                    with open(results_file, 'r') as f:
-                        other_results = json.load(f)
-                    
-                    # Check if this result belongs to the same user
-                    other_user_id = other_results.get('user_id')
-                    if other_user_id != user_id:
-                        continue
-                    
-                    # Get the report path from this result
-                    other_report_path = other_results.get('report_path')
-                    if other_report_path and os.path.exists(other_report_path):
-                        mtime = os.path.getmtime(other_report_path)
-                        # Use this report if it's newer than what we have
-                        if mtime > latest_mtime:
-                            latest_mtime = mtime
-                            report_path = other_report_path
-                            print(f"Found newer report for user: {report_path} (modified: {datetime.fromtimestamp(mtime)})")
-                except Exception as e:
-                    logger.debug(f"Error reading results file {results_file}: {e}")
-                    continue
-            
-            # If still no report found, try direct file search by pattern in user's folder
-            if not report_path:
-                # Get all report files for this player type in user's folder
-                report_pattern = f"report_{player_type}_*.txt"
-                report_files = glob.glob(os.path.join(user_folder, report_pattern))
-                
-                for report_file in report_files:
-                    try:
-                        mtime = os.path.getmtime(report_file)
-                        # Verify this report belongs to the user by checking if it's linked in any results file
-                        for results_file in results_files:
-                            try:
-                                with open(results_file, 'r') as f:
-                                    check_results = json.load(f)
-                                if (check_results.get('user_id') == user_id and 
-                                    check_results.get('report_path') == report_file):
-                                    if mtime > latest_mtime:
-                                        latest_mtime = mtime
-                                        report_path = report_file
-                                        print(f"Found report by pattern matching: {report_path}")
-                                    break
-                            except:
-                                continue
-                    except Exception as e:
-                        logger.debug(f"Error checking report file {report_file}: {e}")
-                        continue
-                        
+            for row in query_analysis_results(user_id, limit=HISTORY_MAX_LIMIT):
+                candidate = row['report_path']
+                if candidate and os.path.exists(candidate):
+                    report_path = candidate
+                    print(f"Found latest report for user: {report_path}")
+                    break
+            if not report_path and results.get('report_path') and os.path.exists(results.get('report_path')):
+                report_path = results.get('report_path')
+                print(f"Found report from current results: {report_path}")
         except Exception as e:
             logger.error(f"Error finding latest report for user: {e}", exc_info=True)
-        
+
         if report_path and os.path.exists(report_path):
             print(f"Report will be used for training plan generation: {report_path}")
         else:
@@ -8027,12 +11877,24 @@ def verify_username_otp():
         return jsonify({'error': 'Failed to verify OTP'}), 500
 
 if __name__ == '__main__':
+    # `python backend_script.py --worker`: run queued analyses instead of serving HTTP.
+    worker_mode = '--worker' in sys.argv
+
     # Initialize database
     logger.info("Initializing database...")
-    init_database()
+    init_database(start_scheduler=not worker_mode)
     
     # Initialize models before starting the server
     initialize_models()
+
+    if worker_mode:
+        run_analysis_worker()
+        sys.exit(0)
+
+    # Resume video uploads left in the outbox by a previous process, and (queue
+    # mode) apply jobs finished by remote analysis workers.
+    video_upload_queue.start()
+    start_analysis_result_collector()
     
     # Start the Flask server
     port = int(os.environ.get('FLASK_PORT', 3000))
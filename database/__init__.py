@@ -0,0 +1,6 @@
+from .sqlite_pool import SQLitePool, PooledConnection
+from .job_queue import JobQueue, SQLiteJobQueue, load_job_queue
+from .change_feed import change_log_head, read_change_entries
+
+__all__ = ["SQLitePool", "PooledConnection", "JobQueue", "SQLiteJobQueue", "load_job_queue",
+           "change_log_head", "read_change_entries"]
@@ -0,0 +1,39 @@
+"""
+Reading the delta-sync change log.
+
+Each user's feed is a window of `change_log` rows (seq is AUTOINCREMENT and
+SQLite has a single writer, so seq order is commit order). The window's upper
+bound is read first: a row committed while the feed is being built gets a seq
+above that bound and is delivered on the next call, instead of being skipped
+when an empty result moves the cursor to the head.
+
+Usage:
+
+    from database import read_change_entries
+
+    entries, next_seq, has_more = read_change_entries(conn, user_id, since_seq, limit=500)
+"""
+
+
+def change_log_head(conn, default=0):
+    """Highest seq in change_log (`default` when it is empty)."""
+    row = conn.execute('SELECT COALESCE(MAX(seq), ?) FROM change_log', (default,)).fetchone()
+    return row[0]
+
+
+def read_change_entries(conn, user_id, since_seq, limit):
+    """
+    Up to `limit` change_log rows for `user_id` with since_seq < seq <= head.
+    Returns (entries, next_seq, has_more); next_seq is the last entry's seq, or
+    the head when nothing matched, so idle clients' cursors keep moving.
+    """
+    head = change_log_head(conn, since_seq)
+    entries = conn.execute(
+        'SELECT seq, entity, row_id, ref, op FROM change_log '
+        'WHERE user_id = ? AND seq > ? AND seq <= ? ORDER BY seq LIMIT ?',
+        (user_id, since_seq, head, limit + 1),
+    ).fetchall()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    next_seq = entries[-1]['seq'] if entries else max(head, since_seq)
+    return entries, next_seq, has_more
@@ -0,0 +1,258 @@
+"""
+Shared analysis job queue.
+
+Analysis used to run on a thread of the API process that received the upload,
+so pose extraction could only use that one machine. With a shared queue the API
+host enqueues, and any number of worker processes (on this host or others)
+claim jobs under a lease. A job whose worker dies becomes claimable again once
+its lease expires.
+
+Lifecycle of a row:
+
+    queued --claim()--> claimed --complete()--> done
+                           |    --fail()------> failed
+                           +-- lease expires --> claimable again (until max_attempts)
+
+The API host then reads done/failed rows with finished(), claims each one with
+claim_finished() so only one API process applies it, applies it (result files,
+history index, push notification), and removes it with ack(). release_finished()
+hands a row back after a failed apply; an abandoned claim expires after its lease.
+
+Usage:
+
+    from database import SQLitePool, load_job_queue
+
+    jobs = load_job_queue("sqlite", pool=SQLitePool("cricket_coach.db"))
+    jobs.enqueue(job_id, {"user_id": 1, ...})
+
+    item = jobs.claim("worker-a", lease_seconds=600)   # None when nothing is queued
+    jobs.complete(item["job_id"], "worker-a", {"results": ...})
+
+SQLiteJobQueue works when every worker can open the same database file. For
+workers on other machines, pass "package.module:ClassName" to load_job_queue to
+use a networked backend that implements JobQueue (e.g. on Redis or Postgres).
+"""
+
+import abc
+import importlib
+import json
+import logging
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue(abc.ABC):
+    """Interface for analysis queue backends."""
+
+    @abc.abstractmethod
+    def enqueue(self, job_id, payload):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def claim(self, worker_id, lease_seconds):
+        """Lease the oldest claimable job: {"job_id", "payload", "attempts"} or None."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def heartbeat(self, job_id, worker_id, lease_seconds):
+        """Extend a lease; False if the job is no longer held by worker_id."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete(self, job_id, worker_id, result):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fail(self, job_id, worker_id, error):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def finished(self, limit=20):
+        """Done/failed jobs not yet acked: dicts with job_id, payload, status, result, error."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def claim_finished(self, job_id, applier_id, lease_seconds=600):
+        """Reserve a finished job for applying; False if another applier holds it."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def release_finished(self, job_id, applier_id):
+        """Drop an apply claim so the job is picked up again."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def ack(self, job_id):
+        raise NotImplementedError
+
+
+class SQLiteJobQueue(JobQueue):
+    """JobQueue on a table in the app's SQLite database (via a SQLitePool)."""
+
+    def __init__(self, pool, table="analysis_queue", max_attempts=3):
+        self.pool = pool
+        self.table = table
+        self.max_attempts = int(max_attempts)
+        conn = self.pool.connection()
+        try:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    job_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    worker_id TEXT,
+                    lease_expires_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    applied_by TEXT,
+                    apply_expires_at REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            # Apply claims (added after the table shipped).
+            for col, decl in (('applied_by', 'TEXT'), ('apply_expires_at', 'REAL')):
+                try:
+                    conn.execute(f'ALTER TABLE {self.table} ADD COLUMN {col} {decl}')
+                except sqlite3.OperationalError:
+                    pass  # Column already exists
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_status ON {self.table}(status, created_at)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def enqueue(self, job_id, payload):
+        now = time.time()
+        with self.pool.transaction(immediate=True) as conn:
+            conn.execute(
+                f'''INSERT INTO {self.table} (job_id, payload, status, created_at, updated_at)
+                    VALUES (?, ?, 'queued', ?, ?)
+                    ON CONFLICT(job_id) DO UPDATE SET
+                        payload = excluded.payload, status = 'queued', worker_id = NULL,
+                        lease_expires_at = NULL, attempts = 0, result = NULL, error = NULL,
+                        applied_by = NULL, apply_expires_at = NULL, updated_at = excluded.updated_at''',
+                (job_id, json.dumps(payload, default=str), now, now),
+            )
+
+    def claim(self, worker_id, lease_seconds):
+        now = time.time()
+        with self.pool.transaction(immediate=True) as conn:
+            # Leases that ran out on their last allowed attempt are dead, not retried.
+            conn.execute(
+                f'''UPDATE {self.table}
+                    SET status = 'failed', error = 'Worker lease expired', updated_at = ?
+                    WHERE status = 'claimed' AND lease_expires_at < ? AND attempts >= ?''',
+                (now, now, self.max_attempts),
+            )
+            row = conn.execute(
+                f'''SELECT job_id, payload, attempts FROM {self.table}
+                    WHERE status = 'queued' OR (status = 'claimed' AND lease_expires_at < ?)
+                    ORDER BY created_at
+                    LIMIT 1''',
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            attempts = int(row['attempts']) + 1
+            conn.execute(
+                f'''UPDATE {self.table}
+                    SET status = 'claimed', worker_id = ?, lease_expires_at = ?, attempts = ?, updated_at = ?
+                    WHERE job_id = ?''',
+                (worker_id, now + lease_seconds, attempts, now, row['job_id']),
+            )
+        return {"job_id": row['job_id'], "payload": json.loads(row['payload']), "attempts": attempts}
+
+    def heartbeat(self, job_id, worker_id, lease_seconds):
+        now = time.time()
+        with self.pool.transaction(immediate=True) as conn:
+            cur = conn.execute(
+                f'''UPDATE {self.table} SET lease_expires_at = ?, updated_at = ?
+                    WHERE job_id = ? AND worker_id = ? AND status = 'claimed' ''',
+                (now + lease_seconds, now, job_id, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def _finish(self, job_id, worker_id, status, result=None, error=None):
+        with self.pool.transaction(immediate=True) as conn:
+            cur = conn.execute(
+                f'''UPDATE {self.table} SET status = ?, result = ?, error = ?, lease_expires_at = NULL, updated_at = ?
+                    WHERE job_id = ? AND worker_id = ? AND status = 'claimed' ''',
+                (status, json.dumps(result, default=str) if result is not None else None, error,
+                 time.time(), job_id, worker_id),
+            )
+            if cur.rowcount != 1:
+                logger.warning(f"Job {job_id} is no longer leased by {worker_id}; dropping its {status} result")
+            return cur.rowcount == 1
+
+    def complete(self, job_id, worker_id, result):
+        return self._finish(job_id, worker_id, 'done', result=result)
+
+    def fail(self, job_id, worker_id, error):
+        return self._finish(job_id, worker_id, 'failed', error=str(error))
+
+    def finished(self, limit=20):
+        conn = self.pool.connection()
+        try:
+            rows = conn.execute(
+                f'''SELECT job_id, payload, status, result, error FROM {self.table}
+                    WHERE status IN ('done', 'failed') AND (applied_by IS NULL OR apply_expires_at < ?)
+                    ORDER BY updated_at
+                    LIMIT ?''',
+                (time.time(), int(limit)),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {
+                "job_id": r['job_id'],
+                "payload": json.loads(r['payload']),
+                "status": r['status'],
+                "result": json.loads(r['result']) if r['result'] else None,
+                "error": r['error'],
+            }
+            for r in rows
+        ]
+
+    def claim_finished(self, job_id, applier_id, lease_seconds=600):
+        now = time.time()
+        with self.pool.transaction(immediate=True) as conn:
+            cur = conn.execute(
+                f'''UPDATE {self.table} SET applied_by = ?, apply_expires_at = ?
+                    WHERE job_id = ? AND status IN ('done', 'failed')
+                      AND (applied_by IS NULL OR apply_expires_at < ?)''',
+                (applier_id, now + lease_seconds, job_id, now),
+            )
+            return cur.rowcount == 1
+
+    def release_finished(self, job_id, applier_id):
+        with self.pool.transaction(immediate=True) as conn:
+            conn.execute(
+                f'UPDATE {self.table} SET applied_by = NULL, apply_expires_at = NULL WHERE job_id = ? AND applied_by = ?',
+                (job_id, applier_id),
+            )
+
+    def ack(self, job_id):
+        with self.pool.transaction(immediate=True) as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE job_id = ? AND status IN ('done', 'failed')", (job_id,))
+
+
+def load_job_queue(spec, **kwargs):
+    """
+    Build a queue backend. spec is "sqlite" (needs pool=SQLitePool) or
+    "package.module:ClassName" for a custom JobQueue; kwargs go to its constructor.
+    """
+    spec = (spec or "sqlite").strip()
+    if spec == "sqlite":
+        return SQLiteJobQueue(**kwargs)
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"Invalid job queue backend {spec!r}; expected 'sqlite' or 'module:ClassName'")
+    cls = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(cls, type) and issubclass(cls, JobQueue)):
+        raise TypeError(f"Job queue backend {spec!r} is not a JobQueue subclass")
+    kwargs.pop("pool", None)
+    return cls(**kwargs)
+
@@ -0,0 +1,189 @@
+"""
+Pooled SQLite access.
+
+`get_db_connection()` used to open a brand-new `sqlite3.connect()` for every
+helper call, in the default rollback-journal mode, so concurrent writers
+(entitlements, analysis log, wellness upserts) regularly hit
+"database is locked". This module keeps a small pool of connections per
+thread, each configured once with:
+
+- WAL journal mode (readers never block the single writer)
+- synchronous=NORMAL (safe with WAL, far fewer fsyncs)
+- busy_timeout, so a writer waits for the lock instead of failing
+- foreign_keys=ON, so the ON DELETE CASCADE clauses in the schema apply
+- a larger statement cache; because connections now live for the thread's
+  lifetime, repeated queries reuse their compiled (prepared) statements
+
+Usage:
+
+    from database import SQLitePool
+
+    pool = SQLitePool("cricket_coach.db")
+
+    conn = pool.connection()          # drop-in for sqlite3.connect(...)
+    conn.execute("SELECT 1")
+    conn.close()                      # returns it to this thread's pool
+
+    with pool.transaction(immediate=True) as conn:
+        conn.execute("UPDATE ...")    # committed on exit, rolled back on error
+
+sqlite3 connections are bound to the thread that created them, so each
+thread has its own free list; a thread's idle connections are closed when
+the thread exits. A connection released on another thread (e.g. garbage
+collected with a traceback handed over by a Future) is dropped, not pooled.
+"""
+
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    """Proxy for a pooled sqlite3.Connection whose close() returns it to the pool.
+
+    Any transaction left open on close() is rolled back first, so the next
+    borrower always starts clean.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._owner = threading.get_ident()
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database connection.")
+        return getattr(raw, name)
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw, self._owner)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Same semantics as sqlite3.Connection: commit on success, rollback on error.
+        if exc_type is None:
+            self._raw.commit()
+        else:
+            self._raw.rollback()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class SQLitePool:
+    """Per-thread pool of tuned sqlite3 connections to one database file."""
+
+    def __init__(self, path, busy_timeout_ms=10000, max_idle_per_thread=4, cached_statements=256):
+        self.path = path
+        self.busy_timeout_ms = int(busy_timeout_ms)
+        self.max_idle_per_thread = int(max_idle_per_thread)
+        self.cached_statements = int(cached_statements)
+        self._local = threading.local()
+        self._wal_lock = threading.Lock()
+        self._wal_enabled = False
+
+    def _idle(self):
+        idle = getattr(self._local, 'idle', None)
+        if idle is None:
+            idle = self._local.idle = []
+        return idle
+
+    def _enable_wal(self, raw):
+        # journal_mode is persistent in the database file, so set it once per process.
+        if self._wal_enabled:
+            return
+        with self._wal_lock:
+            if self._wal_enabled:
+                return
+            mode = raw.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+            if str(mode).lower() != 'wal':
+                logger.warning(f"SQLite journal_mode is {mode!r}, not WAL, for {self.path}")
+            self._wal_enabled = True
+
+    def _open(self):
+        raw = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            cached_statements=self.cached_statements,
+        )
+        raw.row_factory = sqlite3.Row
+        self._enable_wal(raw)
+        raw.execute('PRAGMA synchronous=NORMAL')
+        raw.execute(f'PRAGMA busy_timeout={self.busy_timeout_ms}')
+        raw.execute('PRAGMA foreign_keys=ON')
+        return raw
+
+    def connection(self):
+        """Borrow a connection for the current thread (create one if none is idle)."""
+        idle = self._idle()
+        raw = idle.pop() if idle else self._open()
+        return PooledConnection(self, raw)
+
+    def _release(self, raw, owner=None):
+        if owner is not None and owner != threading.get_ident():
+            # Not this thread's to pool (or even close: sqlite3 refuses). Dropping the
+            # last reference closes it without the thread check.
+            try:
+                raw.close()
+            except Exception:
+                pass
+            return
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except sqlite3.Error:
+            # A broken connection is not worth keeping.
+            try:
+                raw.close()
+            except Exception:
+                pass
+            return
+        idle = self._idle()
+        if len(idle) < self.max_idle_per_thread:
+            idle.append(raw)
+        else:
+            raw.close()
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Run a block in one transaction: commit on success, rollback on error.
+
+        immediate=True takes the write lock up front (BEGIN IMMEDIATE), for
+        read-modify-write sequences such as decrementing credits.
+        """
+        conn = self.connection()
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    def close_thread_connections(self):
+        """Close this thread's idle connections (e.g. at the end of a worker)."""
+        idle = self._idle()
+        while idle:
+            try:
+                idle.pop().close()
+            except Exception:
+                pass
@@ -106,6 +106,14 @@ class GeminiTokenMonitor:
         """Return token usage accumulated since the last begin_request() on this thread."""
         return dict(getattr(self._local, "usage", None) or self._empty_usage())
 
+    def add_request_usage(self, usage):
+        """Fold usage measured on another thread (e.g. a worker pool) into this thread's request."""
+        local_usage = getattr(self._local, "usage", None)
+        if local_usage is None or not usage:
+            return
+        for key in local_usage:
+            local_usage[key] += usage.get(key) or 0
+
     # -- the wrapped call ---------------------------------------------------
     def generate_content(self, model, contents, label=None, **kwargs):
         """
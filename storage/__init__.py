@@ -0,0 +1,4 @@
+from .backends import S3Storage, LocalStorage, StorageError
+from .upload_queue import UploadQueue
+
+__all__ = ["S3Storage", "LocalStorage", "StorageError", "UploadQueue"]
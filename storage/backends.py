@@ -0,0 +1,197 @@
+"""
+Object storage backends for uploaded videos.
+
+`upload_video_to_s3()` used to build a fresh `boto3.client("s3")` on every call
+(new credential resolution, new connection pool, new TLS handshakes) and push the
+whole file in one blocking `upload_file`. The backends here are created once and
+shared by every request and worker thread:
+
+- S3Storage: one boto3 client (clients are thread-safe) with a sized connection
+  pool, adaptive retries and TCP keepalive, plus a TransferConfig so files above
+  the multipart threshold are sent as parallel parts.
+- LocalStorage: the same interface on top of a directory, for development and
+  tests when no bucket is configured.
+
+Usage:
+
+    from storage import S3Storage, LocalStorage
+
+    store = S3Storage("my-bucket", region="ap-south-1")
+    store.upload_file("uploads/_tmp/clip.mp4", "alice/clip.mp4", content_type="video/mp4")
+    store.head("alice/clip.mp4")          # metadata dict, or None if missing
+    store.download_file("alice/clip.mp4", "/tmp/clip.mp4")
+
+Both backends raise StorageError for transport/service failures.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from botocore.exceptions import BotoCoreError, ClientError
+except Exception:
+    boto3 = None
+    TransferConfig = Config = None
+    BotoCoreError = ClientError = Exception
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class StorageError(RuntimeError):
+    """An object storage operation failed."""
+
+
+class S3Storage:
+    """Shared, pooled S3 (or S3-compatible) client with multipart transfers."""
+
+    scheme = "s3"
+
+    def __init__(self, bucket, region=None, endpoint_url=None, max_pool_connections=32,
+                 multipart_threshold_mb=16, multipart_chunksize_mb=8, max_concurrency=8):
+        self.bucket = bucket
+        self.region = region
+        self.endpoint_url = endpoint_url
+        self.max_pool_connections = int(max_pool_connections)
+        self.multipart_threshold = int(multipart_threshold_mb) * MB
+        self.multipart_chunksize = int(multipart_chunksize_mb) * MB
+        self.max_concurrency = int(max_concurrency)
+        self._client = None
+        self._transfer_config = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Built lazily (so importing the app never needs AWS credentials), then shared.
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if boto3 is None:
+                        raise StorageError("boto3 is not installed on the server. Please add it to your dependencies.")
+                    config = Config(
+                        max_pool_connections=self.max_pool_connections,
+                        retries={"max_attempts": 5, "mode": "adaptive"},
+                        tcp_keepalive=True,
+                        signature_version="s3v4",
+                    )
+                    kwargs = {"config": config}
+                    if self.region:
+                        kwargs["region_name"] = self.region
+                    if self.endpoint_url:
+                        kwargs["endpoint_url"] = self.endpoint_url
+                    self._transfer_config = TransferConfig(
+                        multipart_threshold=self.multipart_threshold,
+                        multipart_chunksize=self.multipart_chunksize,
+                        max_concurrency=self.max_concurrency,
+                        use_threads=True,
+                    )
+                    self._client = boto3.client("s3", **kwargs)
+        return self._client
+
+    def uri(self, key, bucket=None):
+        return f"s3://{bucket or self.bucket}/{key}"
+
+    def upload_file(self, local_path, key, content_type=None, bucket=None):
+        bucket = bucket or self.bucket
+        client = self.client
+        extra_args = {"ContentType": content_type} if content_type else None
+        try:
+            client.upload_file(local_path, bucket, key, ExtraArgs=extra_args, Config=self._transfer_config)
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(f"Failed to upload to S3 (bucket={bucket}, key={key}): {e}")
+        return {"bucket": bucket, "key": key, "uri": self.uri(key, bucket)}
+
+    def download_file(self, key, local_path, bucket=None):
+        """Ranged, parallel download straight to disk (never the whole body in memory)."""
+        bucket = bucket or self.bucket
+        client = self.client
+        try:
+            client.download_file(bucket, key, local_path, Config=self._transfer_config)
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(f"Failed to download from S3 (bucket={bucket}, key={key}): {e}")
+        return local_path
+
+    def head(self, key, bucket=None):
+        """Object metadata (ContentLength, ContentType, ETag, ...), or None if it doesn't exist."""
+        bucket = bucket or self.bucket
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            code = str(getattr(e, "response", {}).get("Error", {}).get("Code", ""))
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise StorageError(f"Failed to check S3 object (bucket={bucket}, key={key}): {e}")
+        except BotoCoreError as e:
+            raise StorageError(f"Failed to check S3 object (bucket={bucket}, key={key}): {e}")
+
+    def presign_put(self, key, content_type=None, expires_in=900):
+        params = {"Bucket": self.bucket, "Key": key}
+        if content_type:
+            params["ContentType"] = content_type
+        try:
+            return self.client.generate_presigned_url(
+                "put_object", Params=params, ExpiresIn=int(expires_in), HttpMethod="PUT"
+            )
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(f"Failed to presign S3 upload (bucket={self.bucket}, key={key}): {e}")
+
+
+class LocalStorage:
+    """Filesystem stand-in for S3Storage: objects are files under `root`."""
+
+    scheme = "file"
+
+    def __init__(self, root, bucket="local"):
+        self.root = os.path.abspath(root)
+        self.bucket = bucket
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise StorageError(f"Invalid object key: {key}")
+        return path
+
+    def uri(self, key, bucket=None):
+        return f"file://{self._path(key)}"
+
+    def _copy(self, src, dst):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.{uuid.uuid4().hex[:8]}.part"
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+        except OSError as e:
+            raise StorageError(f"Failed to copy {src} -> {dst}: {e}")
+        finally:
+            if os.path.exists(tmp):
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
+    def upload_file(self, local_path, key, content_type=None, bucket=None):
+        self._copy(local_path, self._path(key))
+        return {"bucket": self.bucket, "key": key, "uri": self.uri(key)}
+
+    def download_file(self, key, local_path, bucket=None):
+        src = self._path(key)
+        if not os.path.isfile(src):
+            raise StorageError(f"Object not found: {key}")
+        self._copy(src, local_path)
+        return local_path
+
+    def head(self, key, bucket=None):
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        return {"ContentLength": os.path.getsize(path)}
+
+    def presign_put(self, key, content_type=None, expires_in=900):
+        raise StorageError("Presigned uploads need S3 or an S3-compatible endpoint (set S3_BUCKET / S3_ENDPOINT_URL).")
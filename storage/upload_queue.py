@@ -0,0 +1,233 @@
+"""
+Background upload queue with retry.
+
+The upload request used to wait for the S3 transfer before it could enqueue the
+analysis job. With this queue the request only makes the local file durable and
+returns; worker threads push it to object storage, retrying with exponential
+backoff.
+
+Durability: submit() hard-links the file into `outbox_dir` (a copy if linking
+is not possible), fsyncs it, and writes a JSON manifest next to it. The caller
+may then delete or move its own copy (e.g. the analysis temp-file cleanup). The
+outbox is rescanned by start(), so pending uploads survive a restart.
+
+Several processes (gunicorn workers) may share one outbox. Before uploading, a
+worker claims the manifest by renaming `<id>.json` to `<id>.inflight.<pid>`;
+whoever loses the rename skips the item, so an upload another live process is
+handling is never repeated. start() returns claims left by dead processes to
+the outbox, and claims under its own pid: a restarted container process often
+gets the pid (e.g. 1) of the one it replaced, and has claimed nothing yet.
+
+Usage:
+
+    from storage import S3Storage, UploadQueue
+
+    queue = UploadQueue(S3Storage("my-bucket"), "uploads/_outbox", on_done=callback)
+    queue.start()
+    queue.submit("uploads/_tmp/clip.mp4", "alice/clip.mp4", content_type="video/mp4",
+                 meta={"job_id": "..."})
+
+on_done(meta, result, error) runs on a worker thread after the final attempt:
+result is the backend's upload dict on success, None on failure.
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_INFLIGHT_RE = re.compile(r"^(?P<id>[0-9a-f]+)\.inflight\.(?P<pid>\d+)$")
+
+
+class UploadQueue:
+    """Outbox-backed upload queue drained by a few daemon threads."""
+
+    def __init__(self, storage, outbox_dir, workers=2, max_attempts=6,
+                 backoff_seconds=2.0, max_backoff_seconds=300.0, on_done=None):
+        self.storage = storage
+        self.outbox_dir = outbox_dir
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_seconds = float(backoff_seconds)
+        self.max_backoff_seconds = float(max_backoff_seconds)
+        self.on_done = on_done
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _manifest_path(self, item_id):
+        return os.path.join(self.outbox_dir, f"{item_id}.json")
+
+    def _inflight_path(self, item_id, pid=None):
+        return os.path.join(self.outbox_dir, f"{item_id}.inflight.{pid or os.getpid()}")
+
+    def _claim(self, item):
+        """Take the item for this process. False if another process claimed (or finished) it."""
+        try:
+            os.rename(self._manifest_path(item["id"]), self._inflight_path(item["id"]))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _release(self, item):
+        """Hand a claimed item back to the outbox with its updated manifest."""
+        self._write_manifest(item)
+        try:
+            os.remove(self._inflight_path(item["id"]))
+        except OSError:
+            pass
+
+    def _recover_stale_claims(self):
+        """Only safe before this process's workers run: its own pid's claims count as stale."""
+        own_pid = os.getpid()
+        for name in os.listdir(self.outbox_dir):
+            match = _INFLIGHT_RE.match(name)
+            if not match:
+                continue
+            pid = int(match.group("pid"))
+            if pid != own_pid and _pid_alive(pid):
+                continue
+            try:
+                os.rename(os.path.join(self.outbox_dir, name), self._manifest_path(match.group("id")))
+                logger.info(f"☁️ [UPLOAD_QUEUE] Recovered upload {match.group('id')} claimed by earlier process {pid}")
+            except OSError:
+                pass
+
+    def _write_manifest(self, item):
+        path = self._manifest_path(item["id"])
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(item, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def start(self):
+        """Start the workers (idempotent) and re-queue anything left in the outbox."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        os.makedirs(self.outbox_dir, exist_ok=True)
+        self._recover_stale_claims()
+        resumed = 0
+        for name in sorted(os.listdir(self.outbox_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.outbox_dir, name)) as f:
+                    item = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable upload manifest {name}: {e}")
+                continue
+            if item.get("failed"):
+                continue
+            self._queue.put(item)
+            resumed += 1
+        if resumed:
+            logger.info(f"☁️ [UPLOAD_QUEUE] Resuming {resumed} pending upload(s)")
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"upload-queue-{i}", daemon=True).start()
+
+    def submit(self, local_path, key, content_type=None, meta=None):
+        """Stage `local_path` durably in the outbox and queue its upload. Returns the item id."""
+        # Start first: start() re-queues manifests already on disk, not this one.
+        self.start()
+        item_id = uuid.uuid4().hex
+        staged = os.path.join(self.outbox_dir, item_id + os.path.splitext(local_path)[1])
+        try:
+            os.link(local_path, staged)
+        except OSError:
+            shutil.copyfile(local_path, staged)
+        with open(staged, "rb") as f:
+            os.fsync(f.fileno())
+        item = {
+            "id": item_id,
+            "path": staged,
+            "key": key,
+            "content_type": content_type,
+            "meta": meta or {},
+            "attempts": 0,
+        }
+        self._write_manifest(item)
+        _fsync_dir(self.outbox_dir)
+        self._queue.put(item)
+        return item_id
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _finish(self, item, result, error):
+        if self.on_done:
+            try:
+                self.on_done(item.get("meta") or {}, result, error)
+            except Exception as e:
+                logger.warning(f"Upload callback failed for {item.get('key')}: {e}")
+
+    def _discard(self, item):
+        for path in (item["path"], self._inflight_path(item["id"])):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if not self._claim(item):
+                    continue  # another process has it (queued twice via a shared outbox)
+                result = self.storage.upload_file(item["path"], item["key"], content_type=item.get("content_type"))
+            except Exception as e:
+                item["attempts"] = int(item.get("attempts") or 0) + 1
+                item["last_error"] = str(e)
+                if item["attempts"] >= self.max_attempts:
+                    # Keep the file and manifest for inspection; start() won't retry it.
+                    item["failed"] = True
+                    self._release(item)
+                    logger.error(f"❌ [UPLOAD_QUEUE] Giving up on {item['key']} after {item['attempts']} attempts: {e}")
+                    self._finish(item, None, str(e))
+                else:
+                    self._release(item)
+                    delay = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** (item["attempts"] - 1)))
+                    logger.warning(f"⚠️ [UPLOAD_QUEUE] Upload of {item['key']} failed (attempt {item['attempts']}), retrying in {delay:.0f}s: {e}")
+                    timer = threading.Timer(delay, self._queue.put, args=(item,))
+                    timer.daemon = True
+                    timer.start()
+                continue
+            finally:
+                self._queue.task_done()
+            self._discard(item)
+            logger.info(f"☁️ [UPLOAD_QUEUE] Uploaded {result.get('uri')}")
+            self._finish(item, result, None)
+
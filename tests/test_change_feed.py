@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from database import SQLitePool, read_change_entries
+
+
+SCHEMA = '''
+    CREATE TABLE change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        entity TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        ref TEXT NOT NULL,
+        op TEXT NOT NULL,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+class _WriteAfterFirstRead:
+    """Connection proxy that commits a change from another connection right after
+    the first query, i.e. between the feed's head read and its entries read."""
+
+    def __init__(self, conn, write):
+        self._conn = conn
+        self._write = write
+
+    def execute(self, *args):
+        cur = self._conn.execute(*args)
+        if self._write:
+            write, self._write = self._write, None
+            write()
+        return cur
+
+
+class ChangeFeedTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'feed.db')
+        self.pool = SQLitePool(self.path)
+        with self.pool.transaction() as conn:
+            conn.execute(SCHEMA)
+
+    def tearDown(self):
+        self.pool.close_thread_connections()
+        self.tmp.cleanup()
+
+    def _log(self, user_id, row_id):
+        writer = sqlite3.connect(self.path)
+        with writer:
+            writer.execute("INSERT INTO change_log (user_id, entity, row_id, ref, op) VALUES (?, 'wellness', ?, ?, 'upsert')",
+                           (user_id, row_id, str(row_id)))
+        writer.close()
+
+    def test_idle_user_cursor_moves_to_head(self):
+        self._log(2, 1)
+        conn = self.pool.connection()
+        entries, next_seq, has_more = read_change_entries(conn, 1, 0, 10)
+        conn.close()
+        self.assertEqual((entries, next_seq, has_more), ([], 1, False))
+
+    def test_change_committed_between_reads_is_delivered(self):
+        self._log(2, 1)  # another user's change: the feed for user 1 is empty
+        conn = self.pool.connection()
+        entries, cursor, _ = read_change_entries(_WriteAfterFirstRead(conn, lambda: self._log(1, 7)), 1, 0, 10)
+        self.assertEqual(entries, [])
+        # The concurrent change is above the returned cursor, so the next call gets it.
+        entries, cursor, _ = read_change_entries(conn, 1, cursor, 10)
+        conn.close()
+        self.assertEqual([(e['row_id'], e['seq']) for e in entries], [(7, 2)])
+        self.assertEqual(cursor, 2)
+
+    def test_paging_reports_has_more(self):
+        for row_id in range(3):
+            self._log(1, row_id)
+        conn = self.pool.connection()
+        entries, cursor, has_more = read_change_entries(conn, 1, 0, 2)
+        self.assertEqual(([e['seq'] for e in entries], cursor, has_more), ([1, 2], 2, True))
+        entries, cursor, has_more = read_change_entries(conn, 1, cursor, 2)
+        conn.close()
+        self.assertEqual(([e['seq'] for e in entries], cursor, has_more), ([3], 3, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import time
+import unittest
+
+from database import SQLitePool, SQLiteJobQueue
+
+
+class ApplyClaimTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = SQLitePool(os.path.join(self.tmp.name, 'queue.db'))
+        self.queue = SQLiteJobQueue(self.pool)
+        self.queue.enqueue("job1", {"user_id": 1})
+        item = self.queue.claim("worker", lease_seconds=60)
+        self.queue.complete(item["job_id"], "worker", {"results": {}})
+
+    def tearDown(self):
+        self.pool.close_thread_connections()
+        self.tmp.cleanup()
+
+    def test_only_one_applier_wins(self):
+        self.assertTrue(self.queue.claim_finished("job1", "api-a"))
+        self.assertFalse(self.queue.claim_finished("job1", "api-b"))
+        self.assertEqual(self.queue.finished(), [])
+
+    def test_release_makes_job_claimable_again(self):
+        self.assertTrue(self.queue.claim_finished("job1", "api-a"))
+        self.queue.release_finished("job1", "api-a")
+        self.assertEqual([e["job_id"] for e in self.queue.finished()], ["job1"])
+        self.assertTrue(self.queue.claim_finished("job1", "api-b"))
+
+    def test_expired_claim_can_be_taken_over(self):
+        self.assertTrue(self.queue.claim_finished("job1", "api-a", lease_seconds=-1))
+        time.sleep(0.01)
+        self.assertTrue(self.queue.claim_finished("job1", "api-b"))
+
+    def test_unfinished_job_cannot_be_claimed(self):
+        self.queue.enqueue("job2", {"user_id": 1})
+        self.assertFalse(self.queue.claim_finished("job2", "api-a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import gc
+import os
+import tempfile
+import threading
+import unittest
+
+from database import SQLitePool
+
+
+class CrossThreadReleaseTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = SQLitePool(os.path.join(self.tmp.name, 'pool.db'))
+
+    def tearDown(self):
+        self.pool.close_thread_connections()
+        self.tmp.cleanup()
+
+    def test_connection_dropped_on_another_thread_is_not_pooled_there(self):
+        borrowed = []
+        worker = threading.Thread(target=lambda: borrowed.append(self.pool.connection()))
+        worker.start()
+        worker.join()
+
+        # The last reference goes away on this thread, as with a Future's traceback.
+        borrowed.clear()
+        gc.collect()
+
+        for _ in range(2):
+            conn = self.pool.connection()
+            self.assertEqual(conn.execute('SELECT 1').fetchone()[0], 1)
+            conn.close()
+
+    def test_explicit_close_on_another_thread_is_not_pooled_there(self):
+        conn = self.pool.connection()
+        worker = threading.Thread(target=conn.close)
+        worker.start()
+        worker.join()
+        self.assertEqual(self.pool.connection().execute('SELECT 1').fetchone()[0], 1)
+
+    def test_same_thread_close_reuses_the_connection(self):
+        conn = self.pool.connection()
+        raw = conn._raw
+        conn.close()
+        self.assertIs(self.pool.connection()._raw, raw)
+
+
+if __name__ == '__main__':
+    unittest.main()